@@ -30,6 +30,7 @@ from phonenumber_field.modelfields import PhoneNumberField
 from muckrock.accounts.querysets import ProfileQuerySet
 from muckrock.core.utils import cache_get_or_set, squarelet_get, stripe_retry_on_error
 from muckrock.organization.models import Organization
+from muckrock.sidebar.cache import clear_sidebar_cache
 
 logger = logging.getLogger(__name__)
 stripe.api_key = settings.STRIPE_SECRET_KEY
@@ -186,6 +187,8 @@ class Profile(models.Model):
         with transaction.atomic():
             self.user.memberships.filter(active=True).update(active=False)
             self.user.memberships.filter(organization=organization).update(active=True)
+        # the memberships were updated in bulk, without sending signals
+        clear_sidebar_cache([self.user_id])
 
     @mproperty
     def individual_organization(self):
@@ -243,8 +246,12 @@ class Profile(models.Model):
                 return None
             return resp.json().get("url_auth_token")
 
+        # never serve an expired token
         return cache_get_or_set(
-            "url_auth_token:{}".format(self.uuid), get_url_auth_token_squarelet, 10
+            "url_auth_token:{}".format(self.uuid),
+            get_url_auth_token_squarelet,
+            10,
+            stale_timeout=0,
         )
 
     def public_profile_page(self):
@@ -1,9 +1,7 @@
 """Custom querysets for account app"""
 
 # Django
-from django.conf import settings
 from django.contrib.auth.models import User
-from django.core.cache import cache
 from django.db import models, transaction
 
 # Standard Library
@@ -11,6 +9,7 @@ import logging
 
 # MuckRock
 from muckrock.organization.models import Membership, Organization
+from muckrock.sidebar.cache import clear_sidebar_cache
 
 logger = logging.getLogger(__name__)
 
@@ -126,14 +125,5 @@ class ProfileQuerySet(models.QuerySet):
 
         user.memberships.filter(organization__in=current_organizations).delete()
 
-        # update cache after updating orgs
-        cache.set(
-            "sb:{}:user_org".format(user.username),
-            profile.organization,
-            settings.DEFAULT_CACHE_TIMEOUT,
-        )
-        cache.set(
-            "sb:{}:user_orgs".format(user.username),
-            user.organizations.get_cache(),
-            settings.DEFAULT_CACHE_TIMEOUT,
-        )
+        # memberships were updated in bulk, so clear the sidebar cache here
+        clear_sidebar_cache([user.pk])
@@ -8,13 +8,14 @@ from celery.schedules import crontab
 from celery.task import periodic_task
 from django.contrib.auth.models import User
 from django.core.management import call_command
-from django.db.models import Count, F, Sum
+from django.db.models import Count, Exists, F, OuterRef, Q, Sum
 from django.utils import timezone
 
 # Standard Library
 import logging
 import os
 from datetime import date, datetime, time, timedelta
+from time import perf_counter
 
 # Third Party
 from raven import Client
@@ -25,9 +26,10 @@ from muckrock.accounts.models import Statistics
 from muckrock.agency.models import Agency
 from muckrock.communication.models import (
     EmailCommunication,
+    EmailOpen,
     FaxCommunication,
     MailCommunication,
-    PortalCommunication,
+    MailEvent,
 )
 from muckrock.crowdfund.models import Crowdfund, CrowdfundPayment
 from muckrock.crowdsource.models import Crowdsource, CrowdsourceResponse
@@ -57,514 +59,392 @@ register_logger_signal(client)
 register_signal(client)
 
 
-@periodic_task(
-    run_every=crontab(hour=0, minute=30),
-    name="muckrock.accounts.tasks.store_statistics",
-)
-def store_statistics():
-    """Store the daily statistics"""
-    # pylint: disable=too-many-statements
+ENTITLEMENTS = [
+    ("pro", "professional"),
+    ("basic", "free"),
+    ("beta", "beta"),
+    ("proxy", "proxy"),
+    ("admin", "admin"),
+]
 
-    midnight = time(tzinfo=timezone.get_current_timezone())
-    today_midnight = datetime.combine(date.today(), midnight)
-    yesterday = date.today() - timedelta(1)
-    yesterday_midnight = today_midnight - timedelta(1)
+TASK_STATISTICS = [
+    ("", Task),
+    ("orphan", OrphanTask),
+    ("snailmail", SnailMailTask),
+    ("rejected", RejectedEmailTask),
+    ("flagged", FlaggedTask),
+    ("newagency", NewAgencyTask),
+    ("response", ResponseTask),
+    ("faxfail", FailedFaxTask),
+    ("crowdfundpayment", CrowdfundTask),
+    ("reviewagency", ReviewAgencyTask),
+    ("portal", PortalTask),
+]
 
-    kwargs = {}
-    kwargs["date"] = yesterday
-    kwargs["total_requests"] = FOIARequest.objects.count()
-    kwargs["total_requests_success"] = FOIARequest.objects.filter(status="done").count()
-    kwargs["total_requests_denied"] = FOIARequest.objects.filter(
-        status="rejected"
-    ).count()
-    kwargs["total_requests_draft"] = 0  # draft is no longer a valid status
-    kwargs["total_requests_submitted"] = FOIARequest.objects.filter(
-        status="submitted"
-    ).count()
-    kwargs["total_requests_awaiting_ack"] = FOIARequest.objects.filter(
-        status="ack"
-    ).count()
-    kwargs["total_requests_awaiting_response"] = FOIARequest.objects.filter(
-        status="processed"
-    ).count()
-    kwargs["total_requests_awaiting_appeal"] = FOIARequest.objects.filter(
-        status="appealing"
-    ).count()
-    kwargs["total_requests_fix_required"] = FOIARequest.objects.filter(
-        status="fix"
-    ).count()
-    kwargs["total_requests_payment_required"] = FOIARequest.objects.filter(
-        status="payment"
-    ).count()
-    kwargs["total_requests_no_docs"] = FOIARequest.objects.filter(
-        status="no_docs"
-    ).count()
-    kwargs["total_requests_partial"] = FOIARequest.objects.filter(
-        status="partial"
-    ).count()
-    kwargs["total_requests_abandoned"] = FOIARequest.objects.filter(
-        status="abandoned"
-    ).count()
-    kwargs["total_requests_lawsuit"] = FOIARequest.objects.filter(
-        status="lawsuit"
-    ).count()
-    kwargs["requests_processing_days"] = FOIARequest.objects.get_processing_days()
-    kwargs["total_composers"] = FOIAComposer.objects.count()
-    kwargs["total_composers_draft"] = FOIAComposer.objects.filter(
-        status="started"
-    ).count()
-    kwargs["total_composers_submitted"] = FOIAComposer.objects.filter(
-        status="submitted"
-    ).count()
-    kwargs["total_composers_filed"] = FOIAComposer.objects.filter(
-        status="filed"
-    ).count()
-    kwargs["sent_communications_portal"] = PortalCommunication.objects.filter(
-        communication__datetime__range=(yesterday_midnight, today_midnight),
-        communication__response=False,
-    ).count()
-    kwargs["sent_communications_email"] = EmailCommunication.objects.filter(
-        communication__datetime__range=(yesterday_midnight, today_midnight),
-        communication__response=False,
-    ).count()
-    kwargs["sent_communications_fax"] = FaxCommunication.objects.filter(
-        communication__datetime__range=(yesterday_midnight, today_midnight),
-        communication__response=False,
-    ).count()
-    kwargs["sent_communications_mail"] = MailCommunication.objects.filter(
-        communication__datetime__range=(yesterday_midnight, today_midnight),
-        communication__response=False,
-    ).count()
 
-    range_max = 7
-    range_min = 0
-    for weekly, range_min, range_max in [("weekly", 0, 7), ("weekly2", 7, 14)]:
-        kwargs[
-            f"email_communications_{weekly}_total"
-        ] = EmailCommunication.objects.filter(
-            communication__response=False,
-            sent_datetime__gt=timezone.now() - timedelta(days=range_max),
-            sent_datetime__lt=timezone.now() - timedelta(days=range_min),
-        ).count()
-        kwargs[f"email_communications_{weekly}_confirmed"] = (
-            EmailCommunication.objects.filter(
-                communication__response=False,
-                sent_datetime__gt=timezone.now() - timedelta(days=range_max),
-                sent_datetime__lt=timezone.now() - timedelta(days=range_min),
-            )
-            .exclude(opens=None)
-            .count()
-        )
-        kwargs[f"fax_communications_{weekly}_total"] = FaxCommunication.objects.filter(
-            sent_datetime__gt=timezone.now() - timedelta(days=range_max),
-            sent_datetime__lt=timezone.now() - timedelta(days=range_min),
-        ).count()
-        kwargs[f"fax_communications_{weekly}_confirmed"] = (
-            FaxCommunication.objects.filter(
-                sent_datetime__gt=timezone.now() - timedelta(days=range_max),
-                sent_datetime__lt=timezone.now() - timedelta(days=range_min),
-            )
-            .exclude(confirmed_datetime=None)
-            .count()
-        )
-        kwargs[
-            f"mail_communications_{weekly}_total"
-        ] = MailCommunication.objects.filter(
-            communication__response=False,
-            sent_datetime__gt=timezone.now() - timedelta(days=range_max),
-            sent_datetime__lt=timezone.now() - timedelta(days=range_min),
-        ).count()
-        kwargs[f"mail_communications_{weekly}_confirmed"] = (
-            MailCommunication.objects.filter(
-                communication__response=False,
-                sent_datetime__gt=timezone.now() - timedelta(days=range_max),
-                sent_datetime__lt=timezone.now() - timedelta(days=range_min),
-                events__event__endswith=".processed_for_delivery",
-            )
-            .distinct()
-            .count()
-        )
+def count_where(queryset, **conditions):
+    """Count the rows matching each condition in a single query
 
-    kwargs["machine_requests"] = FoiaMachineRequest.objects.count()
-    kwargs["machine_requests_success"] = FoiaMachineRequest.objects.filter(
-        status="done"
-    ).count()
-    kwargs["machine_requests_denied"] = FoiaMachineRequest.objects.filter(
-        status="rejected"
-    ).count()
-    kwargs["machine_requests_draft"] = FoiaMachineRequest.objects.filter(
-        status="started"
-    ).count()
-    kwargs["machine_requests_submitted"] = FoiaMachineRequest.objects.filter(
-        status="submitted"
-    ).count()
-    kwargs["machine_requests_awaiting_ack"] = FoiaMachineRequest.objects.filter(
-        status="ack"
-    ).count()
-    kwargs["machine_requests_awaiting_response"] = FoiaMachineRequest.objects.filter(
-        status="processed"
-    ).count()
-    kwargs["machine_requests_awaiting_appeal"] = FoiaMachineRequest.objects.filter(
-        status="appealing"
-    ).count()
-    kwargs["machine_requests_fix_required"] = FoiaMachineRequest.objects.filter(
-        status="fix"
-    ).count()
-    kwargs["machine_requests_payment_required"] = FoiaMachineRequest.objects.filter(
-        status="payment"
-    ).count()
-    kwargs["machine_requests_no_docs"] = FoiaMachineRequest.objects.filter(
-        status="no_docs"
-    ).count()
-    kwargs["machine_requests_partial"] = FoiaMachineRequest.objects.filter(
-        status="partial"
-    ).count()
-    kwargs["machine_requests_abandoned"] = FoiaMachineRequest.objects.filter(
-        status="abandoned"
-    ).count()
-    kwargs["machine_requests_lawsuit"] = FoiaMachineRequest.objects.filter(
-        status="lawsuit"
-    ).count()
-    kwargs["total_pages"] = FOIAFile.objects.aggregate(Sum("pages"))["pages__sum"]
-    # user stats will now be kept on squarelet
-    kwargs["total_users"] = 0
-    kwargs["total_users_excluding_agencies"] = 0
-    kwargs["total_users_filed"] = (
-        User.objects.annotate(num_foia=Count("composers")).exclude(num_foia=0).count()
-    )  # this is still on muckrock since it deals with foia composers
-    kwargs["total_agencies"] = Agency.objects.count()
-    kwargs["total_fees"] = FOIARequest.objects.aggregate(Sum("price"))["price__sum"]
-    kwargs["pro_users"] = 0  # squarelet
-    kwargs["pro_user_names"] = ""  # squarelet
-    kwargs["daily_requests_pro"] = (
-        FOIARequest.objects.filter(
-            composer__organization__entitlement__slug="professional"
-        )
-        .get_submitted_range(yesterday_midnight, today_midnight)
-        .exclude_org_users()
-        .count()
-    )
-    kwargs["daily_requests_basic"] = (
-        FOIARequest.objects.filter(composer__organization__entitlement__slug="free")
-        .get_submitted_range(yesterday_midnight, today_midnight)
-        .exclude_org_users()
-        .count()
-    )
-    kwargs["daily_requests_beta"] = (
-        FOIARequest.objects.filter(composer__organization__entitlement__slug="beta")
-        .get_submitted_range(yesterday_midnight, today_midnight)
-        .exclude_org_users()
-        .count()
+    A condition of None counts every row
+    """
+    return queryset.aggregate(
+        **{
+            name: Count("pk", filter=condition)
+            for name, condition in conditions.items()
+        }
     )
-    kwargs["daily_requests_proxy"] = (
-        FOIARequest.objects.filter(composer__organization__entitlement__slug="proxy")
-        .get_submitted_range(yesterday_midnight, today_midnight)
-        .exclude_org_users()
-        .count()
-    )
-    kwargs["daily_requests_admin"] = (
-        FOIARequest.objects.filter(composer__organization__entitlement__slug="admin")
-        .get_submitted_range(yesterday_midnight, today_midnight)
-        .exclude_org_users()
-        .count()
-    )
-    kwargs["daily_requests_org"] = (
-        FOIARequest.objects.filter(
-            composer__organization__entitlement__slug="organization"
+
+
+def count_by(queryset, field, values):
+    """Count the rows for each of the given values of a field in a single query"""
+    counts = dict(
+        queryset.filter(**{f"{field}__in": list(values.values())})
+        .order_by()
+        .values_list(field)
+        .annotate(count=Count("pk"))
+    )
+    return {name: counts.get(value, 0) for name, value in values.items()}
+
+
+def _request_statistics(start, end):
+    """Statistics for requests and composers"""
+    statuses = [
+        ("success", "done"),
+        ("denied", "rejected"),
+        ("submitted", "submitted"),
+        ("awaiting_ack", "ack"),
+        ("awaiting_response", "processed"),
+        ("awaiting_appeal", "appealing"),
+        ("fix_required", "fix"),
+        ("payment_required", "payment"),
+        ("no_docs", "no_docs"),
+        ("partial", "partial"),
+        ("abandoned", "abandoned"),
+        ("lawsuit", "lawsuit"),
+    ]
+    stats = FOIARequest.objects.aggregate(
+        total_requests=Count("pk"),
+        total_fees=Sum("price"),
+        **{
+            f"total_requests_{name}": Count("pk", filter=Q(status=status))
+            for name, status in statuses
+        },
+    )
+    stats["total_requests_draft"] = 0  # draft is no longer a valid status
+    stats["requests_processing_days"] = FOIARequest.objects.get_processing_days()
+
+    # only count requests from individual organizations for the entitlements,
+    # except for the organization entitlement
+    slugs = [slug for _, slug in ENTITLEMENTS] + ["organization"]
+    entitlement = "composer__organization__entitlement__slug"
+    individual = Q(composer__organization__individual=True)
+    stats.update(
+        count_where(
+            FOIARequest.objects.get_submitted_range(start, end),
+            daily_requests_org=Q(**{entitlement: "organization"}),
+            daily_requests_other=~Q(**{f"{entitlement}__in": slugs}),
+            **{
+                f"daily_requests_{name}": Q(**{entitlement: slug}) & individual
+                for name, slug in ENTITLEMENTS
+            },
         )
-        .get_submitted_range(yesterday_midnight, today_midnight)
-        .count()
     )
-    kwargs["daily_requests_other"] = (
-        FOIARequest.objects.exclude(
-            composer__organization__entitlement__slug__in=[
-                "professional",
-                "free",
-                "beta",
-                "proxy",
-                "admin",
-                "organization",
-            ]
+
+    stats.update(
+        count_where(
+            FOIAComposer.objects.all(),
+            total_composers=None,
+            total_composers_draft=Q(status="started"),
+            total_composers_submitted=Q(status="submitted"),
+            total_composers_filed=Q(status="filed"),
         )
-        .get_submitted_range(yesterday_midnight, today_midnight)
-        .count()
     )
-    kwargs["daily_articles"] = Article.objects.filter(
-        pub_date__range=(yesterday_midnight, today_midnight)
-    ).count()
-    kwargs["orphaned_communications"] = FOIACommunication.objects.filter(
+    # this is still on muckrock since it deals with foia composers
+    stats["total_users_filed"] = FOIAComposer.objects.aggregate(
+        users=Count("user", distinct=True)
+    )["users"]
+    return stats
+
+
+def _communication_statistics(start, end):
+    """Statistics for communications sent yesterday and over the past weeks"""
+    stats = FOIACommunication.objects.filter(
+        datetime__range=(start, end), response=False
+    ).aggregate(
+        sent_communications_portal=Count("portals", distinct=True),
+        sent_communications_email=Count("emails", distinct=True),
+        sent_communications_fax=Count("faxes", distinct=True),
+        sent_communications_mail=Count("mails", distinct=True),
+    )
+    stats["orphaned_communications"] = FOIACommunication.objects.filter(
         foia=None
     ).count()
-    kwargs["stale_agencies"] = 0  # stake agencies no longer exist
-    kwargs["unapproved_agencies"] = Agency.objects.filter(status="pending").count()
-    kwargs["portal_agencies"] = Agency.objects.exclude(portal=None).count()
-    kwargs["total_tasks"] = Task.objects.count()
-    kwargs["total_unresolved_tasks"] = (
-        Task.objects.filter(resolved=False).get_undeferred().count()
-    )
-    kwargs["total_deferred_tasks"] = Task.objects.get_deferred().count()
-    # we no longer use generic tasks
-    kwargs["total_generic_tasks"] = 0
-    kwargs["total_unresolved_generic_tasks"] = 0
-    kwargs["total_deferred_generic_tasks"] = 0
-    kwargs["total_orphan_tasks"] = OrphanTask.objects.count()
-    kwargs["total_unresolved_orphan_tasks"] = (
-        OrphanTask.objects.filter(resolved=False).get_undeferred().count()
-    )
-    kwargs["total_deferred_orphan_tasks"] = OrphanTask.objects.get_deferred().count()
-    kwargs["total_snailmail_tasks"] = SnailMailTask.objects.count()
-    kwargs["total_unresolved_snailmail_tasks"] = (
-        SnailMailTask.objects.filter(resolved=False).get_undeferred().count()
-    )
-    kwargs[
-        "total_deferred_snailmail_tasks"
-    ] = SnailMailTask.objects.get_deferred().count()
-    kwargs["total_rejected_tasks"] = RejectedEmailTask.objects.count()
-    kwargs["total_unresolved_rejected_tasks"] = (
-        RejectedEmailTask.objects.filter(resolved=False).get_undeferred().count()
-    )
-    kwargs[
-        "total_deferred_rejected_tasks"
-    ] = RejectedEmailTask.objects.get_deferred().count()
-    kwargs["total_staleagency_tasks"] = 0
-    kwargs["total_unresolved_staleagency_tasks"] = 0
-    kwargs["total_deferred_staleagency_tasks"] = 0
-    kwargs["total_flagged_tasks"] = FlaggedTask.objects.count()
-    kwargs["total_unresolved_flagged_tasks"] = (
-        FlaggedTask.objects.filter(resolved=False).get_undeferred().count()
-    )
-    kwargs["total_deferred_flagged_tasks"] = FlaggedTask.objects.get_deferred().count()
-    kwargs["total_newagency_tasks"] = NewAgencyTask.objects.count()
-    kwargs["total_unresolved_newagency_tasks"] = (
-        NewAgencyTask.objects.filter(resolved=False).get_undeferred().count()
-    )
-    kwargs[
-        "total_deferred_newagency_tasks"
-    ] = NewAgencyTask.objects.get_deferred().count()
-    kwargs["total_response_tasks"] = ResponseTask.objects.count()
-    kwargs["total_unresolved_response_tasks"] = (
-        ResponseTask.objects.filter(resolved=False).get_undeferred().count()
-    )
-    kwargs[
-        "total_deferred_response_tasks"
-    ] = ResponseTask.objects.get_deferred().count()
-    kwargs["total_faxfail_tasks"] = FailedFaxTask.objects.count()
-    kwargs["total_unresolved_faxfail_tasks"] = (
-        FailedFaxTask.objects.filter(resolved=False).get_undeferred().count()
-    )
-    kwargs[
-        "total_deferred_faxfail_tasks"
-    ] = FailedFaxTask.objects.get_deferred().count()
-    kwargs["total_crowdfundpayment_tasks"] = CrowdfundTask.objects.count()
-    kwargs["total_unresolved_crowdfundpayment_tasks"] = (
-        CrowdfundTask.objects.filter(resolved=False).get_undeferred().count()
-    )
-    kwargs[
-        "total_deferred_crowdfundpayment_tasks"
-    ] = CrowdfundTask.objects.get_deferred().count()
-    kwargs["total_reviewagency_tasks"] = ReviewAgencyTask.objects.count()
-    kwargs["total_unresolved_reviewagency_tasks"] = (
-        ReviewAgencyTask.objects.filter(resolved=False).get_undeferred().count()
-    )
-    kwargs[
-        "total_deferred_reviewagency_tasks"
-    ] = ReviewAgencyTask.objects.get_deferred().count()
-    kwargs["total_portal_tasks"] = PortalTask.objects.count()
-    kwargs["total_unresolved_portal_tasks"] = (
-        PortalTask.objects.filter(resolved=False).get_undeferred().count()
-    )
-    kwargs["total_deferred_portal_tasks"] = PortalTask.objects.get_deferred().count()
-    kwargs["daily_robot_response_tasks"] = ResponseTask.objects.filter(
-        date_done__gte=yesterday_midnight,
-        date_done__lt=today_midnight,
-        resolved_by__username="mlrobot",
-    ).count()
-    kwargs["flag_processing_days"] = FlaggedTask.objects.get_processing_days()
-    kwargs["unresolved_snailmail_appeals"] = (
-        SnailMailTask.objects.filter(resolved=False, category="a")
-        .get_undeferred()
-        .count()
-    )
-    # squarelet
-    kwargs["total_active_org_members"] = 0
-    kwargs["total_active_orgs"] = 0
-    kwargs["total_crowdfunds"] = Crowdfund.objects.count()
-    kwargs["total_crowdfunds_pro"] = Crowdfund.objects.filter_by_entitlement(
-        "professional"
-    ).count()
-    kwargs["total_crowdfunds_basic"] = Crowdfund.objects.filter_by_entitlement(
-        "free"
-    ).count()
-    kwargs["total_crowdfunds_beta"] = Crowdfund.objects.filter_by_entitlement(
-        "beta"
-    ).count()
-    kwargs["total_crowdfunds_proxy"] = Crowdfund.objects.filter_by_entitlement(
-        "proxy"
-    ).count()
-    kwargs["total_crowdfunds_admin"] = Crowdfund.objects.filter_by_entitlement(
-        "admin"
-    ).count()
-    kwargs["open_crowdfunds"] = Crowdfund.objects.filter(closed=False).count()
-    kwargs["open_crowdfunds_pro"] = (
-        Crowdfund.objects.filter_by_entitlement("professional")
-        .filter(closed=False)
-        .count()
-    )
-    kwargs["open_crowdfunds_basic"] = (
-        Crowdfund.objects.filter_by_entitlement("free").filter(closed=False).count()
-    )
-    kwargs["open_crowdfunds_beta"] = (
-        Crowdfund.objects.filter_by_entitlement("beta").filter(closed=False).count()
-    )
-    kwargs["open_crowdfunds_proxy"] = (
-        Crowdfund.objects.filter_by_entitlement("proxy").filter(closed=False).count()
-    )
-    kwargs["open_crowdfunds_admin"] = (
-        Crowdfund.objects.filter_by_entitlement("admin").filter(closed=False).count()
-    )
-    kwargs["closed_crowdfunds_0"] = (
-        Crowdfund.objects.annotate(
-            percent=F("payment_received") / F("payment_required")
+
+    # scan the past two weeks once, and split it into weekly windows
+    now = timezone.now()
+    windows = [("weekly", 0, 7), ("weekly2", 7, 14)]
+
+    def in_window(range_min, range_max):
+        """Sent between range_min and range_max days ago"""
+        return Q(
+            sent_datetime__gt=now - timedelta(days=range_max),
+            sent_datetime__lt=now - timedelta(days=range_min),
         )
-        .filter(closed=True, percent=0)
-        .count()
-    )
-    kwargs["closed_crowdfunds_0_25"] = (
-        Crowdfund.objects.annotate(
-            percent=F("payment_received") / F("payment_required")
+
+    def window_counts(queryset, channel, confirmed):
+        """Count the total and confirmed communications in each window"""
+        counts = {}
+        for weekly, range_min, range_max in windows:
+            window = in_window(range_min, range_max)
+            counts[f"{channel}_communications_{weekly}_total"] = window
+            counts[f"{channel}_communications_{weekly}_confirmed"] = window & confirmed
+        return count_where(queryset.filter(in_window(0, 14)), **counts)
+
+    stats.update(
+        window_counts(
+            EmailCommunication.objects.filter(communication__response=False).annotate(
+                opened=Exists(EmailOpen.objects.filter(email=OuterRef("pk")))
+            ),
+            "email",
+            Q(opened=True),
         )
-        .filter(closed=True, percent__gt=0, percent__lte=0.25)
-        .count()
     )
-    kwargs["closed_crowdfunds_25_50"] = (
-        Crowdfund.objects.annotate(
-            percent=F("payment_received") / F("payment_required")
+    stats.update(
+        window_counts(
+            FaxCommunication.objects.all(), "fax", Q(confirmed_datetime__isnull=False)
         )
-        .filter(closed=True, percent__gt=0.25, percent__lte=0.50)
-        .count()
     )
-    kwargs["closed_crowdfunds_50_75"] = (
-        Crowdfund.objects.annotate(
-            percent=F("payment_received") / F("payment_required")
+    stats.update(
+        window_counts(
+            MailCommunication.objects.filter(communication__response=False).annotate(
+                delivered=Exists(
+                    MailEvent.objects.filter(
+                        mail=OuterRef("pk"),
+                        event__endswith=".processed_for_delivery",
+                    )
+                )
+            ),
+            "mail",
+            Q(delivered=True),
         )
-        .filter(closed=True, percent__gt=0.50, percent__lte=0.75)
-        .count()
     )
-    kwargs["closed_crowdfunds_75_100"] = (
-        Crowdfund.objects.annotate(
-            percent=F("payment_received") / F("payment_required")
-        )
-        .filter(closed=True, percent__gt=0.75, percent__lte=1.00)
-        .count()
+    return stats
+
+
+def _machine_request_statistics(start, end):
+    """Statistics for FOIA Machine requests"""
+    # pylint: disable=unused-argument
+    statuses = [
+        ("success", "done"),
+        ("denied", "rejected"),
+        ("draft", "started"),
+        ("submitted", "submitted"),
+        ("awaiting_ack", "ack"),
+        ("awaiting_response", "processed"),
+        ("awaiting_appeal", "appealing"),
+        ("fix_required", "fix"),
+        ("payment_required", "payment"),
+        ("no_docs", "no_docs"),
+        ("partial", "partial"),
+        ("abandoned", "abandoned"),
+        ("lawsuit", "lawsuit"),
+    ]
+    return count_where(
+        FoiaMachineRequest.objects.all(),
+        machine_requests=None,
+        **{f"machine_requests_{name}": Q(status=status) for name, status in statuses},
     )
-    kwargs["closed_crowdfunds_100_125"] = (
-        Crowdfund.objects.annotate(
-            percent=F("payment_received") / F("payment_required")
+
+
+def _site_statistics(start, end):
+    """Statistics for files, agencies, articles and users"""
+    stats = {
+        "total_pages": FOIAFile.objects.aggregate(Sum("pages"))["pages__sum"],
+        "daily_articles": Article.objects.filter(pub_date__range=(start, end)).count(),
+        # user stats will now be kept on squarelet
+        "total_users": 0,
+        "total_users_excluding_agencies": 0,
+        "pro_users": 0,
+        "pro_user_names": "",
+        "total_active_org_members": 0,
+        "total_active_orgs": 0,
+        "stale_agencies": 0,  # stale agencies no longer exist
+    }
+    stats.update(
+        count_where(
+            Agency.objects.all(),
+            total_agencies=None,
+            unapproved_agencies=Q(status="pending"),
+            portal_agencies=Q(portal__isnull=False),
         )
-        .filter(closed=True, percent__gt=1.00, percent__lte=1.25)
-        .count()
     )
-    kwargs["closed_crowdfunds_125_150"] = (
+    return stats
+
+
+def _task_statistics(start, end):
+    """Statistics for each type of task"""
+    undeferred = Q(date_deferred__lte=date.today()) | Q(date_deferred=None)
+    deferred = Q(date_deferred__gt=date.today())
+    stats = {}
+    for name, model in TASK_STATISTICS:
+        name = f"_{name}" if name else ""
+        conditions = {
+            f"total{name}_tasks": None,
+            f"total_unresolved{name}_tasks": Q(resolved=False) & undeferred,
+            f"total_deferred{name}_tasks": deferred,
+        }
+        if model is SnailMailTask:
+            conditions["unresolved_snailmail_appeals"] = (
+                Q(resolved=False, category="a") & undeferred
+            )
+        elif model is ResponseTask:
+            conditions["daily_robot_response_tasks"] = Q(
+                date_done__gte=start,
+                date_done__lt=end,
+                resolved_by__username="mlrobot",
+            )
+        stats.update(count_where(model.objects.all(), **conditions))
+    # we no longer use generic or stale agency tasks
+    for name in ["generic", "staleagency"]:
+        stats[f"total_{name}_tasks"] = 0
+        stats[f"total_unresolved_{name}_tasks"] = 0
+        stats[f"total_deferred_{name}_tasks"] = 0
+    stats["flag_processing_days"] = FlaggedTask.objects.get_processing_days()
+    return stats
+
+
+def _crowdfund_statistics(start, end):
+    """Statistics for crowdfunds and their payments"""
+    # pylint: disable=unused-argument
+    percent_ranges = [
+        ("0_25", 0, 0.25),
+        ("25_50", 0.25, 0.50),
+        ("50_75", 0.50, 0.75),
+        ("75_100", 0.75, 1.00),
+        ("100_125", 1.00, 1.25),
+        ("125_150", 1.25, 1.50),
+        ("150_175", 1.50, 1.75),
+        ("175_200", 1.75, 2.00),
+    ]
+    stats = count_where(
         Crowdfund.objects.annotate(
             percent=F("payment_received") / F("payment_required")
+        ),
+        total_crowdfunds=None,
+        open_crowdfunds=Q(closed=False),
+        closed_crowdfunds_0=Q(closed=True, percent=0),
+        closed_crowdfunds_200=Q(closed=True, percent__gt=2.00),
+        **{
+            f"closed_crowdfunds_{name}": Q(
+                closed=True, percent__gt=low, percent__lte=high
+            )
+            for name, low, high in percent_ranges
+        },
+    )
+    for name, slug in ENTITLEMENTS:
+        counts = count_where(
+            Crowdfund.objects.filter_by_entitlement(slug),
+            total=None,
+            open=Q(closed=False),
         )
-        .filter(closed=True, percent__gt=1.25, percent__lte=1.50)
-        .count()
-    )
-    kwargs["closed_crowdfunds_150_175"] = (
-        Crowdfund.objects.annotate(
-            percent=F("payment_received") / F("payment_required")
+        stats[f"total_crowdfunds_{name}"] = counts["total"]
+        stats[f"open_crowdfunds_{name}"] = counts["open"]
+    stats.update(
+        count_where(
+            CrowdfundPayment.objects.all(),
+            total_crowdfund_payments=None,
+            total_crowdfund_payments_loggedin=Q(user__isnull=False),
+            total_crowdfund_payments_loggedout=Q(user=None),
         )
-        .filter(closed=True, percent__gt=1.50, percent__lte=1.75)
-        .count()
     )
-    kwargs["closed_crowdfunds_175_200"] = (
-        Crowdfund.objects.annotate(
-            percent=F("payment_received") / F("payment_required")
+    return stats
+
+
+def _project_statistics(start, end):
+    """Statistics for projects, exemptions and crowdsources"""
+    # pylint: disable=unused-argument
+    stats = count_where(
+        Project.objects.annotate(
+            has_crowdfunds=Exists(
+                Project.crowdfunds.through.objects.filter(project=OuterRef("pk"))
+            )
+        ),
+        public_projects=Q(private=False, approved=True),
+        private_projects=Q(private=True, approved=True),
+        unapproved_projects=Q(approved=False),
+        crowdfund_projects=Q(has_crowdfunds=True),
+    )
+    project_users = User.objects.filter(
+        Exists(Project.contributors.through.objects.filter(user=OuterRef("pk")))
+    )
+    stats["project_users"] = project_users.count()
+    entitlement = "organizations__entitlement__slug"
+    stats.update(
+        count_by(
+            project_users,
+            entitlement,
+            {f"project_users_{name}": slug for name, slug in ENTITLEMENTS},
         )
-        .filter(closed=True, percent__gt=1.75, percent__lte=2.00)
-        .count()
     )
-    kwargs["closed_crowdfunds_200"] = (
-        Crowdfund.objects.annotate(
-            percent=F("payment_received") / F("payment_required")
+
+    stats["total_exemptions"] = Exemption.objects.count()
+    stats["total_invoked_exemptions"] = InvokedExemption.objects.count()
+    stats["total_example_appeals"] = ExampleAppeal.objects.count()
+
+    stats.update(
+        count_where(
+            Crowdsource.objects.all(),
+            total_crowdsources=None,
+            total_draft_crowdsources=Q(status="draft"),
+            total_open_crowdsources=Q(status="open"),
+            total_close_crowdsources=Q(status="close"),
         )
-        .filter(closed=True, percent__gt=2.00)
-        .count()
-    )
-    kwargs["total_crowdfund_payments"] = CrowdfundPayment.objects.count()
-    kwargs["total_crowdfund_payments_loggedin"] = CrowdfundPayment.objects.exclude(
-        user=None
-    ).count()
-    kwargs["total_crowdfund_payments_loggedout"] = CrowdfundPayment.objects.filter(
-        user=None
-    ).count()
-    kwargs["public_projects"] = Project.objects.filter(
-        private=False, approved=True
-    ).count()
-    kwargs["private_projects"] = Project.objects.filter(
-        private=True, approved=True
-    ).count()
-    kwargs["unapproved_projects"] = Project.objects.filter(approved=False).count()
-    kwargs["crowdfund_projects"] = Project.objects.exclude(crowdfunds=None).count()
-    kwargs["project_users"] = User.objects.exclude(projects=None).count()
-    kwargs["project_users_pro"] = (
-        User.objects.filter(organizations__entitlement__slug="professional")
-        .exclude(projects=None)
-        .count()
-    )
-    kwargs["project_users_basic"] = (
-        User.objects.filter(organizations__entitlement__slug="free")
-        .exclude(projects=None)
-        .count()
     )
-    kwargs["project_users_beta"] = (
-        User.objects.filter(organizations__entitlement__slug="beta")
-        .exclude(projects=None)
-        .count()
-    )
-    kwargs["project_users_proxy"] = (
-        User.objects.filter(organizations__entitlement__slug="proxy")
-        .exclude(projects=None)
-        .count()
+    stats.update(
+        CrowdsourceResponse.objects.aggregate(
+            total_crowdsource_responses=Count("pk"),
+            num_crowdsource_responded_users=Count("user", distinct=True),
+        )
     )
-    kwargs["project_users_admin"] = (
-        User.objects.filter(organizations__entitlement__slug="admin")
-        .exclude(projects=None)
-        .count()
+    stats.update(
+        count_by(
+            CrowdsourceResponse.objects.all(),
+            f"user__{entitlement}",
+            {f"crowdsource_responses_{name}": slug for name, slug in ENTITLEMENTS},
+        )
     )
-    kwargs["total_exemptions"] = Exemption.objects.count()
-    kwargs["total_invoked_exemptions"] = InvokedExemption.objects.count()
-    kwargs["total_example_appeals"] = ExampleAppeal.objects.count()
-    kwargs["total_crowdsources"] = Crowdsource.objects.count()
-    kwargs["total_draft_crowdsources"] = Crowdsource.objects.filter(
-        status="draft"
-    ).count()
-    kwargs["total_open_crowdsources"] = Crowdsource.objects.filter(
-        status="open"
-    ).count()
-    kwargs["total_close_crowdsources"] = Crowdsource.objects.filter(
-        status="close"
-    ).count()
-    kwargs[
-        "num_crowdsource_responded_users"
-    ] = CrowdsourceResponse.objects.get_user_count()
-    kwargs["total_crowdsource_responses"] = CrowdsourceResponse.objects.count()
-    kwargs["crowdsource_responses_pro"] = CrowdsourceResponse.objects.filter(
-        user__organizations__entitlement__slug="professional"
-    ).count()
-    kwargs["crowdsource_responses_basic"] = CrowdsourceResponse.objects.filter(
-        user__organizations__entitlement__slug="free"
-    ).count()
-    kwargs["crowdsource_responses_beta"] = CrowdsourceResponse.objects.filter(
-        user__organizations__entitlement__slug="beta"
-    ).count()
-    kwargs["crowdsource_responses_proxy"] = CrowdsourceResponse.objects.filter(
-        user__organizations__entitlement__slug="proxy"
-    ).count()
-    kwargs["crowdsource_responses_admin"] = CrowdsourceResponse.objects.filter(
-        user__organizations__entitlement__slug="admin"
-    ).count()
+    return stats
+
+
+STATISTICS_SECTIONS = [
+    _request_statistics,
+    _communication_statistics,
+    _machine_request_statistics,
+    _site_statistics,
+    _task_statistics,
+    _crowdfund_statistics,
+    _project_statistics,
+]
+
+
+@periodic_task(
+    run_every=crontab(hour=0, minute=30),
+    name="muckrock.accounts.tasks.store_statistics",
+)
+def store_statistics():
+    """Store the daily statistics"""
+    midnight = time(tzinfo=timezone.get_current_timezone())
+    today_midnight = datetime.combine(date.today(), midnight)
+    yesterday = date.today() - timedelta(1)
+    yesterday_midnight = today_midnight - timedelta(1)
+
+    kwargs = {"date": yesterday}
+    timings = []
+    for section in STATISTICS_SECTIONS:
+        start = perf_counter()
+        kwargs.update(section(yesterday_midnight, today_midnight))
+        timings.append(f"{section.__name__}: {perf_counter() - start:.2f}s")
+    logger.info("Statistics timings - %s", ", ".join(timings))
 
     Statistics.objects.create(**kwargs)
 
@@ -5,11 +5,16 @@ Tests tasks for the Accounts application
 # Django
 from django.test import TestCase
 
+# Standard Library
+from datetime import date, timedelta
+
 # Third Party
 from nose.tools import eq_
 
 # MuckRock
 from muckrock.accounts import models, tasks
+from muckrock.foia.factories import FOIARequestFactory
+from muckrock.task.factories import FlaggedTaskFactory
 
 
 class TestStatisticsTask(TestCase):
@@ -23,3 +28,22 @@ class TestStatisticsTask(TestCase):
         eq_(
             new_stat_count, stat_count + 1, "A new Statistics object should be created."
         )
+
+    def test_stats_counts(self):
+        """The grouped counts should match counting each separately"""
+        foias = FOIARequestFactory.create_batch(2, status="done")
+        FOIARequestFactory(status="rejected")
+        FlaggedTaskFactory(foia=foias[0], resolved=True)
+        FlaggedTaskFactory(foia=foias[1], date_deferred=date.today() + timedelta(1))
+        tasks.store_statistics()
+        stats = models.Statistics.objects.get()
+        eq_(stats.total_requests, 3)
+        eq_(stats.total_requests_success, 2)
+        eq_(stats.total_requests_denied, 1)
+        eq_(stats.total_requests_submitted, 0)
+        eq_(stats.total_composers, 3)
+        eq_(stats.total_users_filed, 3)
+        eq_(stats.total_flagged_tasks, 2)
+        eq_(stats.total_unresolved_flagged_tasks, 0)
+        eq_(stats.total_deferred_flagged_tasks, 1)
+        eq_(stats.total_snailmail_tasks, 0)
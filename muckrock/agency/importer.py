@@ -12,6 +12,7 @@ from django.utils.text import slugify
 # Standard Library
 import csv
 import re
+from itertools import islice
 
 # Third Party
 from fuzzywuzzy import fuzz, process
@@ -19,6 +20,7 @@ from localflavor.us.us_states import STATE_CHOICES
 
 # MuckRock
 from muckrock.agency.models import Agency, AgencyAddress, AgencyEmail, AgencyPhone
+from muckrock.communication.allowlist import defer_clear_allowlist
 from muckrock.communication.models import Address, EmailAddress, PhoneNumber
 from muckrock.jurisdiction.models import Jurisdiction
 from muckrock.portal.models import PORTAL_TYPES, Portal
@@ -67,9 +69,12 @@ class Importer:
     """Match and import multiple agencies at a time"""
 
     p_zip = re.compile(r"^\d{5}(?:-\d{4})?$")
+    # how many agencies to fetch the phone and fax numbers for at once
+    chunk_size = 100
 
     def __init__(self, reader):
         self.data = reader.read()
+        self.numbers = {}
 
     def _match_jurisdiction(self, datum):
         """Match the jurisdiction name"""
@@ -217,11 +222,36 @@ class Importer:
                 )
             datum["email_status"] = "set {}".format(status)
 
+    def _fetch_numbers(self, data):
+        """Fetch the phone and fax numbers for chunks of agencies at once"""
+        while True:
+            chunk = list(islice(data, self.chunk_size))
+            if not chunk:
+                return
+            # skip the agencies which will not be imported, see `_validate`
+            valid = [d for d in chunk if d.get("agency") and d.get("jurisdiction")]
+            self.numbers = {}
+            for type_ in ("phone", "fax"):
+                numbers = [datum[type_] for datum in valid if datum.get(type_)]
+                phones = PhoneNumber.objects.fetch_many(*numbers, type_=type_)
+                self.numbers.update(
+                    ((number, type_), phone) for number, phone in zip(numbers, phones)
+                )
+            yield from chunk
+
+    def _get_number(self, number, type_):
+        """Get a phone or fax number fetched by `_fetch_numbers`"""
+        if (number, type_) not in self.numbers:
+            self.numbers[(number, type_)] = PhoneNumber.objects.fetch(
+                number, type_=type_
+            )
+        return self.numbers[(number, type_)]
+
     def _import_phone(self, agency, datum):
         """Import an agency's phone number"""
         phone = datum.get("phone")
         if phone:
-            phone_number = PhoneNumber.objects.fetch(phone, type_="phone")
+            phone_number = self._get_number(phone, "phone")
             if phone_number is None:
                 datum["phone_status"] = "error"
                 return
@@ -237,7 +267,7 @@ class Importer:
         """Import an agency's fax number"""
         fax = datum.get("fax")
         if fax:
-            fax_number = PhoneNumber.objects.fetch(fax, type_="fax")
+            fax_number = self._get_number(fax, "fax")
             if fax_number is None:
                 datum["fax_status"] = "error"
                 return
@@ -391,7 +421,9 @@ class Importer:
 
     def import_(self, user=None, dry=False):
         """Import all agency data"""
-        with transaction.atomic():
+        self.data = self._fetch_numbers(self.data)
+        # clear the allowlist once the import is committed, instead of for each email
+        with defer_clear_allowlist(), transaction.atomic():
             sid = transaction.savepoint()
             for datum in self.match():
                 yield self._import_one(datum, user)
@@ -22,6 +22,7 @@ from easy_thumbnails.fields import ThumbnailerImageField
 # MuckRock
 from muckrock.accounts.models import Profile
 from muckrock.core.utils import squarelet_post
+from muckrock.foia.models import FOIAAccess
 from muckrock.jurisdiction.models import Jurisdiction, RequestHelper
 from muckrock.task.models import NewAgencyTask
 
@@ -351,8 +352,12 @@ class Agency(models.Model, RequestHelper):
             "newagencytask_set",
             "staleagencytask_set",
         ]
+        # the moved requests' agency access grants must be synced, as the
+        # update does not send signals
+        foia_pks = list(agency.foiarequest_set.values_list("pk", flat=True))
         for relation in replace_relations:
             getattr(agency, relation).update(agency=self)
+        FOIAAccess.objects.sync(foia_pks)
         # appeal jurisdictions attribute it appeal agency
         agency.appeal_jurisdictions.update(appeal_agency=self)
 
@@ -32,6 +32,7 @@ from muckrock.foia.factories import (
     FOIARequestFactory,
     FOIATemplateFactory,
 )
+from muckrock.foia.models import FOIAAccess
 
 
 class TestAgencyUnit(TestCase):
@@ -158,6 +159,13 @@ class TestAgencyUnit(TestCase):
 
         eq_(bad_agency.status, "rejected")
         eq_(foia.agency, good_agency)
+        # the agency access grants are moved along with the requests
+        ok_(
+            FOIAAccess.objects.filter(
+                foia=foia, reason="agency", agency=good_agency
+            ).exists()
+        )
+        ok_(not FOIAAccess.objects.filter(foia=foia, agency=bad_agency).exists())
         eq_(composer.agencies.first(), good_agency)
         eq_(appeal_agency.appeal_agency, good_agency)
 
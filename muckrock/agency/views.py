@@ -39,7 +39,7 @@ from muckrock.core.views import (
     ModelFilterMixin,
     MRAutocompleteView,
     MRListView,
-    MRSearchFilterListView,
+    MRSearchFilterCursorListView,
 )
 from muckrock.foia.filters import FOIAFileFilterSet
 from muckrock.foia.models import FOIAFile, FOIATemplate
@@ -48,7 +48,7 @@ from muckrock.jurisdiction.models import Jurisdiction
 from muckrock.task.models import FlaggedTask, ReviewAgencyTask
 
 
-class AgencyList(MRSearchFilterListView):
+class AgencyList(MRSearchFilterCursorListView):
     """Filterable list of agencies"""
 
     model = Agency
@@ -72,7 +72,11 @@ def detail(request, jurisdiction, jidx, slug, idx):
 
     agency = get_object_or_404(
         Agency.objects.select_related(
-            "jurisdiction", "jurisdiction__parent", "jurisdiction__parent__parent"
+            "jurisdiction",
+            "jurisdiction__parent",
+            "jurisdiction__parent__parent",
+            "jurisdiction__request_stats",
+            "request_stats",
         ),
         jurisdiction__slug=jurisdiction,
         jurisdiction__pk=jidx,
@@ -16,6 +16,7 @@ from muckrock.agency.models import Agency
 from muckrock.agency.serializers import AgencySerializer
 from muckrock.communication.models import Address, EmailAddress, PhoneNumber
 from muckrock.core.models import ExtractDay, NullIf
+from muckrock.core.pagination import OptionalKeysetPagination
 
 
 def CountWhen(output_field=None, **kwargs):
@@ -29,6 +30,7 @@ def CountWhen(output_field=None, **kwargs):
 class AgencyViewSet(viewsets.ModelViewSet):
     """API views for Agency"""
 
+    pagination_class = OptionalKeysetPagination
     queryset = (
         Agency.objects.order_by("id")
         .select_related("jurisdiction", "parent", "appeal_agency")
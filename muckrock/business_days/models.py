@@ -3,10 +3,12 @@ Models for the Business Days application
 """
 # Django
 from django.db import models
+from django.utils.functional import cached_property
 
 # Standard Library
-from calendar import monthrange
-from datetime import timedelta
+from bisect import bisect_left
+from calendar import isleap, monthrange
+from datetime import date, timedelta
 
 # Third Party
 from dateutil.easter import easter
@@ -133,16 +135,60 @@ class Holiday(models.Model):
 
 
 class HolidayCalendar:
-    """A set of holidays"""
+    """A set of holidays
+
+    Business days are looked up in per year tables of prefix sums, so that
+    counting or skipping business days does not need to check every day
+    against every holiday.  The tables are shared between all calendars with
+    the same holidays and observance rules.
+    """
+
+    # (holiday set, observe_sat, year) -> prefix sums of business days
+    _tables = {}
 
     def __init__(self, holidays, observe_sat):
         self.holidays = holidays
         self.observe_sat = observe_sat
 
+    @cached_property
+    def _holidays(self):
+        """The holidays, evaluated once"""
+        return list(self.holidays)
+
+    @cached_property
+    def _key(self):
+        """Identify this calendar's holidays and observance rules"""
+        return (
+            frozenset(
+                (h.kind, h.name, h.month, h.day, h.weekday, h.num)
+                for h in self._holidays
+            ),
+            self.observe_sat,
+        )
+
+    def _table(self, year):
+        """Prefix sums of business days for the given year
+
+        table[n] is the number of business days in the first n days of the year
+        """
+        key = (self._key, year)
+        table = self._tables.get(key)
+        if table is None:
+            jan_1 = date(year, 1, 1)
+            table = [0]
+            for i in range(366 if isleap(year) else 365):
+                date_ = jan_1 + timedelta(i)
+                table.append(
+                    table[-1]
+                    + (date_.weekday() not in (SAT, SUN) and not self.is_holiday(date_))
+                )
+            self._tables[key] = table
+        return table
+
     def is_holiday(self, date_):
         """Is given date a holiday?"""
 
-        for holiday in self.holidays:
+        for holiday in self._holidays:
             if holiday.match(date_, self.observe_sat):
                 return holiday
         return None
@@ -150,39 +196,57 @@ class HolidayCalendar:
     def is_business_day(self, date_):
         """Is the given date a business day?"""
 
-        weekday = date_.weekday()
-        if weekday in (SAT, SUN):
-            return False
-
-        return not self.is_holiday(date_)
+        table = self._table(date_.year)
+        day = date_.timetuple().tm_yday
+        return table[day] > table[day - 1]
 
     def business_days_from(self, date_, num):
         """Returns the date n business days from the given date"""
 
-        # could be optimized
-        delta = timedelta(1 if num >= 0 else -1)
-        num = abs(num)
-
-        while num:
-            date_ += delta
-            if self.is_business_day(date_):
-                num -= 1
-        return date_
+        if num == 0:
+            return date_
+
+        year = date_.year
+        day = date_.timetuple().tm_yday
+        table = self._table(year)
+        if num > 0:
+            # skip ahead whole years until the date falls within this one
+            while num > table[-1] - table[day]:
+                num -= table[-1] - table[day]
+                year += 1
+                day = 0
+                table = self._table(year)
+            # the first day on which the count reaches num
+            day = bisect_left(table, table[day] + num)
+        else:
+            num = -num
+            while num > table[day - 1]:
+                num -= table[day - 1]
+                year -= 1
+                table = self._table(year)
+                day = len(table)
+            # the last day before date_ with num business days from it to date_
+            day = bisect_left(table, table[day - 1] - num + 1)
+        return date(year, 1, 1) + timedelta(day - 1)
+
+    def business_days_from_many(self, dates):
+        """Returns the date n business days from each of the (date, n) pairs"""
+        return [self.business_days_from(date_, num) for date_, num in dates]
 
     def business_days_between(self, date_a, date_b):
         """How many business days are between the given dates?"""
 
-        # could be optimized
         sign = 1
         if date_a > date_b:
             date_a, date_b = date_b, date_a
             sign = -1
 
-        num = 0
-        while date_a < date_b:
-            date_a += timedelta(1)
-            if self.is_business_day(date_a):
-                num += 1
+        # the business days after date_a through date_b
+        table = self._table(date_a.year)
+        num = -table[date_a.timetuple().tm_yday]
+        for year in range(date_a.year, date_b.year):
+            num += self._table(year)[-1]
+        num += self._table(date_b.year)[date_b.timetuple().tm_yday]
         return num * sign
 
 
@@ -201,6 +265,10 @@ class Calendar:
         """Returns the date n business days from the given date"""
         return date_ + timedelta(num)
 
+    def business_days_from_many(self, dates):
+        """Returns the date n business days from each of the (date, n) pairs"""
+        return [date_ + timedelta(num) for date_, num in dates]
+
     def business_days_between(self, date_a, date_b):
         """How many business days are between the given dates?"""
         return abs((date_a - date_b).days)
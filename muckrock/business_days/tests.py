@@ -6,7 +6,7 @@ Tests using nose for the business_days application
 from django.test import TestCase
 
 # Standard Library
-from datetime import date
+from datetime import date, timedelta
 
 # Third Party
 import nose.tools
@@ -113,3 +113,53 @@ class TestBusinessDayUnit(TestCase):
         nose.tools.eq_(
             self.gen_cal.business_days_between(date(2010, 11, 1), date(2010, 12, 1)), 30
         )
+
+    def test_business_days_across_years(self):
+        """Test business days spanning the new year, in both directions"""
+
+        # Dec 31, 2010 is a Friday, and observed as New Year's Day
+        nose.tools.eq_(
+            self.usa_cal.business_days_from(date(2010, 12, 30), 1), date(2011, 1, 3)
+        )
+        nose.tools.eq_(
+            self.usa_cal.business_days_from(date(2011, 1, 3), -1), date(2010, 12, 30)
+        )
+        nose.tools.eq_(
+            self.usa_cal.business_days_between(date(2011, 1, 3), date(2010, 12, 30)),
+            -1,
+        )
+        nose.tools.eq_(
+            self.usa_cal.business_days_from(date(2010, 12, 15), -30), date(2010, 11, 1)
+        )
+
+    def test_business_days_match_day_by_day(self):
+        """The business day tables should agree with checking each day"""
+
+        start = date(2009, 12, 1)
+        num = 0
+        for i in range(1, 800):
+            date_ = start + timedelta(i)
+            business = date_.weekday() < 5 and not self.usa_cal.is_holiday(date_)
+            nose.tools.eq_(self.usa_cal.is_business_day(date_), business)
+            if business:
+                num += 1
+                nose.tools.eq_(self.usa_cal.business_days_from(start, num), date_)
+            nose.tools.eq_(self.usa_cal.business_days_between(start, date_), num)
+
+    def test_business_days_from_many(self):
+        """Test computing many due dates at once"""
+
+        nose.tools.eq_(
+            self.usa_cal.business_days_from_many(
+                [
+                    (date(2010, 11, 1), 30),
+                    (date(2010, 12, 30), 1),
+                    (date(2011, 7, 5), 0),
+                ]
+            ),
+            [date(2010, 12, 15), date(2011, 1, 3), date(2011, 7, 5)],
+        )
+        nose.tools.eq_(
+            self.gen_cal.business_days_from_many([(date(2010, 11, 1), 30)]),
+            [date(2010, 12, 1)],
+        )
@@ -0,0 +1,95 @@
+"""
+The allowlist of senders who may post to requests
+
+The whitelisted domains, and the agencies each email address belongs to,
+are kept in a single cached index, which is cleared by the signal handlers in
+`muckrock.communication.signals` whenever a whitelisted domain or an agency's
+email addresses change
+"""
+
+# Django
+from django.conf import settings
+from django.core.cache import cache
+
+# Standard Library
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Third Party
+from localflavor.us.us_states import STATE_CHOICES
+
+# MuckRock
+from muckrock.core.utils import cache_get_or_set
+
+# bump this when the cached index changes shape
+ALLOWLIST_CACHE_VERSION = 2
+ALLOWLIST_CACHE_KEY = "allowlist:v{}".format(ALLOWLIST_CACHE_VERSION)
+
+# known government top level domains
+ALLOWED_TLDS = tuple(
+    [
+        ".%s.us" % a.lower()
+        for (a, _) in STATE_CHOICES
+        if a not in ("AS", "DC", "GU", "MP", "PR", "VI")
+    ]
+    + [".gov", ".mil"]
+)
+
+
+# whether clearing the index is deferred, and was asked for, in this thread
+_deferred = threading.local()
+
+
+def _build_allowlist():
+    """Build the index of whitelisted domains and agency email addresses"""
+    # pylint: disable=import-outside-toplevel
+    # MuckRock
+    from muckrock.agency.models import AgencyEmail
+    from muckrock.mailgun.models import WhitelistDomain
+
+    agency_emails = defaultdict(set)
+    for email_id, agency_id in AgencyEmail.objects.values_list(
+        "email_id", "agency_id"
+    ).iterator():
+        agency_emails[email_id].add(agency_id)
+    return {
+        "domains": frozenset(
+            domain.lower()
+            for domain in WhitelistDomain.objects.values_list("domain", flat=True)
+        ),
+        # the agencies for each email address
+        "agency_emails": {
+            email_id: frozenset(agency_ids)
+            for email_id, agency_ids in agency_emails.items()
+        },
+    }
+
+
+def get_allowlist():
+    """The cached index of whitelisted domains and agency email addresses"""
+    return cache_get_or_set(
+        ALLOWLIST_CACHE_KEY, _build_allowlist, settings.DEFAULT_CACHE_TIMEOUT
+    )
+
+
+def clear_allowlist():
+    """Clear the cached index, unless it is deferred by `defer_clear_allowlist`"""
+    if getattr(_deferred, "depth", 0):
+        _deferred.cleared = True
+    else:
+        cache.delete(ALLOWLIST_CACHE_KEY)
+
+
+@contextmanager
+def defer_clear_allowlist():
+    """Clear the cached index once at the end of many changes, such as an agency
+    import, instead of once for each change"""
+    _deferred.depth = getattr(_deferred, "depth", 0) + 1
+    try:
+        yield
+    finally:
+        _deferred.depth -= 1
+        if not _deferred.depth and getattr(_deferred, "cleared", False):
+            _deferred.cleared = False
+            clear_allowlist()
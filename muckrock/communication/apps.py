@@ -10,3 +10,9 @@ class CommunicationConfig(AppConfig):
     """Communication app config"""
 
     name = "muckrock.communication"
+
+    def ready(self):
+        """Connects the signal handlers"""
+        # pylint: disable=import-outside-toplevel
+        # MuckRock
+        import muckrock.communication.signals  # pylint: disable=unused-import
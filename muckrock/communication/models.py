@@ -20,11 +20,10 @@ from email.utils import getaddresses, parseaddr
 # Third Party
 import phonenumbers
 from localflavor.us.models import USStateField, USZipCodeField
-from localflavor.us.us_states import STATE_CHOICES
 from phonenumber_field.modelfields import PhoneNumberField
 
 # MuckRock
-from muckrock.mailgun.models import WhitelistDomain
+from muckrock.communication.allowlist import ALLOWED_TLDS, get_allowlist
 
 PHONE_TYPES = (("fax", "Fax"), ("phone", "Phone"))
 CHECK_STATUS = (
@@ -38,6 +37,44 @@ CHECK_STATUS = (
 # Address models
 
 
+def _bulk_upsert(queryset, unique_field, update_field, values, key):
+    """Fetch or create an object for each value of a unique field
+
+    `values` maps each unique value to the value to set on the update field.
+    Existing objects are fetched with a single query, missing ones are
+    created together, and changed fields are updated together.  Returns the
+    objects keyed by their unique value, as given by the `key` function.
+    """
+    if not values:
+        return {}
+    objects = {
+        key(obj): obj
+        for obj in queryset.filter(**{f"{unique_field}__in": list(values)})
+    }
+    missing = [value for value in values if value not in objects]
+    if missing:
+        # another process may create some of them at the same time
+        queryset.bulk_create(
+            [
+                queryset.model(**{unique_field: value, update_field: values[value]})
+                for value in missing
+            ],
+            ignore_conflicts=True,
+        )
+        objects.update(
+            (key(obj), obj)
+            for obj in queryset.filter(**{f"{unique_field}__in": missing})
+        )
+    changed = []
+    for value, obj in objects.items():
+        if getattr(obj, update_field) != values[value]:
+            setattr(obj, update_field, values[value])
+            changed.append(obj)
+    if changed:
+        queryset.bulk_update(changed, [update_field])
+    return objects
+
+
 class EmailAddressQuerySet(models.QuerySet):
     """QuerySet for EmailAddresses"""
 
@@ -60,9 +97,14 @@ class EmailAddressQuerySet(models.QuerySet):
         return email_address
 
     def fetch_many(self, *addresses, **kwargs):
-        """Fetch multiple email address objects based on an email header"""
+        """Fetch multiple email address objects based on an email header
+
+        They are returned in the order given, with any new addresses created
+        and any changed names updated in bulk
+        """
         name_emails = getaddresses(addresses)
-        addresses = []
+        emails = []
+        names = {}
         for name, email in name_emails:
             try:
                 email = self._normalize_email(email)
@@ -71,11 +113,12 @@ class EmailAddressQuerySet(models.QuerySet):
                     continue
                 else:
                     raise
-            email_address, _ = self.update_or_create(
-                email=email, defaults={"name": name}
-            )
-            addresses.append(email_address)
-        return addresses
+            emails.append(email)
+            names[email] = name
+        email_addresses = _bulk_upsert(
+            self, "email", "name", names, key=lambda obj: obj.email
+        )
+        return [email_addresses[email] for email in emails]
 
     @staticmethod
     def _normalize_email(email):
@@ -120,43 +163,30 @@ class EmailAddress(models.Model):
 
     def allowed(self, foia=None):
         """Is this email address allowed to post to this FOIA request?"""
-        # pylint: disable=too-many-return-statements, import-outside-toplevel
-        # MuckRock
-        from muckrock.agency.models import AgencyEmail
-
-        allowed_tlds = [
-            ".%s.us" % a.lower()
-            for (a, _) in list(STATE_CHOICES)
-            if a not in ("AS", "DC", "GU", "MP", "PR", "VI")
-        ]
-        allowed_tlds.extend([".gov", ".mil"])
-
         # from the same domain as the FOIA email
         if foia and foia.email and self.domain == foia.email.domain:
             return True
 
-        # the email is a known email for this FOIA's agency
-        if foia and self.agencies.filter(pk=foia.agency_id).exists():
+        # it is from any known government TLD
+        if self.email.endswith(ALLOWED_TLDS):
             return True
 
-        # the email is a known email for this FOIA
-        if foia and foia.cc_emails.filter(email=self).exists():
-            return True
+        allowlist = get_allowlist()
 
-        # it is from any known government TLD
-        if any(self.email.endswith(tld) for tld in allowed_tlds):
+        # check the email domain against the whitelist
+        if self.domain.lower() in allowlist["domains"]:
             return True
 
         # if not associated with any FOIA,
         # checked if the email is known for any agency
-        if not foia and AgencyEmail.objects.filter(email=self).exists():
-            return True
+        agency_ids = allowlist["agency_emails"].get(self.pk, ())
+        if not foia:
+            return bool(agency_ids)
 
-        # check the email domain against the whitelist
-        if WhitelistDomain.objects.filter(domain__iexact=self.domain).exists():
+        # the email is a known email for this FOIA's agency, or for this FOIA
+        if foia.agency_id in agency_ids:
             return True
-
-        return False
+        return foia.cc_emails.filter(pk=self.pk).exists()
 
     class Meta:
         verbose_name_plural = "email addresses"
@@ -176,6 +206,35 @@ class PhoneNumberQuerySet(models.QuerySet):
         except phonenumbers.NumberParseException:
             return None
 
+    def fetch_many(self, *numbers, type_="fax"):
+        """Fetch multiple numbers from the database, creating any which do not
+        exist, in the order given
+
+        Invalid numbers are returned as None, as they are from `fetch`
+        """
+        e164_numbers = []
+        for number in numbers:
+            try:
+                number = phonenumbers.parse(number, "US")
+            except phonenumbers.NumberParseException:
+                number = None
+            if number is not None and phonenumbers.is_valid_number(number):
+                e164_numbers.append(
+                    phonenumbers.format_number(
+                        number, phonenumbers.PhoneNumberFormat.E164
+                    )
+                )
+            else:
+                e164_numbers.append(None)
+        phones = _bulk_upsert(
+            self,
+            "number",
+            "type",
+            {number: type_ for number in e164_numbers if number is not None},
+            key=lambda obj: obj.number.as_e164,
+        )
+        return [phones.get(number) for number in e164_numbers]
+
 
 class PhoneNumber(models.Model):
     """A phone number"""
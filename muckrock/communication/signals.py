@@ -0,0 +1,53 @@
+"""Model signal handlers for the Communication application"""
+
+# Django
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+# MuckRock
+from muckrock.agency.models import AgencyEmail
+from muckrock.communication.allowlist import clear_allowlist
+from muckrock.mailgun.models import WhitelistDomain
+
+
+def allowlist_changed(sender, **kwargs):
+    """Whitelisted domains or agency email addresses were changed"""
+    # pylint: disable=unused-argument
+    clear_allowlist()
+
+
+def agency_emails_changed(sender, action, **kwargs):
+    """Email addresses were added to or removed from an agency"""
+    # pylint: disable=unused-argument
+    if action in ("post_add", "post_remove", "post_clear"):
+        clear_allowlist()
+
+
+post_save.connect(
+    allowlist_changed,
+    sender=WhitelistDomain,
+    dispatch_uid="muckrock.communication.signals.whitelist_domain_save",
+)
+
+post_delete.connect(
+    allowlist_changed,
+    sender=WhitelistDomain,
+    dispatch_uid="muckrock.communication.signals.whitelist_domain_delete",
+)
+
+post_save.connect(
+    allowlist_changed,
+    sender=AgencyEmail,
+    dispatch_uid="muckrock.communication.signals.agency_email_save",
+)
+
+post_delete.connect(
+    allowlist_changed,
+    sender=AgencyEmail,
+    dispatch_uid="muckrock.communication.signals.agency_email_delete",
+)
+
+m2m_changed.connect(
+    agency_emails_changed,
+    sender=AgencyEmail,
+    dispatch_uid="muckrock.communication.signals.agency_emails_changed",
+)
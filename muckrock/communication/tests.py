@@ -8,10 +8,12 @@ from django.forms import ValidationError
 from django.test import TestCase
 
 # Third Party
+import mock
 from nose.tools import assert_false, assert_raises, eq_, ok_
 
 # MuckRock
-from muckrock.communication.models import EmailAddress
+from muckrock.communication.allowlist import ALLOWLIST_CACHE_KEY, defer_clear_allowlist
+from muckrock.communication.models import EmailAddress, PhoneNumber
 from muckrock.foia.factories import FOIARequestFactory
 from muckrock.mailgun.models import WhitelistDomain
 
@@ -30,6 +32,20 @@ class TestEmailAddress(TestCase):
         with assert_raises(ValidationError):
             EmailAddress.objects.fetch_many("a@a.comn, foobar", ignore_errors=False)
 
+    def test_fetch_many_bulk(self):
+        """Existing addresses are updated and new ones created, in order"""
+        existing = EmailAddress.objects.fetch('"Old Name" <b@b.com>')
+        with self.assertNumQueries(4):
+            emails = EmailAddress.objects.fetch_many(
+                '"New Name" <b@b.com>, a@A.com', "c@c.com, b@B.com"
+            )
+        eq_([e.email for e in emails], ["b@b.com", "a@a.com", "c@c.com", "b@b.com"])
+        eq_(emails[0].pk, existing.pk)
+        existing.refresh_from_db()
+        eq_(existing.name, "")
+        with self.assertNumQueries(1):
+            EmailAddress.objects.fetch_many("a@a.com, c@c.com")
+
     def test_allowed(self):
         """Test allowed email function"""
         foia = FOIARequestFactory(
@@ -68,6 +84,27 @@ class TestEmailAddress(TestCase):
         # non foia test - any agency email
         ok_(EmailAddress.objects.fetch("main@agency.com").allowed())
 
+    @mock.patch("muckrock.communication.signals.clear_allowlist")
+    def test_allowlist_cleared(self, mock_clear):
+        """The cached allowlist is cleared when it changes"""
+        WhitelistDomain.objects.create(domain="whitehat.edu")
+        eq_(mock_clear.call_count, 1)
+        foia = FOIARequestFactory()
+        mock_clear.reset_mock()
+        foia.agency.emails.add(EmailAddress.objects.fetch("new@agency.com"))
+        ok_(mock_clear.called)
+
+    @mock.patch("muckrock.communication.allowlist.cache")
+    def test_allowlist_deferred(self, mock_cache):
+        """Bulk changes only clear the cached allowlist once"""
+        foia = FOIARequestFactory()
+        mock_cache.reset_mock()
+        with defer_clear_allowlist():
+            foia.agency.emails.add(EmailAddress.objects.fetch("one@agency.com"))
+            foia.agency.emails.add(EmailAddress.objects.fetch("two@agency.com"))
+            ok_(not mock_cache.delete.called)
+        mock_cache.delete.assert_called_once_with(ALLOWLIST_CACHE_KEY)
+
     def test_domain(self):
         """Test the domain method"""
         eq_(EmailAddress.objects.fetch("a@a.com").domain, "a.com")
@@ -77,3 +114,20 @@ class TestEmailAddress(TestCase):
         """Test the __str__ method"""
         email = '"John Doe" <john@doe.com>'
         eq_(str(EmailAddress.objects.fetch(email)), email)
+
+
+class TestPhoneNumber(TestCase):
+    """Test the phone number model"""
+
+    def test_fetch_many(self):
+        """Test the fetch_many query set method"""
+        existing = PhoneNumber.objects.fetch("617-555-0001", type_="phone")
+        numbers = PhoneNumber.objects.fetch_many(
+            "617-555-0002", "foobar", "(617) 555-0001"
+        )
+        eq_(
+            [n and n.number.as_e164 for n in numbers],
+            ["+16175550002", None, "+16175550001"],
+        )
+        eq_(numbers[2].pk, existing.pk)
+        ok_(all(n.type == "fax" for n in numbers if n))
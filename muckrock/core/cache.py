@@ -0,0 +1,385 @@
+"""
+Caching utilities
+
+A two tier cache backend.  Values are stored in Redis, which is shared by
+every web and celery process, with a small, short lived local memory cache in
+front of it in each process.  Every write is published on a Redis channel, and
+each process drops its local copy of the written keys before its next read, so
+deletes and updates take effect across the whole cluster.
+
+Also protection against many processes recomputing the same expired value at
+once, see `get_or_refresh`, and a rate limit shared by all processes, see
+`TokenBucket`.
+"""
+
+# Django
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+
+# Standard Library
+import logging
+import math
+import os
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+
+# Third Party
+from django_redis.cache import RedisCache
+from redis.exceptions import RedisError
+from redis_lock import NotAcquired
+
+logger = logging.getLogger(__name__)
+
+# published in place of a key to clear every process's local cache
+CLEAR_ALL = "*"
+
+_missing = object()
+
+
+class TieredCache(RedisCache):
+    """A Redis cache with a per process local memory cache in front of it
+
+    Extra options:
+        L1_TIMEOUT - seconds a value may be served from the local cache
+        L1_MAX_ENTRIES - maximum number of values in the local cache
+        INVALIDATION_CHANNEL - the Redis channel written keys are published on
+
+    The local cache is bypassed whenever the invalidation channel is
+    unavailable, so a value is never served locally without it
+    """
+
+    def __init__(self, server, params):
+        params = dict(params)
+        options = dict(params.get("OPTIONS", {}))
+        l1_timeout = options.pop("L1_TIMEOUT", 10)
+        l1_max_entries = options.pop("L1_MAX_ENTRIES", 1000)
+        self._channel = options.pop("INVALIDATION_CHANNEL", "cache:invalidate")
+        params["OPTIONS"] = options
+        super().__init__(server, params)
+        self._local = LocMemCache(
+            f"tiered:{self._channel}:{self.key_prefix}",
+            {"TIMEOUT": l1_timeout, "OPTIONS": {"MAX_ENTRIES": l1_max_entries}},
+        )
+        self._pubsub = None
+        self._pubsub_pid = None
+        self._pubsub_lock = threading.Lock()
+
+    def _sync(self):
+        """Drop any local values that have been written by any process
+
+        Returns whether the local cache may be used
+        """
+        with self._pubsub_lock:
+            try:
+                if self._pubsub is None or self._pubsub_pid != os.getpid():
+                    # subscriptions are not shared with forked processes, and
+                    # anything published before subscribing has been missed
+                    self._local.clear()
+                    self._pubsub = self.client.get_client(write=False).pubsub(
+                        ignore_subscribe_messages=True
+                    )
+                    self._pubsub.subscribe(self._channel)
+                    self._pubsub_pid = os.getpid()
+                message = self._pubsub.get_message()
+                while message is not None:
+                    key = message["data"].decode("utf8")
+                    if key == CLEAR_ALL:
+                        self._local.clear()
+                    else:
+                        self._local.delete(key)
+                    message = self._pubsub.get_message()
+            except RedisError:
+                logger.warning("Cache invalidation channel unavailable", exc_info=True)
+                self._pubsub = None
+                self._local.clear()
+                return False
+        return True
+
+    def _invalidate(self, keys):
+        """Drop the keys from the local cache of every process"""
+        for key in keys:
+            self._local.delete(key)
+        try:
+            pipeline = self.client.get_client(write=True).pipeline(transaction=False)
+            for key in keys:
+                pipeline.publish(self._channel, key)
+            pipeline.execute()
+        except RedisError:
+            logger.warning("Could not publish cache invalidations", exc_info=True)
+
+    def get(self, key, default=None, version=None, client=None):
+        if client is not None or not self._sync():
+            return super().get(key, default=default, version=version, client=client)
+        local_key = self.make_key(key, version=version)
+        value = self._local.get(local_key, _missing)
+        if value is _missing:
+            value = super().get(key, default=_missing, version=version)
+            if value is _missing:
+                return default
+            self._local.set(local_key, value)
+        return value
+
+    def get_many(self, keys, version=None, client=None):
+        if client is not None or not self._sync():
+            return super().get_many(keys, version=version, client=client)
+        values = {}
+        misses = []
+        for key in keys:
+            value = self._local.get(self.make_key(key, version=version), _missing)
+            if value is _missing:
+                misses.append(key)
+            else:
+                values[key] = value
+        if misses:
+            found = super().get_many(misses, version=version)
+            for key, value in found.items():
+                self._local.set(self.make_key(key, version=version), value)
+            values.update(found)
+        return values
+
+    def has_key(self, key, version=None, client=None):
+        if (
+            client is None
+            and self._sync()
+            and self._local.has_key(self.make_key(key, version=version))
+        ):
+            return True
+        return super().has_key(key, version=version, client=client)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, **kwargs):
+        result = super().set(key, value, timeout=timeout, version=version, **kwargs)
+        self._invalidate([self.make_key(key, version=version)])
+        return result
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        result = super().add(
+            key, value, timeout=timeout, version=version, client=client
+        )
+        if result:
+            self._invalidate([self.make_key(key, version=version)])
+        return result
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        result = super().set_many(data, timeout=timeout, version=version, client=client)
+        self._invalidate([self.make_key(key, version=version) for key in data])
+        return result
+
+    def delete(self, key, version=None, **kwargs):
+        result = super().delete(key, version=version, **kwargs)
+        self._invalidate([self.make_key(key, version=version)])
+        return result
+
+    def delete_many(self, keys, version=None, client=None):
+        result = super().delete_many(keys, version=version, client=client)
+        self._invalidate([self.make_key(key, version=version) for key in keys])
+        return result
+
+    def delete_pattern(self, *args, **kwargs):
+        result = super().delete_pattern(*args, **kwargs)
+        self._invalidate([CLEAR_ALL])
+        return result
+
+    def incr(self, key, delta=1, version=None, **kwargs):
+        result = super().incr(key, delta=delta, version=version, **kwargs)
+        self._invalidate([self.make_key(key, version=version)])
+        return result
+
+    def decr(self, key, delta=1, version=None, **kwargs):
+        result = super().decr(key, delta=delta, version=version, **kwargs)
+        self._invalidate([self.make_key(key, version=version)])
+        return result
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        result = super().touch(key, timeout=timeout, version=version, client=client)
+        # the local copy may now expire before the shared one does
+        self._invalidate([self.make_key(key, version=version)])
+        return result
+
+    def clear(self):
+        """Only clear this cache's keys
+
+        The Redis database is shared with the lock cache and the celery broker,
+        so it must not be flushed
+        """
+        self.delete_pattern("*")
+
+
+class CacheMetrics:
+    """Count cache hits, stale hits, misses and refreshes per key prefix
+
+    Counts are kept in memory and added to a Redis hash at most once per flush
+    interval, so that counting does not cost a round trip on every read
+    """
+
+    key = "cache_metrics"
+    events = ("hit", "stale", "miss", "refresh")
+
+    def __init__(self, flush_interval=60):
+        self.flush_interval = flush_interval
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self._flushed = time.monotonic()
+
+    def _client(self):
+        return caches["lock"].client.get_client(write=True)
+
+    def incr(self, prefix, event):
+        """Count an event for a key prefix"""
+        with self._lock:
+            self._counts[f"{prefix}:{event}"] += 1
+            if time.monotonic() - self._flushed < self.flush_interval:
+                return
+            counts, self._counts = self._counts, Counter()
+            self._flushed = time.monotonic()
+        self.flush(counts)
+
+    def flush(self, counts=None):
+        """Add the counts from this process to the shared totals"""
+        if counts is None:
+            with self._lock:
+                counts, self._counts = self._counts, Counter()
+        if not counts:
+            return
+        try:
+            pipeline = self._client().pipeline(transaction=False)
+            for field, count in counts.items():
+                pipeline.hincrby(self.key, field, count)
+            pipeline.execute()
+        except RedisError:
+            logger.warning("Could not record cache metrics", exc_info=True)
+
+    def get(self):
+        """Get the shared totals, as a dictionary of event counts per prefix"""
+        metrics = defaultdict(dict)
+        for field, count in self._client().hgetall(self.key).items():
+            prefix, event = field.decode("utf8").rsplit(":", 1)
+            metrics[prefix][event] = int(count)
+        return dict(metrics)
+
+    def reset(self):
+        """Reset the shared totals"""
+        self._client().delete(self.key)
+
+
+metrics = CacheMetrics()
+
+
+def _refresh(cache_, key, update, timeout, stale_timeout):
+    """Compute and store a value, along with its expiration and compute time"""
+    start = time.time()
+    value = update()
+    now = time.time()
+    if timeout is None:
+        cache_.set(key, (value, math.inf, 0), None)
+    else:
+        cache_.set(key, (value, now + timeout, now - start), timeout + stale_timeout)
+    return value
+
+
+def _release(lock):
+    """Release a refresh lock, which may have already expired"""
+    try:
+        lock.release()
+    except NotAcquired:
+        pass
+
+
+def get_or_refresh(cache_, key, update, timeout, stale_timeout=None, prefix=None):
+    """Get a value from the cache, computing it in only one process at a time
+
+    Each value is stored with its expiration time and how long it took to
+    compute.  It is refreshed early with a probability which increases as it
+    nears expiration, more so for expensive values, so that popular keys are
+    usually refreshed by a single request before they expire.  While one
+    process refreshes a value, the others serve the stale value for up to
+    `stale_timeout` seconds past its expiration.  When there is no value, or
+    it is too stale to serve, the other processes wait for the one computing
+    it.
+    """
+    if stale_timeout is None:
+        stale_timeout = settings.CACHE_STALE_TIMEOUT
+    if prefix is None:
+        prefix = key.split(":", 1)[0]
+    lock = caches["lock"].lock(
+        f"cache_refresh:{key}", expire=settings.CACHE_REFRESH_LOCK_TIMEOUT
+    )
+
+    entry = cache_.get(key)
+    if entry is not None:
+        value, expires, delta = entry
+        now = time.time()
+        # 1 - random() is in (0, 1], so the log is defined and not positive
+        if now - delta * math.log(1 - random.random()) < expires:
+            metrics.incr(prefix, "hit")
+            return value
+        if lock.acquire(blocking=False):
+            try:
+                metrics.incr(prefix, "refresh")
+                return _refresh(cache_, key, update, timeout, stale_timeout)
+            finally:
+                _release(lock)
+        if now < expires + stale_timeout:
+            metrics.incr(prefix, "stale")
+            return value
+
+    if lock.acquire(timeout=settings.CACHE_REFRESH_WAIT):
+        try:
+            # another process may have computed it while we waited
+            entry = cache_.get(key)
+            if entry is not None and time.time() < entry[1]:
+                metrics.incr(prefix, "hit")
+                return entry[0]
+            metrics.incr(prefix, "miss")
+            return _refresh(cache_, key, update, timeout, stale_timeout)
+        finally:
+            _release(lock)
+    # the process holding the lock is taking too long, compute it ourselves
+    metrics.incr(prefix, "miss")
+    return _refresh(cache_, key, update, timeout, stale_timeout)
+
+
+class TokenBucket:
+    """A rate limit shared by every process, kept in Redis
+
+    Tokens are added at `rate` per second, up to `capacity`, and each unit of
+    work must take a token.  The bucket is refilled and taken from in a
+    single script, so that processes may not take the same tokens.
+    """
+
+    script = """
+    local rate = tonumber(ARGV[1])
+    local capacity = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local requested = tonumber(ARGV[4])
+    local bucket = redis.call("HMGET", KEYS[1], "tokens", "timestamp")
+    local tokens = tonumber(bucket[1]) or capacity
+    local timestamp = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - timestamp) * rate)
+    local taken = math.min(requested, math.floor(tokens))
+    redis.call(
+        "HMSET", KEYS[1], "tokens", tostring(tokens - taken), "timestamp", ARGV[3]
+    )
+    redis.call("EXPIRE", KEYS[1], math.ceil(capacity / rate) + 60)
+    return taken
+    """
+
+    def __init__(self, name, rate, capacity):
+        self.key = f"token_bucket:{name}"
+        self.rate = rate
+        self.capacity = capacity
+        self._script = None
+
+    def take(self, count=1):
+        """Take up to `count` tokens, returning how many were taken"""
+        if self._script is None:
+            client = caches["lock"].client.get_client(write=True)
+            self._script = client.register_script(self.script)
+        return int(
+            self._script(
+                keys=[self.key], args=[self.rate, self.capacity, time.time(), count]
+            )
+        )
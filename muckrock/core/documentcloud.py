@@ -0,0 +1,112 @@
+"""
+A shared DocumentCloud client
+
+Logging in to DocumentCloud costs a round trip to the authentication server,
+so each process keeps a single client for its lifetime, and the access and
+refresh tokens are cached, so that a new process or a process whose access
+token has expired can use the tokens another process already has.
+"""
+
+# Django
+from django.conf import settings
+from django.core.cache import cache, caches
+
+# Standard Library
+import logging
+import os
+import threading
+
+# Third Party
+from documentcloud import DocumentCloud
+from documentcloud.exceptions import DocumentCloudError
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+class SharedTokenDocumentCloud(DocumentCloud):
+    """A DocumentCloud client which shares its tokens through the cache"""
+
+    @property
+    def tokens_key(self):
+        """The cache key for this user's tokens"""
+        return f"documentcloud_tokens:{self.username}"
+
+    def _use_tokens(self, access_token, refresh_token):
+        """Authenticate with the given tokens"""
+        self.refresh_token = refresh_token
+        self.session.headers.update({"Authorization": f"Bearer {access_token}"})
+
+    def _has_tokens(self, tokens):
+        """Are these the tokens already being used"""
+        return (
+            tokens is not None
+            and self.session.headers.get("Authorization") == f"Bearer {tokens[0]}"
+        )
+
+    def _set_tokens(self):
+        """Use the cached tokens if another process has logged in or refreshed
+        them since this process last did, otherwise refresh them and share
+        the new ones"""
+        tokens = cache.get(self.tokens_key)
+        if tokens is not None and not self._has_tokens(tokens):
+            self._use_tokens(*tokens)
+            return
+        with caches["lock"].lock(
+            f"documentcloud_login:{self.username}",
+            expire=settings.DOCUMENTCLOUD_LOGIN_LOCK_TIMEOUT,
+        ):
+            # another process may have refreshed them while we waited
+            tokens = cache.get(self.tokens_key)
+            if tokens is not None and not self._has_tokens(tokens):
+                self._use_tokens(*tokens)
+                return
+            if self.refresh_token is None and tokens is not None:
+                self.refresh_token = tokens[1]
+            logger.info("Refreshing DocumentCloud tokens for %s", self.username)
+            super()._set_tokens()
+            access_token = self.session.headers["Authorization"].split(" ", 1)[1]
+            cache.set(
+                self.tokens_key,
+                (access_token, self.refresh_token),
+                settings.DOCUMENTCLOUD_TOKEN_TIMEOUT,
+            )
+
+    def _request(self, method, url, raise_error=True, **kwargs):
+        """Also refresh the tokens and retry once if they are unauthorized"""
+        # pylint: disable=arguments-differ
+        set_tokens = kwargs.get("set_tokens", True)
+        try:
+            response = super()._request(method, url, raise_error=raise_error, **kwargs)
+        except DocumentCloudError as exc:
+            if not set_tokens or getattr(exc, "status_code", None) != 401:
+                raise
+        else:
+            if not set_tokens or response.status_code != 401:
+                return response
+        self._set_tokens()
+        kwargs["set_tokens"] = False
+        return super()._request(method, url, raise_error=raise_error, **kwargs)
+
+
+def get_documentcloud_client():
+    """The DocumentCloud client for this process
+
+    A forked process makes its own client, as it must not share the parent's
+    connections
+    """
+    # pylint: disable=global-statement
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = SharedTokenDocumentCloud(
+                username=settings.DOCUMENTCLOUD_BETA_USERNAME,
+                password=settings.DOCUMENTCLOUD_BETA_PASSWORD,
+                base_uri=f"{settings.DOCCLOUD_API_URL}/api/",
+                auth_uri=f"{settings.SQUARELET_URL}/api/",
+            )
+            _client_pid = os.getpid()
+        return _client
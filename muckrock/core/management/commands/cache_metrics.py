@@ -0,0 +1,27 @@
+# Django
+from django.core.management.base import BaseCommand
+
+# Standard Library
+import csv
+
+# MuckRock
+from muckrock.core.cache import CacheMetrics, metrics
+
+
+class Command(BaseCommand):
+    """Report cache hits, stale hits, misses and refreshes per key prefix"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true", help="Reset the counts after reporting"
+        )
+
+    def handle(self, *args, **kwargs):
+        writer = csv.writer(self.stdout)
+        writer.writerow(["prefix", *CacheMetrics.events])
+        for prefix, counts in sorted(metrics.get().items()):
+            writer.writerow(
+                [prefix, *(counts.get(event, 0) for event in CacheMetrics.events)]
+            )
+        if kwargs["reset"]:
+            metrics.reset()
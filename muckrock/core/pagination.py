@@ -4,9 +4,23 @@ Provides a pagination class for the API
 
 # Django
 from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import F, Q
+from django.db.models.expressions import OrderBy
+from django.utils.functional import cached_property
+
+# Standard Library
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date, datetime
 
 # Third Party
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.utils.urls import replace_query_param
 
 
 class StandardPagination(PageNumberPagination):
@@ -15,3 +29,356 @@ class StandardPagination(PageNumberPagination):
     page_size = 50
     max_page_size = settings.MAX_PAGE_SIZE
     page_size_query_param = "page_size"
+
+
+def estimate_count(queryset):
+    """Get the query planner's estimate of the number of rows in the queryset"""
+    sql, params = queryset.query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]["Plan Rows"]
+
+
+def cached_count(object_list, count_key=None):
+    """Count the objects, estimating the count for large querysets
+
+    The rows are counted exactly up to the threshold, so that small lists do
+    not need the query planner.  Above it, the planner's estimate is used
+    instead.  The result is cached under `count_key` if given, so that it is
+    not recomputed while flipping through the pages of the same list.
+    Returns whether the count was estimated, and the count.
+    """
+    if count_key is not None:
+        cached = cache.get(count_key)
+        if cached is not None:
+            return cached
+
+    if hasattr(object_list, "query"):
+        threshold = settings.PAGINATION_ESTIMATE_THRESHOLD
+        count = object_list[: threshold + 1].count()
+        estimated = count > threshold
+        if estimated:
+            # the estimate is only a label, but never show less than we counted
+            count = max(estimate_count(object_list), count)
+    else:
+        estimated, count = False, len(object_list)
+
+    if count_key is not None:
+        cache.set(count_key, (estimated, count), settings.PAGINATION_COUNT_TIMEOUT)
+    return estimated, count
+
+
+class EstimatedPage(Page):
+    """A page whose neighbours are found from the rows, not the count"""
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    def end_index(self):
+        return self.start_index() + len(self) - 1
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    A paginator which avoids exactly counting large querysets
+
+    See `cached_count` for how the count is found.  An estimated count is
+    only used to label the list - an extra row is fetched with each page to
+    know if there is a next page, so rows past the estimate may still be
+    reached.  If a page past the end is requested, the list is counted
+    exactly to find its last page.
+    """
+
+    def __init__(self, object_list, per_page, count_key=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_key = count_key
+
+    @cached_property
+    def _count(self):
+        return cached_count(self.object_list, self.count_key)
+
+    @property
+    def count(self):
+        """Estimated or exact number of objects, cached"""
+        return self._count[1]
+
+    @property
+    def count_estimated(self):
+        """Is the count an estimate"""
+        return self._count[0]
+
+    def validate_number(self, number):
+        """Do not limit page numbers to the estimated number of pages"""
+        if not self.count_estimated:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger("That page number is not an integer")
+        if number < 1:
+            raise EmptyPage("That page number is less than 1")
+        return number
+
+    def page(self, number):
+        """Fetch an extra row to know if there is a next page"""
+        if not self.count_estimated:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        object_list = list(self.object_list[bottom : bottom + self.per_page + 1])
+        if not object_list and number > 1:
+            # past the end of the list, count it exactly to find the last page
+            self._count_exactly()
+            return super().page(number)
+        return EstimatedPage(
+            object_list[: self.per_page],
+            number,
+            self,
+            has_next=len(object_list) > self.per_page,
+        )
+
+    def _count_exactly(self):
+        """Replace the estimated count with an exact one"""
+        self._count = (False, self.object_list.count())
+        self.__dict__.pop("num_pages", None)
+        if self.count_key is not None:
+            cache.set(self.count_key, self._count, settings.PAGINATION_COUNT_TIMEOUT)
+
+
+class KeysetJSONEncoder(DjangoJSONEncoder):
+    """Encode datetimes at full precision, so they may be used as a keyset"""
+
+    def default(self, o):
+        if isinstance(o, (datetime, date)):
+            return o.isoformat()
+        return super().default(o)
+
+
+class InvalidCursor(ValueError):
+    """The cursor could not be decoded"""
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset using a keyset on its sort field and primary key
+
+    Each page is found by filtering for the rows sorted after (or before) the
+    last (or first) row of the current page, instead of scanning and
+    discarding every row before the page as offset pagination does.  The
+    primary key breaks ties between rows with the same sort value, and rows
+    with a null sort value are sorted last.
+
+    This may change the queryset's order.  Only its first sort key is kept,
+    and any further sort keys are replaced by the primary key.  Nulls are
+    sorted last in both directions, where the database sorts them first for
+    a descending sort.  A queryset sorted by anything other than a field is
+    paged through by its primary key instead.
+
+    This exposes the same interface as the Rest Framework's cursor paginator
+    for use in templates, along with a count of the objects as found by
+    `cached_count`, which is only computed if it is used.
+    """
+
+    cursor_query_param = "cursor"
+    keyset_field = "keyset_value"
+
+    def __init__(self, object_list, page_size, count_key=None):
+        self.object_list = object_list
+        self.page_size = page_size
+        self.count_key = count_key
+        self.field, self.descending = self._get_ordering(object_list)
+        self.request = None
+        self.page = []
+        self.has_next = False
+        self.has_previous = False
+
+    @staticmethod
+    def _get_ordering(queryset):
+        """Get the field and direction the queryset is sorted by"""
+        ordering = queryset.query.order_by or queryset.query.get_meta().ordering
+        if not ordering:
+            return "pk", False
+        order = ordering[0]
+        if isinstance(order, str):
+            field, descending = order.lstrip("-"), order.startswith("-")
+        elif isinstance(order, OrderBy) and isinstance(order.expression, F):
+            field, descending = order.expression.name, order.descending
+        else:
+            # an expression can not be used as a keyset
+            return "pk", False
+        if field == "id":
+            field = "pk"
+        return field, descending
+
+    @cached_property
+    def _count(self):
+        return cached_count(self.object_list, self.count_key)
+
+    @property
+    def count(self):
+        """Estimated or exact number of objects, cached"""
+        return self._count[1]
+
+    @property
+    def count_estimated(self):
+        """Is the count an estimate"""
+        return self._count[0]
+
+    def _order_by(self, descending, nulls_last):
+        """Order by the sort field, then the primary key"""
+        pk_order = "-pk" if descending else "pk"
+        if self.field == "pk":
+            return [pk_order]
+        nulls = {"nulls_last": True} if nulls_last else {"nulls_first": True}
+        if descending:
+            return [F(self.keyset_field).desc(**nulls), pk_order]
+        else:
+            return [F(self.keyset_field).asc(**nulls), pk_order]
+
+    def _seek(self, value, pk, descending, nulls_last):
+        """Filter for the rows sorted after the given sort value and primary key"""
+        lookup = "lt" if descending else "gt"
+        after_pk = Q(**{f"pk__{lookup}": pk})
+        if self.field == "pk":
+            return after_pk
+        isnull = f"{self.keyset_field}__isnull"
+        if value is None:
+            query = Q(**{isnull: True}) & after_pk
+            if not nulls_last:
+                query |= Q(**{isnull: False})
+        else:
+            query = Q(**{f"{self.keyset_field}__{lookup}": value}) | (
+                Q(**{self.keyset_field: value}) & after_pk
+            )
+            if nulls_last:
+                query |= Q(**{isnull: True})
+        return query
+
+    def encode_cursor(self, obj, reverse):
+        """Encode a cursor pointing at the given object"""
+        value = getattr(obj, self.keyset_field, None)
+        cursor = json.dumps([value, obj.pk, reverse], cls=KeysetJSONEncoder)
+        return urlsafe_b64encode(cursor.encode("utf8")).decode("ascii")
+
+    def decode_cursor(self, cursor):
+        """Decode a cursor into its sort value, primary key and direction"""
+        try:
+            value, pk, reverse = json.loads(urlsafe_b64decode(cursor.encode("ascii")))
+            return value, int(pk), bool(reverse)
+        except (TypeError, ValueError) as exc:
+            raise InvalidCursor(cursor) from exc
+
+    def paginate(self, request):
+        """Return the page of objects for the cursor in the request"""
+        self.request = request
+        cursor = request.GET.get(self.cursor_query_param)
+        queryset = self.object_list
+        if self.field != "pk":
+            queryset = queryset.annotate(**{self.keyset_field: F(self.field)})
+
+        reverse = False
+        if cursor:
+            value, pk, reverse = self.decode_cursor(cursor)
+        # when paging backwards, scan in the opposite order, which also moves
+        # the null values to the front, then flip the results back around
+        descending = self.descending != reverse
+        queryset = queryset.order_by(*self._order_by(descending, not reverse))
+        if cursor:
+            queryset = queryset.filter(self._seek(value, pk, descending, not reverse))
+
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_previous = has_more
+            self.has_next = True
+        else:
+            self.has_next = has_more
+            self.has_previous = bool(cursor)
+        self.page = results
+        return results
+
+    def get_next_link(self):
+        """Link to the next page"""
+        if not self.has_next or not self.page:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.page[-1], reverse=False),
+        )
+
+    def get_previous_link(self):
+        """Link to the previous page"""
+        if not self.has_previous or not self.page:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.page[0], reverse=True),
+        )
+
+
+class KeysetPagination(CursorPagination):
+    """Keyset pagination for the API, using the querysets's existing ordering
+
+    See `KeysetPaginator` for how this may change the ordering
+    """
+
+    page_size = 50
+    max_page_size = settings.MAX_PAGE_SIZE
+    page_size_query_param = "page_size"
+
+    def __init__(self):
+        self.paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.paginator = KeysetPaginator(queryset, self.get_page_size(request))
+        try:
+            return self.paginator.paginate(request)
+        except InvalidCursor:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        return self.paginator.get_next_link()
+
+    def get_previous_link(self):
+        return self.paginator.get_previous_link()
+
+
+class OptionalKeysetPagination(StandardPagination):
+    """Page number pagination, unless the client asks for keyset pagination
+
+    Keyset pagination is used when the `pagination=cursor` parameter or a
+    cursor is given.  Its responses have no count, and are paged through by
+    their next and previous links.
+    """
+
+    keyset_query_param = "pagination"
+
+    def __init__(self):
+        self.keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if (
+            request.query_params.get(self.keyset_query_param) == "cursor"
+            or KeysetPagination.cursor_query_param in request.query_params
+        ):
+            self.keyset = KeysetPagination()
+            self.display_page_controls = False
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.keyset = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
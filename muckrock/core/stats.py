@@ -2,23 +2,20 @@
 Utilities for calculating stats for agencies and jurisdictions
 """
 
-# Django
-from django.db.models import Count
-
 
 def collect_stats(obj, context):
     """Helper for collecting stats"""
     statuses = ("rejected", "ack", "processed", "fix", "no_docs", "done", "appealing")
-    requests = obj.get_requests()
-    status_counts = (
-        requests.filter(status__in=statuses)
-        .order_by("status")
-        .values_list("status")
-        .annotate(Count("status"))
+    stats = obj.get_request_stats()
+    context.update(
+        {
+            "num_%s" % s: c
+            for s, c in sorted(stats.status_counts.items())
+            if s in statuses and c
+        }
     )
-    context.update({"num_%s" % s: c for s, c in status_counts})
-    context["num_overdue"] = requests.get_overdue().count()
-    context["num_submitted"] = requests.count()
+    context["num_overdue"] = stats.overdue
+    context["num_submitted"] = stats.requests
 
 
 def assign_grade(grade, text, percentile=None):
@@ -24,6 +24,7 @@ import smartypants as _smartypants
 from sorl.thumbnail.templatetags.thumbnail import thumbnail
 
 # MuckRock
+from muckrock.core.cache import get_or_refresh
 from muckrock.core.forms import NewsletterSignupForm, TagManagerForm
 from muckrock.foia.models import FOIARequest
 from muckrock.project.forms import ProjectManagerForm
@@ -411,17 +412,22 @@ class CacheNode(Node):
         if expire_time != 0:
             vary_on = [var.resolve(context) for var in self.vary_on]
             cache_key = make_template_fragment_key(self.fragment_name, vary_on)
-            value = fragment_cache.get(cache_key)
-            if value is not None and self.compress:
-                value = zlib.decompress(value).decode("utf8")
-            if value is None:
+
+            def update():
                 value = self.nodelist.render(context)
                 if self.compress:
-                    fragment_cache.set(
-                        cache_key, zlib.compress(value.encode("utf8")), expire_time
-                    )
-                else:
-                    fragment_cache.set(cache_key, value, expire_time)
+                    value = zlib.compress(value.encode("utf8"))
+                return value
+
+            value = get_or_refresh(
+                fragment_cache,
+                cache_key,
+                update,
+                expire_time,
+                prefix=self.fragment_name,
+            )
+            if self.compress:
+                value = zlib.decompress(value).decode("utf8")
             return value
         else:
             return self.nodelist.render(context)
@@ -5,12 +5,18 @@ Tests for site level functionality and helper functions for application tests
 # Django
 from django.conf import settings
 from django.contrib.sites.models import Site
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
 from django.core.exceptions import ValidationError
-from django.test import RequestFactory, TestCase
+from django.core.paginator import EmptyPage
+from django.db.models.functions import Lower
+from django.test import RequestFactory, TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 
 # Standard Library
 import logging
+import time
 
 # Third Party
 import mock
@@ -21,6 +27,9 @@ from nose.tools import eq_, ok_
 
 # MuckRock
 from muckrock.accounts.models import Notification
+from muckrock.agency.models import Agency
+from muckrock.core.cache import TieredCache, get_or_refresh
+from muckrock.core.documentcloud import SharedTokenDocumentCloud
 from muckrock.core.factories import (
     AgencyFactory,
     AnswerFactory,
@@ -30,14 +39,17 @@ from muckrock.core.factories import (
 )
 from muckrock.core.fields import EmailsListField
 from muckrock.core.forms import NewsletterSignupForm, StripeForm
-from muckrock.core.stats import grade_agency
+from muckrock.core.pagination import EstimatedCountPaginator, KeysetPaginator
+from muckrock.core.stats import collect_stats, grade_agency
 from muckrock.core.templatetags import tags
 from muckrock.core.test_utils import http_get_response, http_post_response
 from muckrock.core.utils import new_action, notify
 from muckrock.core.views import DonationFormView, NewsletterSignupView
 from muckrock.crowdsource.factories import CrowdsourceResponseFactory
 from muckrock.foia.factories import FOIARequestFactory
+from muckrock.foia.models import FOIARequest
 from muckrock.jurisdiction.factories import LocalJurisdictionFactory
+from muckrock.jurisdiction.models import RequestStats
 from muckrock.task.factories import (
     FlaggedTaskFactory,
     NewAgencyTaskFactory,
@@ -186,6 +198,244 @@ class TestUnit(TestCase):
         field.clean("a@example.com,an.email@foo.net", model_instance)
 
 
+class TestKeysetPaginator(TestCase):
+    """Test paging through a queryset by keyset"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        # include duplicate and null sort values
+        for title in ["b", "a", "c", "b", "a"]:
+            FOIARequestFactory(title=title)
+        for _ in range(2):
+            FOIARequestFactory(title="d", datetime_done=None)
+
+    def _pages(self, queryset, page_size):
+        """Page forward through the queryset, then back again"""
+        forward = []
+        request = self.factory.get("/")
+        while True:
+            paginator = KeysetPaginator(queryset, page_size)
+            forward.append(paginator.paginate(request))
+            if not paginator.has_next:
+                break
+            request = self.factory.get(paginator.get_next_link())
+        backward = [forward[-1]]
+        while paginator.has_previous:
+            request = self.factory.get(paginator.get_previous_link())
+            paginator = KeysetPaginator(queryset, page_size)
+            backward.append(paginator.paginate(request))
+        return forward, backward[::-1]
+
+    def test_pk(self):
+        """Paging by primary key"""
+        queryset = FOIARequest.objects.order_by("-pk")
+        forward, backward = self._pages(queryset, 3)
+        eq_(sum(forward, []), list(queryset))
+        eq_(forward, backward)
+
+    def test_sort_field(self):
+        """Paging by a non-unique sort field"""
+        for order in ["title", "-title", "datetime_done", "-datetime_done"]:
+            queryset = FOIARequest.objects.order_by(order)
+            forward, backward = self._pages(queryset, 2)
+            foias = sum(forward, [])
+            eq_(len(foias), queryset.count())
+            eq_(len(set(foias)), queryset.count())
+            eq_(forward, backward)
+
+    def test_unsupported_ordering(self):
+        """A queryset sorted by an expression is paged by primary key"""
+        queryset = FOIARequest.objects.order_by(Lower("title").desc())
+        forward, backward = self._pages(queryset, 3)
+        eq_(sum(forward, []), list(FOIARequest.objects.order_by("pk")))
+        eq_(forward, backward)
+
+
+class TestEstimatedCountPaginator(TestCase):
+    """Test estimating counts for large lists"""
+
+    def setUp(self):
+        for _ in range(3):
+            FOIARequestFactory()
+
+    def test_exact(self):
+        """Small lists are counted exactly"""
+        paginator = EstimatedCountPaginator(FOIARequest.objects.all(), 2)
+        eq_(paginator.count, 3)
+        ok_(not paginator.count_estimated)
+
+    @override_settings(PAGINATION_ESTIMATE_THRESHOLD=-1)
+    def test_estimated(self):
+        """Large lists use the planner's estimate"""
+        paginator = EstimatedCountPaginator(FOIARequest.objects.all(), 2)
+        ok_(paginator.count >= 0)
+        ok_(paginator.count_estimated)
+
+    @override_settings(PAGINATION_ESTIMATE_THRESHOLD=-1)
+    def test_estimated_pages(self):
+        """Pages are found from the rows, not from the estimated count"""
+        queryset = FOIARequest.objects.order_by("pk")
+        paginator = EstimatedCountPaginator(queryset, 2)
+        with patch("muckrock.core.pagination.estimate_count", return_value=1):
+            page = paginator.page(1)
+        ok_(page.has_next())
+        eq_(list(page), list(queryset[:2]))
+        page = paginator.page(page.next_page_number())
+        ok_(not page.has_next())
+        eq_(list(page), list(queryset[2:]))
+        eq_((page.start_index(), page.end_index()), (3, 3))
+
+    @override_settings(PAGINATION_ESTIMATE_THRESHOLD=-1)
+    def test_estimated_past_end(self):
+        """Asking for a page past the end counts the list exactly"""
+        paginator = EstimatedCountPaginator(FOIARequest.objects.all(), 2)
+        with patch("muckrock.core.pagination.estimate_count", return_value=100):
+            eq_(paginator.num_pages, 50)
+            with nose.tools.assert_raises(EmptyPage):
+                paginator.page(50)
+        ok_(not paginator.count_estimated)
+        eq_(paginator.count, 3)
+        eq_(paginator.num_pages, 2)
+
+    def test_keyset_count(self):
+        """The keyset paginator can count its list too"""
+        paginator = KeysetPaginator(FOIARequest.objects.all(), 2)
+        eq_(paginator.count, 3)
+        ok_(not paginator.count_estimated)
+
+
+class TestTieredCache(TestCase):
+    """Writes to the tiered cache should be seen by every process"""
+
+    def setUp(self):
+        params = {
+            "KEY_PREFIX": "test-tiered",
+            "OPTIONS": {
+                "CLIENT_CLASS": "django_redis.client.DefaultClient",
+                "INVALIDATION_CHANNEL": "test:cache:invalidate",
+            },
+        }
+        self.cache = TieredCache(settings.REDIS_URL, params)
+        # simulate another process by giving it its own local cache
+        self.other = TieredCache(settings.REDIS_URL, params)
+        self.other._local = LocMemCache("test-tiered-other", {})
+
+    def tearDown(self):
+        self.cache.clear()
+
+    def wait_for(self, cache, key, value):
+        """Invalidations are delivered asynchronously"""
+        for _ in range(100):
+            if cache.get(key) == value:
+                return
+            time.sleep(0.01)
+        eq_(cache.get(key), value)
+
+    def test_invalidation(self):
+        """Local copies are dropped when another process writes"""
+        self.cache.set("key", 1)
+        eq_(self.other.get("key"), 1)
+        ok_(self.other._local.has_key(self.other.make_key("key")))
+
+        self.cache.set("key", 2)
+        self.wait_for(self.other, "key", 2)
+        self.cache.delete("key")
+        self.wait_for(self.other, "key", None)
+
+    def test_clear(self):
+        """Clearing only removes this cache's keys"""
+        lock_cache = caches["lock"]
+        lock_cache.set("test-tiered-lock", 1)
+        self.cache.set("key", 1)
+        self.cache.clear()
+        eq_(self.cache.get("key"), None)
+        eq_(lock_cache.get("test-tiered-lock"), 1)
+        lock_cache.delete("test-tiered-lock")
+
+
+class TestGetOrRefresh(TestCase):
+    """Expired values should be recomputed by one process at a time"""
+
+    def setUp(self):
+        self.cache = LocMemCache("test-get-or-refresh", {})
+        self.update = Mock(return_value="new")
+
+    def tearDown(self):
+        self.cache.clear()
+
+    def test_miss(self):
+        """Missing values are computed once and then served from the cache"""
+        eq_(get_or_refresh(self.cache, "key", self.update, 60), "new")
+        eq_(get_or_refresh(self.cache, "key", self.update, 60), "new")
+        eq_(self.update.call_count, 1)
+
+    def test_stale(self):
+        """Stale values are served while another process refreshes them"""
+        self.cache.set("key", ("old", time.time() - 1, 0), 60)
+        lock = caches["lock"].lock("cache_refresh:key", expire=10)
+        lock.acquire()
+        try:
+            eq_(get_or_refresh(self.cache, "key", self.update, 60), "old")
+            ok_(not self.update.called)
+        finally:
+            lock.release()
+        eq_(get_or_refresh(self.cache, "key", self.update, 60), "new")
+        eq_(self.update.call_count, 1)
+
+    @override_settings(CACHE_REFRESH_WAIT=0.1)
+    def test_no_stale(self):
+        """Expired values are not served past the stale timeout"""
+        self.cache.set("key", ("old", time.time() - 1, 0), 60)
+        lock = caches["lock"].lock("cache_refresh:key", expire=10)
+        lock.acquire()
+        try:
+            eq_(
+                get_or_refresh(self.cache, "key", self.update, 60, stale_timeout=0),
+                "new",
+            )
+            eq_(self.update.call_count, 1)
+        finally:
+            lock.release()
+
+
+class TestSharedTokenDocumentCloud(TestCase):
+    """DocumentCloud clients should share their tokens"""
+
+    def setUp(self):
+        self.cache = LocMemCache("test-documentcloud", {})
+        patcher = patch("muckrock.core.documentcloud.cache", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.cache.clear)
+
+    def _set_tokens(self, client):
+        """Log in as the DocumentCloud library would"""
+        client.refresh_token = "refresh%d" % self.login.call_count
+        client.session.headers["Authorization"] = "Bearer access%d" % (
+            self.login.call_count
+        )
+
+    def test_shared_tokens(self):
+        """Only the first client logs in, and an expired token is refreshed once"""
+        with patch(
+            "documentcloud.DocumentCloud._set_tokens", autospec=True
+        ) as self.login:
+            self.login.side_effect = self._set_tokens
+            client = SharedTokenDocumentCloud(username="user", password="pass")
+            other = SharedTokenDocumentCloud(username="user", password="pass")
+            eq_(self.login.call_count, 1)
+            eq_(other.session.headers["Authorization"], "Bearer access1")
+            # the token expires, and one client refreshes it
+            client._set_tokens()  # pylint: disable=protected-access
+            eq_(self.login.call_count, 2)
+            eq_(client.session.headers["Authorization"], "Bearer access2")
+            # the other client picks up the refreshed token without logging in
+            other._set_tokens()  # pylint: disable=protected-access
+            eq_(self.login.call_count, 2)
+            eq_(other.session.headers["Authorization"], "Bearer access2")
+            eq_(other.refresh_token, "refresh2")
+
+
 class TestNewsletterSignupView(TestCase):
     """By submitting an email, users can subscribe to our MailChimp newsletter list."""
 
@@ -405,3 +655,49 @@ class TestGradeAgency(TestCase):
             context,
             expected_result,
         )
+
+
+class TestCollectStats(TestCase):
+    """Agency and jurisdiction statistics are read from the roll up"""
+
+    def setUp(self):
+        self.agency = AgencyFactory()
+        FOIARequestFactory.create_batch(3, agency=self.agency, status="ack")
+        FOIARequestFactory(
+            agency=self.agency, status="done", datetime_done=timezone.now()
+        )
+
+    def test_collect_stats(self):
+        """The statistics are computed in one query and then stored"""
+        context = {}
+        with self.assertNumQueries(1):
+            RequestStats.objects.compute(self.agency.get_requests())
+        collect_stats(self.agency, context)
+        eq_(
+            context, {"num_ack": 3, "num_done": 1, "num_overdue": 0, "num_submitted": 4}
+        )
+
+        self.agency.jurisdiction.get_request_stats()
+        agency = Agency.objects.select_related(
+            "request_stats", "jurisdiction__request_stats"
+        ).get(pk=self.agency.pk)
+        with self.assertNumQueries(0):
+            collect_stats(agency, {})
+            grade_agency(agency, {})
+
+    def test_status_transition(self):
+        """Changing a request's status refreshes its agency's statistics"""
+        foia = FOIARequest.objects.filter(agency=self.agency).first()
+        with patch(
+            "muckrock.jurisdiction.signals.schedule_refresh_request_stats"
+        ) as mock_schedule:
+            foia.title = "New title"
+            foia.save()
+            ok_(not mock_schedule.called)
+            foia.status = "rejected"
+            foia.save()
+            mock_schedule.assert_called_once_with(self.agency.pk)
+            # a delete after a save still refreshes the agency
+            mock_schedule.reset_mock()
+            foia.delete()
+            mock_schedule.assert_any_call(self.agency.pk)
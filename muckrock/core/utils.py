@@ -24,6 +24,9 @@ import boto3
 import requests
 import stripe
 
+# MuckRock
+from muckrock.core.cache import get_or_refresh
+
 logger = logging.getLogger(__name__)
 
 # From http://stackoverflow.com/questions/2687173/
@@ -121,13 +124,12 @@ def get_stripe_token(card_number="4242424242424242"):
     return token.id
 
 
-def cache_get_or_set(key, update, timeout):
-    """Get the value from the cache if present, otherwise update it"""
-    value = cache.get(key)
-    if value is None:
-        value = update()
-        cache.set(key, value, timeout)
-    return value
+def cache_get_or_set(key, update, timeout, stale_timeout=None):
+    """Get the value from the cache if present, otherwise update it
+
+    Only one process updates an expired value at a time, see `get_or_refresh`
+    """
+    return get_or_refresh(cache, key, update, timeout, stale_timeout=stale_timeout)
 
 
 def retry_on_error(error, func, *args, **kwargs):
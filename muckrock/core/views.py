@@ -24,12 +24,11 @@ import logging
 import operator
 import sys
 from functools import reduce
+from hashlib import md5
 
 # Third Party
 import stripe
 from dal import autocomplete
-from rest_framework.pagination import CursorPagination
-from rest_framework.request import Request
 from watson import search as watson
 from watson.views import SearchMixin
 
@@ -42,6 +41,11 @@ from muckrock.accounts.utils import (
 )
 from muckrock.agency.models import Agency
 from muckrock.core.forms import NewsletterSignupForm, SearchForm, StripeForm
+from muckrock.core.pagination import (
+    EstimatedCountPaginator,
+    InvalidCursor,
+    KeysetPaginator,
+)
 from muckrock.core.utils import stripe_retry_on_error
 from muckrock.foia.models import FOIAFile, FOIARequest
 from muckrock.jurisdiction.models import Jurisdiction
@@ -147,6 +151,30 @@ class PaginationMixin:
         context["per_page"] = self.get_paginate_by(self.get_queryset())
         return context
 
+    paginator_class = EstimatedCountPaginator
+
+    def get_count_key(self):
+        """Cache the count for this list, per user and filter parameters"""
+        params = sorted(
+            (key, value)
+            for key, value in self.request.GET.lists()
+            if key not in (self.page_kwarg, "per_page", "cursor")
+        )
+        return "pagination_count:{}:{}".format(
+            self.request.user.pk,
+            md5(f"{self.request.path}?{params}".encode("utf8")).hexdigest(),
+        )
+
+    def get_paginator(self, queryset, per_page, orphans=0, **kwargs):
+        """Cache the count for this list"""
+        return self.paginator_class(
+            queryset,
+            per_page,
+            orphans=orphans,
+            count_key=self.get_count_key(),
+            **kwargs,
+        )
+
     def paginate_queryset(self, queryset, page_size):
         """Redirect to last page if over the limit"""
         paginator = self.get_paginator(
@@ -176,21 +204,36 @@ class PaginationMixin:
 class CursorPaginationMixin(PaginationMixin):
     """
     Use cursor pagination for increased efficiency
+
+    Pages are found by a keyset on the queryset's sort field and primary key.
+    Set `cursor_ordering` to `None` to keep the ordering of the queryset, such as
+    when combined with the `OrderedSortMixin`.  Set `cursor_count` to show
+    an estimated count of the list.
     """
 
     distinct_id = True
+    cursor_ordering = "-pk"
+    cursor_count = False
 
     def paginate_queryset(self, queryset, page_size):
-        """Paginate using the Rest Framework Cursor Paginator"""
-        paginator = CursorPagination()
-        paginator.page_size = page_size
-        paginator.ordering = "-pk"
-        if queryset.query.distinct and self.distinct_id:
+        """Paginate using the keyset paginator"""
+        if self.cursor_ordering is not None:
+            queryset = queryset.order_by(self.cursor_ordering)
+        if (
+            queryset.query.distinct
+            and self.distinct_id
+            and self.cursor_ordering in ("pk", "-pk")
+        ):
             # if we need distinct, do it only on the pk field
             # in order to take advantage of the index
             queryset = queryset.distinct("pk")
 
-        object_list = paginator.paginate_queryset(queryset, Request(self.request))
+        count_key = self.get_count_key() if self.cursor_count else None
+        paginator = KeysetPaginator(queryset, page_size, count_key)
+        try:
+            object_list = paginator.paginate(self.request)
+        except InvalidCursor:
+            raise Http404("Invalid cursor")
 
         return (paginator, None, object_list, None)
 
@@ -265,6 +308,29 @@ class MRSearchFilterListView(
     """Adds ordered sorting, searching, and filtering to a MRListView."""
 
 
+class MROrderedFilterCursorListView(
+    OrderedSortMixin, ModelFilterMixin, CursorPaginationMixin, TitleMixin, ListView
+):
+    """A MRFilterListView which uses cursor pagination on its sort field"""
+
+    template_name = "base_list.html"
+    cursor_ordering = None
+
+
+class MRSearchFilterCursorListView(
+    OrderedSortMixin,
+    ModelSearchMixin,
+    ModelFilterMixin,
+    CursorPaginationMixin,
+    TitleMixin,
+    ListView,
+):
+    """A MRSearchFilterListView which uses cursor pagination on its sort field"""
+
+    template_name = "base_list.html"
+    cursor_ordering = None
+
+
 class SearchView(SearchMixin, MRListView):
     """Always lower case queries for case insensitive searches"""
 
@@ -11,6 +11,7 @@ from django.db.models import Count, Max
 from django.http import HttpResponseRedirect
 from django.shortcuts import get_object_or_404
 from django.urls import re_path, reverse
+from django.utils import timezone
 from django.utils.safestring import mark_safe
 
 # Standard Library
@@ -43,12 +44,7 @@ from muckrock.foia.models import (
     OutboundRequestAttachment,
     TrackingNumber,
 )
-from muckrock.foia.tasks import (
-    autoimport,
-    noindex_documentcloud,
-    set_document_cloud_pages,
-    upload_document_cloud,
-)
+from muckrock.foia.tasks import autoimport, noindex_documentcloud, upload_document_cloud
 from muckrock.jurisdiction.models import Jurisdiction
 
 
@@ -546,14 +542,20 @@ class FOIARequestAdmin(VersionAdmin):
     def retry_pages(self, request, idx):
         """Retry getting the page count"""
 
-        docs = FOIAFile.objects.filter(foia=idx, pages=0).get_doccloud()
-        for doc in docs:
-            set_document_cloud_pages.delay(doc.pk)
+        docs = (
+            FOIAFile.objects.filter(foia=idx, pages=0).exclude(doc_id="").get_doccloud()
+        )
+        # the pending documents are checked on periodically
+        count = docs.update(
+            doccloud_pending_since=timezone.now(),
+            doccloud_polled_at=None,
+            doccloud_reprocess_attempts=0,
+        )
 
         messages.info(
             request,
             "Attempting to set the page count for %d documents... Please "
-            "wait while the Document Cloud servers are being accessed" % docs.count(),
+            "wait while the Document Cloud servers are being accessed" % count,
         )
         return HttpResponseRedirect(
             reverse("admin:foia_foiarequest_change", args=[idx])
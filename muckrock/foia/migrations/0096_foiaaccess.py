@@ -0,0 +1,127 @@
+# Generated by Django 4.2 on 2026-10-17 10:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+POPULATE_SQL = """
+INSERT INTO foia_foiaaccess (foia_id, reason, user_id, organization_id, agency_id)
+SELECT foia.id, 'owner', composer.user_id, NULL, NULL
+FROM foia_foiarequest foia
+JOIN foia_foiacomposer composer ON composer.id = foia.composer_id
+UNION ALL
+SELECT foia.id, 'proxy', foia.proxy_id, NULL, NULL
+FROM foia_foiarequest foia
+WHERE foia.proxy_id IS NOT NULL
+UNION ALL
+SELECT foia.id, 'agency', NULL, NULL, foia.agency_id
+FROM foia_foiarequest foia
+UNION ALL
+SELECT foiarequest_id, 'edit', user_id, NULL, NULL
+FROM foia_foiarequest_edit_collaborators
+UNION ALL
+SELECT foiarequest_id, 'read', user_id, NULL, NULL
+FROM foia_foiarequest_read_collaborators
+UNION ALL
+SELECT foia.id, 'org', NULL, composer.organization_id, NULL
+FROM foia_foiarequest foia
+JOIN foia_foiacomposer composer ON composer.id = foia.composer_id
+JOIN accounts_profile profile ON profile.user_id = composer.user_id
+WHERE profile.org_share AND composer.organization_id IS NOT NULL
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("accounts", "0059_stockresponse"),
+        ("agency", "0032_agency_use_portal_appeal"),
+        ("organization", "0033_alter_entitlement_resources"),
+        ("foia", "0095_foianote_notify_alter_foiasavedsearch_users_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FOIAAccess",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "reason",
+                    models.CharField(
+                        choices=[
+                            ("owner", "Owner"),
+                            ("proxy", "Proxy"),
+                            ("edit", "Edit Collaborator"),
+                            ("read", "Read Collaborator"),
+                            ("org", "Organization Shared"),
+                            ("agency", "Agency"),
+                        ],
+                        max_length=6,
+                    ),
+                ),
+                (
+                    "agency",
+                    models.ForeignKey(
+                        blank=True,
+                        db_index=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="agency.agency",
+                    ),
+                ),
+                (
+                    "foia",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="access_grants",
+                        to="foia.foiarequest",
+                    ),
+                ),
+                (
+                    "organization",
+                    models.ForeignKey(
+                        blank=True,
+                        db_index=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="organization.organization",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        db_index=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "FOIA Access",
+                "verbose_name_plural": "FOIA Access",
+                "indexes": [
+                    models.Index(fields=["user", "foia"], name="foia_access_user_idx"),
+                    models.Index(
+                        fields=["organization", "foia"], name="foia_access_org_idx"
+                    ),
+                    models.Index(
+                        fields=["agency", "foia"], name="foia_access_agency_idx"
+                    ),
+                ],
+            },
+        ),
+        migrations.RunSQL(POPULATE_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
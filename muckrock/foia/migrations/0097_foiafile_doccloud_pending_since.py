@@ -0,0 +1,36 @@
+# Generated by Django 4.2 on 2026-10-17 16:40
+
+from django.db import migrations, models
+from django.utils import timezone
+
+from datetime import timedelta
+
+
+def mark_recent_uploads_pending(apps, schema_editor):
+    """Files uploaded shortly before this were being polled by retrying tasks"""
+    FOIAFile = apps.get_model("foia", "FOIAFile")
+    now = timezone.now()
+    FOIAFile.objects.exclude(doc_id="").filter(
+        pages=0, datetime__gte=now - timedelta(days=2)
+    ).update(doccloud_pending_since=now)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("foia", "0096_foiaaccess"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="foiafile",
+            name="doccloud_pending_since",
+            field=models.DateTimeField(
+                blank=True,
+                db_index=True,
+                editable=False,
+                help_text="When this file was uploaded to DocumentCloud, if it is still waiting for it to be processed",
+                null=True,
+            ),
+        ),
+        migrations.RunPython(mark_recent_uploads_pending, migrations.RunPython.noop),
+    ]
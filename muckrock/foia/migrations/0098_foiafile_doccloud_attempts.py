@@ -0,0 +1,31 @@
+# Generated by Django 4.2 on 2026-10-17 17:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("foia", "0097_foiafile_doccloud_pending_since"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="foiafile",
+            name="doccloud_attempts",
+            field=models.PositiveSmallIntegerField(
+                default=0,
+                editable=False,
+                help_text="How many times uploading this file to DocumentCloud has been retried",
+            ),
+        ),
+        migrations.AddField(
+            model_name="foiafile",
+            name="doccloud_attempted_at",
+            field=models.DateTimeField(
+                blank=True,
+                editable=False,
+                help_text="When uploading this file to DocumentCloud last started",
+                null=True,
+            ),
+        ),
+    ]
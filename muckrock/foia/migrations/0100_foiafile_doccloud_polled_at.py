@@ -0,0 +1,31 @@
+# Generated by Django 4.2 on 2026-10-17 19:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("foia", "0098_foiafile_doccloud_attempts"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="foiafile",
+            name="doccloud_polled_at",
+            field=models.DateTimeField(
+                blank=True,
+                editable=False,
+                help_text="When DocumentCloud was last checked on for this file, while it is waiting for it to be processed",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="foiafile",
+            name="doccloud_reprocess_attempts",
+            field=models.PositiveSmallIntegerField(
+                default=0,
+                editable=False,
+                help_text="How many times DocumentCloud has been asked to process this file again after an error",
+            ),
+        ),
+    ]
@@ -0,0 +1,73 @@
+"""
+Access model for the FOIA application
+
+A denormalized index of who has been granted access to a request.  It is kept
+up to date by signal handlers whenever ownership, collaborators, organizational
+sharing or the agency change, so that listing the requests viewable to a user
+is a single indexed lookup instead of a large OR across many tables.
+"""
+
+# Django
+from django.contrib.auth.models import User
+from django.db import models
+
+# MuckRock
+from muckrock.foia.querysets import FOIAAccessQuerySet
+
+ACCESS_REASONS = [
+    ("owner", "Owner"),
+    ("proxy", "Proxy"),
+    ("edit", "Edit Collaborator"),
+    ("read", "Read Collaborator"),
+    ("org", "Organization Shared"),
+    ("agency", "Agency"),
+]
+
+
+class FOIAAccess(models.Model):
+    """A grant of access to a FOIA request for a user, organization or agency"""
+
+    foia = models.ForeignKey(
+        "foia.FOIARequest", on_delete=models.CASCADE, related_name="access_grants"
+    )
+    reason = models.CharField(max_length=6, choices=ACCESS_REASONS)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="+",
+        blank=True,
+        null=True,
+        db_index=False,
+    )
+    organization = models.ForeignKey(
+        "organization.Organization",
+        on_delete=models.CASCADE,
+        related_name="+",
+        blank=True,
+        null=True,
+        db_index=False,
+    )
+    agency = models.ForeignKey(
+        "agency.Agency",
+        on_delete=models.CASCADE,
+        related_name="+",
+        blank=True,
+        null=True,
+        db_index=False,
+    )
+
+    objects = FOIAAccessQuerySet.as_manager()
+
+    def __str__(self):
+        grantee = self.user or self.organization or self.agency
+        return "%s access to %s for %s" % (self.reason, self.foia_id, grantee)
+
+    class Meta:
+        verbose_name = "FOIA Access"
+        verbose_name_plural = "FOIA Access"
+        app_label = "foia"
+        indexes = [
+            models.Index(fields=["user", "foia"], name="foia_access_user_idx"),
+            models.Index(fields=["organization", "foia"], name="foia_access_org_idx"),
+            models.Index(fields=["agency", "foia"], name="foia_access_agency_idx"),
+        ]
@@ -14,6 +14,7 @@ import logging
 import mimetypes
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from email import policy
 from email.parser import BytesParser
 
@@ -294,12 +295,16 @@ class FOIACommunication(models.Model):
 
         ignore_types = [("application/x-pkcs7-signature", "p7s")]
 
-        for file_ in files.values():
-            if not any(
-                file_.content_type == t or file_.name.endswith(s)
-                for t, s in ignore_types
-            ):
-                self.attach_file(file_=file_)
+        self.attach_files(
+            [
+                file_
+                for file_ in files.values()
+                if not any(
+                    file_.content_type == t or file_.name.endswith(s)
+                    for t, s in ignore_types
+                )
+            ]
+        )
 
     def create_agency_notifications(self):
         """Create the notifications for when an agency creates a new comm"""
@@ -357,6 +362,57 @@ class FOIACommunication(models.Model):
                 transaction.on_commit(lambda: upload_document_cloud.delay(foia_file.pk))
         return foia_file
 
+    def attach_files(self, files, source=None):
+        """Attach many files to this communication at once
+
+        The files are uploaded to storage concurrently, then their FOIAFiles
+        are created together, and sent to DocumentCloud in a single task
+        """
+        # pylint: disable=import-outside-toplevel
+        # MuckRock
+        from muckrock.foia.tasks import upload_document_cloud_batch
+
+        if not files:
+            return []
+        if source is None:
+            source = self.get_source()
+
+        field = FOIAFile._meta.get_field("ffile")
+
+        def upload(file_):
+            """Upload a single file to storage"""
+            name = file_.name[:233].encode("ascii", "ignore").decode()
+            return field.storage.save(
+                field.generate_filename(None, name),
+                UnclosableFile(file_),
+                max_length=field.max_length,
+            )
+
+        if len(files) == 1:
+            paths = [upload(files[0])]
+        else:
+            with ThreadPoolExecutor(settings.ATTACHMENT_UPLOAD_WORKERS) as executor:
+                paths = list(executor.map(upload, files))
+
+        now = timezone.now()
+        foia_files = FOIAFile.objects.bulk_create(
+            [
+                FOIAFile(
+                    comm=self,
+                    ffile=path,
+                    title=os.path.splitext(file_.name)[0][:255],
+                    datetime=now,
+                    source=source,
+                )
+                for file_, path in zip(files, paths)
+            ]
+        )
+        if self.foia_id:
+            pks = [f.pk for f in foia_files if f.is_doccloud()]
+            if pks:
+                transaction.on_commit(lambda: upload_document_cloud_batch.delay(pks))
+        return foia_files
+
     def attach_files_to_email(self, msg):
         """Attach all of this communications files to the email message"""
         for file_ in self.files.all():
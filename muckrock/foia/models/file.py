@@ -41,6 +41,39 @@ class FOIAFile(models.Model):
     description = models.TextField(blank=True)
     doc_id = models.SlugField(max_length=266, blank=True, editable=False)
     pages = models.PositiveIntegerField(default=0, editable=False)
+    doccloud_pending_since = models.DateTimeField(
+        blank=True,
+        null=True,
+        db_index=True,
+        editable=False,
+        help_text="When this file was uploaded to DocumentCloud, "
+        "if it is still waiting for it to be processed",
+    )
+    doccloud_polled_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        editable=False,
+        help_text="When DocumentCloud was last checked on for this file, "
+        "while it is waiting for it to be processed",
+    )
+    doccloud_reprocess_attempts = models.PositiveSmallIntegerField(
+        default=0,
+        editable=False,
+        help_text="How many times DocumentCloud has been asked to process "
+        "this file again after an error",
+    )
+    doccloud_attempts = models.PositiveSmallIntegerField(
+        default=0,
+        editable=False,
+        help_text="How many times uploading this file to DocumentCloud "
+        "has been retried",
+    )
+    doccloud_attempted_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        editable=False,
+        help_text="When uploading this file to DocumentCloud last started",
+    )
 
     def __str__(self):
         return self.title
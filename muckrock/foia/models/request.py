@@ -222,6 +222,9 @@ class FOIARequest(models.Model):
                 self.date_embargo = None
         if self.status == "submitted" and self.date_processing is None:
             self.date_processing = date.today()
+        # permissions may depend on the fields being saved,
+        # so clear any memoized permission checks - see `foia.rules.memoize`
+        self._permission_cache = {}
 
         # add a reversion comment if possible
         if "comment" in kwargs:
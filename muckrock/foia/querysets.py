@@ -6,7 +6,21 @@ QuerySets for the FOIA application
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
 from django.db import models
-from django.db.models import Count, F, Max, OuterRef, Q, Subquery, Sum
+from django.db.models import (
+    BooleanField,
+    Case,
+    Count,
+    Exists,
+    F,
+    IntegerField,
+    Max,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
 from django.utils import timezone
 from django.utils.text import slugify
 
@@ -88,30 +102,80 @@ class FOIARequestQuerySet(models.QuerySet):
             return self.all()
 
         if user.is_authenticated:
-            # Requests are visible if you own them, have view or edit permissions,
-            # or if they are not embargoed
-            query = (
-                Q(composer__user=user)
-                | Q(proxy=user)
-                | Q(pk__in=user.edit_access.all())
-                | Q(pk__in=user.read_access.all())
-                | ~Q(embargo=True)
-            )
-            # agency users may also view requests for their agency
-            if user.profile.is_agency_user:
-                query = query | Q(agency=user.profile.agency)
-            # organizational users may also view requests from their org that are shared
-            query = query | Q(
-                composer__user__profile__org_share=True,
-                composer__organization__in=user.organizations.all(),
+            # pylint: disable=import-outside-toplevel
+            # MuckRock
+            from muckrock.foia.models.access import FOIAAccess
+
+            # Requests are visible if they are not embargoed, or if the user
+            # has been granted access to them, either directly as the owner,
+            # proxy or a collaborator, or through their organization or agency
+            return self.exclude(deleted=True).filter(
+                Q(embargo=False)
+                | Q(pk__in=FOIAAccess.objects.get_for_user(user).values("foia_id"))
             )
-            return self.exclude(deleted=True).filter(query)
         else:
             # anonymous user, filter out embargoes and noindex requests
             return (
                 self.exclude(embargo=True).exclude(noindex=True).exclude(deleted=True)
             )
 
+    def with_permissions(self, user):
+        """Annotate the data needed to check permissions for the given user
+
+        The predicates in `muckrock.foia.rules` which would otherwise need to
+        run their own query per request will use these annotations instead,
+        so checking permissions across a page of requests is a single query.
+        Select related `agency`, `composer__user__profile` and `crowdfund` as
+        needed to avoid queries for the remaining predicates.
+        """
+        # pylint: disable=import-outside-toplevel
+        # MuckRock
+        from muckrock.foia.models.access import FOIAAccess
+        from muckrock.foia.models.communication import FOIACommunication
+
+        def granted(reason, **kwargs):
+            """Does the user have the given grant for the request?"""
+            return Exists(
+                FOIAAccess.objects.filter(foia=OuterRef("pk"), reason=reason, **kwargs)
+            )
+
+        if user.is_authenticated:
+            is_editor = granted("edit", user=user)
+            is_read_collaborator = granted("read", user=user)
+            is_org_shared = granted("org", organization__users=user)
+        else:
+            is_editor = is_read_collaborator = is_org_shared = Value(False)
+
+        return self.annotate(
+            perm_user_id=Value(user.pk, output_field=IntegerField()),
+            perm_is_editor=is_editor,
+            perm_is_read_collaborator=is_read_collaborator,
+            perm_is_org_shared=is_org_shared,
+            perm_has_thanks=Exists(
+                FOIACommunication.objects.filter(foia=OuterRef("pk"), thanks=True)
+            ),
+            # appeals must be allowed by both the agency and the law of the
+            # legal jurisdiction, which is the parent state for localities
+            perm_has_appealable_jurisdiction=Case(
+                When(
+                    Q(agency__has_appeal=True)
+                    & (
+                        Q(
+                            agency__jurisdiction__level="l",
+                            agency__jurisdiction__parent__law__has_appeal=True,
+                        )
+                        | (
+                            ~Q(agency__jurisdiction__level="l")
+                            & Q(agency__jurisdiction__law__has_appeal=True)
+                        )
+                    ),
+                    then=Value(True),
+                ),
+                default=Value(False),
+                output_field=BooleanField(),
+            ),
+        )
+
     def get_public(self):
         """Get all publically viewable FOIA requests"""
         return self.get_viewable(AnonymousUser())
@@ -289,21 +353,28 @@ class FOIAComposerQuerySet(models.QuerySet):
             return self.all()
 
         if user.is_authenticated:
+            # pylint: disable=import-outside-toplevel
+            # MuckRock
+            from muckrock.foia.models.access import FOIAAccess
+
             # you can view if
             # * you are the owner
-            # * you are a read or edit collaborator on at least one foia
+            # * you have been granted access to at least one foia
             # * the request is public
             #   * not a draft
             #   * at leats one foia request is not embargoed
             query = (
                 Q(user=user)
-                | Q(foias__read_collaborators=user)
-                | Q(foias__edit_collaborators=user)
+                | Q(foias__in=FOIAAccess.objects.get_for_user(user).values("foia_id"))
                 | (~Q(status="started") & Q(foias__embargo=False))
             )
-            # organizational users may also view requests from their org
-            # that are shared
-            query = query | Q(user__profile__org_share=True, organization__users=user)
+            # organizational users may also view drafts from their org
+            # that are shared, which have no foias to grant access to yet
+            query = query | Q(
+                status="started",
+                user__profile__org_share=True,
+                organization__users=user,
+            )
             return self.filter(query)
         else:
             # anonymous user, filter out drafts and embargoes
@@ -363,20 +434,16 @@ class FOIACommunicationQuerySet(PreloadFileQuerysetMixin, models.QuerySet):
             return self.all()
 
         if user.is_authenticated:
-            # Requests are visible if you own them, have view or edit permissions,
-            # or if they are not embargoed
-            query = (
-                Q(foia__composer__user=user)
-                | Q(foia__in=user.edit_access.all())
-                | Q(foia__in=user.read_access.all())
-                | Q(foia__embargo=False)
+            # pylint: disable=import-outside-toplevel
+            # MuckRock
+            from muckrock.foia.models.access import FOIAAccess
+
+            # Communications are visible if their request is not embargoed, or
+            # if the user has been granted access to their request
+            return self.filter(
+                Q(foia__embargo=False)
+                | Q(foia__in=FOIAAccess.objects.get_for_user(user).values("foia_id"))
             )
-            # organizational users may also view requests from their org that are shared
-            query = query | Q(
-                foia__composer__user__profile__org_share=True,
-                foia__composer__organization__in=user.organizations.all(),
-            )
-            return self.filter(query)
         else:
             # anonymous user, filter out embargoes
             return self.filter(foia__embargo=False)
@@ -460,6 +527,84 @@ class FOIATemplateQuerySet(models.QuerySet):
         return template
 
 
+class FOIAAccessQuerySet(models.QuerySet):
+    """Custom Queryset for FOIA Access grants"""
+
+    def get_for_user(self, user):
+        """All grants which give the user access"""
+        query = Q(user=user) | Q(organization__users=user)
+        if user.profile.is_agency_user:
+            query |= Q(agency=user.profile.agency_id)
+        return self.filter(query)
+
+    def sync(self, foia_pks):
+        """Bring the grants for the given requests up to date
+
+        Computes the grants each request should have from its current owner,
+        proxy, collaborators, organizational sharing and agency, and applies
+        the difference against the grants which currently exist.  This is a
+        constant number of queries regardless of how many requests are given.
+        """
+        # pylint: disable=import-outside-toplevel
+        # MuckRock
+        from muckrock.foia.models.request import FOIARequest
+
+        foia_pks = list(foia_pks)
+        if not foia_pks:
+            return
+
+        wanted = set()
+        foias = FOIARequest.objects.filter(pk__in=foia_pks).values_list(
+            "pk",
+            "composer__user_id",
+            "composer__organization_id",
+            "composer__user__profile__org_share",
+            "proxy_id",
+            "agency_id",
+        )
+        for foia_pk, owner_id, org_id, org_share, proxy_id, agency_id in foias:
+            wanted.add((foia_pk, "owner", owner_id, None, None))
+            wanted.add((foia_pk, "agency", None, None, agency_id))
+            if proxy_id is not None:
+                wanted.add((foia_pk, "proxy", proxy_id, None, None))
+            if org_share and org_id is not None:
+                wanted.add((foia_pk, "org", None, org_id, None))
+        for reason, field in [
+            ("edit", FOIARequest.edit_collaborators),
+            ("read", FOIARequest.read_collaborators),
+        ]:
+            collaborators = field.through.objects.filter(
+                foiarequest_id__in=foia_pks
+            ).values_list("foiarequest_id", "user_id")
+            for foia_pk, user_id in collaborators:
+                wanted.add((foia_pk, reason, user_id, None, None))
+
+        existing = {
+            key[1:]: key[0]
+            for key in self.filter(foia_id__in=foia_pks).values_list(
+                "pk", "foia_id", "reason", "user_id", "organization_id", "agency_id"
+            )
+        }
+
+        stale = [pk for key, pk in existing.items() if key not in wanted]
+        if stale:
+            self.filter(pk__in=stale).delete()
+        missing = wanted - existing.keys()
+        if missing:
+            self.bulk_create(
+                [
+                    self.model(
+                        foia_id=foia_pk,
+                        reason=reason,
+                        user_id=user_id,
+                        organization_id=org_id,
+                        agency_id=agency_id,
+                    )
+                    for foia_pk, reason, user_id, org_id, agency_id in missing
+                ]
+            )
+
+
 class RawEmailQuerySet(models.QuerySet):
     """Custom query set for Raw Emails"""
 
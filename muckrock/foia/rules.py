@@ -51,6 +51,35 @@ def user_authenticated(func):
     return inner
 
 
+def precomputed(func):
+    """Decorator for predicates
+    Use the value annotated by FOIARequestQuerySet.with_permissions if it is
+    present and was computed for this user, instead of querying for it"""
+    attr = "perm_{}".format(func.__name__)
+
+    @wraps(func)
+    def inner(user, foia):
+        value = getattr(foia, attr, None)
+        if value is not None and getattr(foia, "perm_user_id", None) == user.pk:
+            return value
+        return func(user, foia)
+
+    return inner
+
+
+def memoize(obj, key, func):
+    """Cache the result of a permission query on the object
+
+    Objects generally only live for a single request/response cycle, so this
+    prevents the same query from being issued repeatedly while checking the
+    many permissions which share predicates.  The cache is cleared when the
+    object is saved or its collaborators change."""
+    cache = obj.__dict__.setdefault("_permission_cache", {})
+    if key not in cache:
+        cache[key] = func()
+    return cache[key]
+
+
 def has_status(*statuses):
     @predicate("has_status:%s" % ",".join(statuses))
     @skip_if_not_obj
@@ -79,21 +108,39 @@ def no_foia(user, foia):
 
 @predicate
 @skip_if_not_obj
+@precomputed
 def is_editor(user, foia):
-    return user.is_authenticated and foia.edit_collaborators.filter(pk=user.pk).exists()
+    return user.is_authenticated and memoize(
+        foia,
+        ("is_editor", user.pk),
+        lambda: foia.edit_collaborators.filter(pk=user.pk).exists(),
+    )
 
 
 @predicate
 @skip_if_not_obj
+@precomputed
 def is_read_collaborator(user, foia):
-    return user.is_authenticated and foia.read_collaborators.filter(pk=user.pk).exists()
+    return user.is_authenticated and memoize(
+        foia,
+        ("is_read_collaborator", user.pk),
+        lambda: foia.read_collaborators.filter(pk=user.pk).exists(),
+    )
 
 
 @predicate
 @skip_if_not_obj
+@precomputed
 @user_authenticated
 def is_org_shared(user, foia):
-    return foia.user.profile.org_share and foia.composer.organization.has_member(user)
+    if not foia.user.profile.org_share:
+        return False
+    organization = foia.composer.organization
+    return memoize(
+        foia,
+        ("is_org_member", user.pk, organization.pk),
+        lambda: organization.has_member(user),
+    )
 
 
 is_viewer = is_read_collaborator | is_org_shared
@@ -110,8 +157,13 @@ is_private = is_embargoed
 
 @predicate
 @skip_if_not_obj
+@precomputed
 def has_thanks(user, foia):
-    return foia.communications.filter(thanks=True).exists()
+    return memoize(
+        foia,
+        ("has_thanks",),
+        lambda: foia.communications.filter(thanks=True).exists(),
+    )
 
 
 is_thankable = ~has_thanks & has_status(*END_STATUS)
@@ -119,6 +171,7 @@ is_thankable = ~has_thanks & has_status(*END_STATUS)
 
 @predicate
 @skip_if_not_obj
+@precomputed
 def has_appealable_jurisdiction(user, foia):
     return foia.agency.has_appeal and foia.agency.jurisdiction.has_appeal
 
@@ -3,30 +3,120 @@
 # Django
 from django.conf import settings
 from django.db import transaction
-from django.db.models.signals import post_delete, pre_save
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
 
 # Third Party
-from documentcloud import DocumentCloud
 from documentcloud.exceptions import DoesNotExistError
 
 # MuckRock
+from muckrock.accounts.models import Profile
+from muckrock.core.documentcloud import get_documentcloud_client
 from muckrock.core.utils import clear_cloudfront_cache, get_s3_storage_bucket
-from muckrock.foia.models import FOIAFile, FOIARequest, OutboundRequestAttachment
+from muckrock.foia.models import (
+    FOIAAccess,
+    FOIAComposer,
+    FOIAFile,
+    FOIARequest,
+    OutboundRequestAttachment,
+)
 from muckrock.foia.tasks import upload_document_cloud
 
+# the request fields its access grants are computed from, see
+# `FOIAAccessQuerySet.sync`
+ACCESS_FIELDS = ("composer_id", "proxy_id", "agency_id")
+
+
+def get_saved_request(instance):
+    """Get the request as it is saved in the database, before it is changed
+
+    For the pre save handlers in this app and others.  It is only loaded once
+    per save, and kept on the request for the other handlers until
+    `foia_clear_saved` removes it once the request is saved.
+    """
+    # pylint: disable=protected-access
+    if not hasattr(instance, "_saved_request"):
+        instance._saved_request = instance.get_saved() if instance.pk else None
+    return instance._saved_request
+
+
+def foia_clear_saved(sender, instance, **kwargs):
+    """The saved request is out of date once the request is saved"""
+    # pylint: disable=unused-argument
+    instance.__dict__.pop("_saved_request", None)
+
 
 @transaction.atomic
 def foia_update_embargo(sender, **kwargs):
     """When embargo has possibly been switched, update the document cloud permissions"""
     # pylint: disable=unused-argument
     request = kwargs["instance"]
-    old_request = request.get_saved()
+    old_request = get_saved_request(request)
     # if we are saving a new FOIA Request, there are no docs to update
     if old_request and request.embargo != old_request.embargo:
         for doc in request.get_files().get_doccloud():
             transaction.on_commit(lambda doc=doc: upload_document_cloud.delay(doc.pk))
 
 
+def foia_check_access(sender, instance, **kwargs):
+    """Note if the request's owner, proxy or agency are changing"""
+    # pylint: disable=unused-argument, protected-access
+    old_request = get_saved_request(instance)
+    instance._access_changed = old_request is None or any(
+        getattr(old_request, field) != getattr(instance, field)
+        for field in ACCESS_FIELDS
+    )
+
+
+def foia_update_access(sender, instance, created, **kwargs):
+    """Keep the access grants in sync with the request's owner, proxy and agency"""
+    # pylint: disable=unused-argument
+    if created or getattr(instance, "_access_changed", True):
+        FOIAAccess.objects.sync([instance.pk])
+
+
+def collaborators_update_access(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep the access grants in sync with the request's collaborators"""
+    # pylint: disable=unused-argument, protected-access
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        # clear any memoized permission checks - see `foia.rules.memoize`
+        instance._permission_cache = {}
+        FOIAAccess.objects.sync([instance.pk])
+    elif action == "post_clear":
+        # the user was removed from all requests, we do not know which ones
+        # so sync every request they currently have a grant for
+        FOIAAccess.objects.sync(
+            FOIAAccess.objects.filter(user=instance).values_list("foia_id", flat=True)
+        )
+    else:
+        FOIAAccess.objects.sync(pk_set)
+
+
+def composer_update_access(sender, instance, created, **kwargs):
+    """The composer's organization determines organizational sharing"""
+    # pylint: disable=unused-argument
+    if not created:
+        FOIAAccess.objects.sync(instance.foias.values_list("pk", flat=True))
+
+
+def profile_update_access(sender, instance, **kwargs):
+    """Grant or revoke organizational access when org sharing is toggled"""
+    # pylint: disable=unused-argument
+    if instance.org_share:
+        # only sync requests which are missing their organizational grant
+        FOIAAccess.objects.sync(
+            FOIARequest.objects.filter(composer__user=instance.user_id)
+            .exclude(composer__organization=None)
+            .exclude(access_grants__reason="org")
+            .values_list("pk", flat=True)
+        )
+    else:
+        FOIAAccess.objects.filter(
+            reason="org", foia__composer__user=instance.user_id
+        ).delete()
+
+
 def foia_file_delete_s3(sender, **kwargs):
     """Delete file from S3 after the model is deleted"""
     # pylint: disable=unused-argument
@@ -47,12 +137,7 @@ def foia_file_delete_dc(sender, **kwargs):
 
     foia_file = kwargs["instance"]
     if foia_file.doc_id:
-        dc_client = DocumentCloud(
-            username=settings.DOCUMENTCLOUD_BETA_USERNAME,
-            password=settings.DOCUMENTCLOUD_BETA_PASSWORD,
-            base_uri=f"{settings.DOCCLOUD_API_URL}/api/",
-            auth_uri=f"{settings.SQUARELET_URL}/api/",
-        )
+        dc_client = get_documentcloud_client()
         try:
             dc_client.documents.delete(foia_file.doc_id)
         except DoesNotExistError:
@@ -77,6 +162,48 @@ pre_save.connect(
     dispatch_uid="muckrock.foia.signals.embargo",
 )
 
+pre_save.connect(
+    foia_check_access,
+    sender=FOIARequest,
+    dispatch_uid="muckrock.foia.signals.check_access",
+)
+
+post_save.connect(
+    foia_update_access,
+    sender=FOIARequest,
+    dispatch_uid="muckrock.foia.signals.access",
+)
+
+post_save.connect(
+    foia_clear_saved,
+    sender=FOIARequest,
+    dispatch_uid="muckrock.foia.signals.clear_saved",
+)
+
+m2m_changed.connect(
+    collaborators_update_access,
+    sender=FOIARequest.edit_collaborators.through,
+    dispatch_uid="muckrock.foia.signals.edit_collaborators_access",
+)
+
+m2m_changed.connect(
+    collaborators_update_access,
+    sender=FOIARequest.read_collaborators.through,
+    dispatch_uid="muckrock.foia.signals.read_collaborators_access",
+)
+
+post_save.connect(
+    composer_update_access,
+    sender=FOIAComposer,
+    dispatch_uid="muckrock.foia.signals.composer_access",
+)
+
+post_save.connect(
+    profile_update_access,
+    sender=Profile,
+    dispatch_uid="muckrock.foia.signals.profile_access",
+)
+
 post_delete.connect(
     foia_file_delete_s3,
     sender=FOIAFile,
@@ -9,10 +9,11 @@ from celery.task import periodic_task, task
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.postgres.aggregates.general import StringAgg
+from django.core.cache import caches
 from django.core.files.storage import default_storage
 from django.core.mail.message import EmailMessage
 from django.db import transaction
-from django.db.models import DurationField, F
+from django.db.models import Case, DurationField, F, Q, Value, When
 from django.db.models.functions import Cast, Now
 from django.db.models.query import Prefetch
 from django.template.loader import render_to_string
@@ -26,7 +27,8 @@ import os
 import os.path
 import re
 import sys
-from datetime import date, datetime, time
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
 from random import randint
 
 # Third Party
@@ -57,6 +59,8 @@ from muckrock.communication.models import (
     MailCommunication,
     PortalCommunication,
 )
+from muckrock.core.cache import TokenBucket
+from muckrock.core.documentcloud import get_documentcloud_client
 from muckrock.core.models import ExtractDay
 from muckrock.core.tasks import AsyncFileDownloadTask
 from muckrock.core.utils import read_in_chunks, squarelet_get
@@ -112,17 +116,59 @@ def upload_document_cloud(ffile_pk):
 
     # if it has a doc_id already, we are changing it, not creating it
     change = bool(ffile.doc_id)
+    if not change:
+        # so that `retry_stuck_documents` leaves it alone while it is uploading
+        FOIAFile.objects.filter(pk=ffile.pk).update(
+            doccloud_attempted_at=timezone.now()
+        )
 
-    dc_client = DocumentCloud(
-        username=settings.DOCUMENTCLOUD_BETA_USERNAME,
-        password=settings.DOCUMENTCLOUD_BETA_PASSWORD,
-        base_uri=f"{settings.DOCCLOUD_API_URL}/api/",
-        auth_uri=f"{settings.SQUARELET_URL}/api/",
-    )
+    dc_client = get_documentcloud_client()
 
     _upload_documentcloud(dc_client, ffile, change, save_doc_attrs=True)
 
 
+@task(
+    ignore_result=True,
+    time_limit=1800,
+    name="muckrock.foia.tasks.upload_document_cloud_batch",
+)
+def upload_document_cloud_batch(ffile_pks, retry=True):
+    """Upload many documents to Document Cloud, sharing one client
+
+    Any document which fails to upload is retried individually, unless `retry`
+    is false, in which case it is left for `retry_stuck_documents` to retry
+    within its rate limit
+    """
+
+    logger.info("Upload Doc Cloud Batch: %s", ffile_pks)
+
+    ffiles = FOIAFile.objects.filter(pk__in=ffile_pks).select_related(
+        "comm__foia__agency__jurisdiction"
+    )
+
+    # so that `retry_stuck_documents` leaves them alone while they are uploading
+    FOIAFile.objects.filter(pk__in=ffile_pks, doc_id="").update(
+        doccloud_attempted_at=timezone.now()
+    )
+    dc_client = get_documentcloud_client()
+
+    for ffile in ffiles:
+        if not ffile.is_doccloud():
+            continue
+        try:
+            _upload_documentcloud(
+                dc_client, ffile, bool(ffile.doc_id), save_doc_attrs=True
+            )
+        except (DocumentCloudError, requests.exceptions.RequestException) as exc:
+            logger.warning("Error uploading file %s to Doc Cloud: %s", ffile.pk, exc)
+            if retry:
+                upload_document_cloud.delay(ffile.pk)
+            else:
+                FOIAFile.objects.filter(pk=ffile.pk).update(
+                    doccloud_attempted_at=timezone.now()
+                )
+
+
 @task(
     ignore_result=True,
     time_limit=600,
@@ -213,72 +259,219 @@ def _upload_documentcloud(dc_client, ffile, change, save_doc_attrs, extra_params
             document = dc_client.documents.upload(ffile.ffile.url, **params)
             if save_doc_attrs:
                 ffile.doc_id = f"{document.id}-{document.slug}"
-                ffile.save()
 
-        if save_doc_attrs:
-            transaction.on_commit(
-                lambda: set_document_cloud_pages.apply_async(
-                    args=[ffile.pk], countdown=settings.DOCCLOUD_PROCESSING_WAIT
-                )
-            )
-
-
-class DocumentCloudRetryError(Exception):
-    """Custom Error to trigger a retry if the document is not done processing"""
+        if save_doc_attrs and not ffile.pages:
+            # `poll_document_cloud` will set the pages once it is processed
+            ffile.doccloud_pending_since = timezone.now()
+            ffile.doccloud_polled_at = None
+            ffile.doccloud_reprocess_attempts = 0
+        if save_doc_attrs and (not change or not ffile.pages):
+            ffile.save()
 
 
-@task(
-    ignore_result=True,
-    name="muckrock.foia.tasks.set_document_cloud_pages",
-    autoretry_for=(DocumentCloudError, DocumentCloudRetryError, requests.ReadTimeout),
-    retry_backoff=60,
-    retry_kwargs={"max_retries": 10},
+@periodic_task(
+    run_every=crontab(minute="*/2"),
+    time_limit=5 * 60,
+    name="muckrock.foia.tasks.poll_document_cloud",
 )
-def set_document_cloud_pages(ffile_pk):
-    """Get the number of pages from the document cloud server and save it locally"""
-
+def poll_document_cloud():
+    """Check on the documents DocumentCloud is processing, in batches
+
+    Documents which have finished have their page counts saved, and documents
+    which have been processing for too long are uploaded again.  The
+    documents which were checked on least recently are checked first, so that
+    every pending document is checked on even if there are more than can be
+    checked at once.  Only one check runs at a time.
+    """
+    # outlasts the time limit, so it is not released by another run
+    lock = caches["lock"].lock("poll_document_cloud", expire=6 * 60)
+    if not lock.acquire(blocking=False):
+        logger.info("Doc Cloud is already being polled")
+        return
     try:
-        ffile = FOIAFile.objects.get(pk=ffile_pk)
-    except FOIAFile.DoesNotExist:
+        _poll_document_cloud()
+    finally:
+        lock.release()
+
+
+def _poll_document_cloud():
+    """Check on a batch of pending documents"""
+    # pylint: disable=import-outside-toplevel
+    # MuckRock
+    from muckrock.jurisdiction.signals import schedule_refresh_request_stats
+
+    polled = list(
+        FOIAFile.objects.exclude(doccloud_pending_since=None)
+        .exclude(doc_id="")
+        .only(
+            "doc_id",
+            "pages",
+            "doccloud_pending_since",
+            "doccloud_polled_at",
+            "doccloud_reprocess_attempts",
+        )
+        .order_by(
+            F("doccloud_polled_at").asc(nulls_first=True), "doccloud_pending_since"
+        )[: settings.DOCCLOUD_POLL_LIMIT]
+    )
+    if not polled:
         return
+    logger.info("Polling %d pending documents on Doc Cloud", len(polled))
+
+    dc_client = get_documentcloud_client()
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.DOCCLOUD_PENDING_TIMEOUT)
+    pending = {ffile.doc_id.split("-")[0]: ffile for ffile in polled}
+    for ffile in polled:
+        ffile.doccloud_polled_at = now
+    for group in grouper(list(pending), BULK_LIMIT):
+        ids = [id_ for id_ in group if id_ is not None]
+        try:
+            documents = list(
+                dc_client.documents.list(id__in=",".join(ids), per_page=BULK_LIMIT)
+            )
+        except DocumentCloudError as exc:
+            logger.warning("Error polling Doc Cloud: %s", exc)
+            continue
+        for document in documents:
+            ffile = pending.pop(str(document.id), None)
+            if ffile is None:
+                continue
+            if document.status == "success":
+                ffile.pages = document.page_count
+                ffile.doccloud_pending_since = None
+            elif document.status == "error" and ffile.doccloud_pending_since >= stale:
+                _reprocess_document_cloud(document, ffile, now)
+            elif ffile.doccloud_pending_since < stale:
+                # still not processed - try uploading it again
+                ffile.doc_id = ""
+                ffile.doccloud_pending_since = None
+                _delete_document_cloud(dc_client, document.id)
+        # any remaining documents in this group are missing from Doc Cloud,
+        # so upload them again once they are stale
+        for id_ in ids:
+            ffile = pending.pop(id_, None)
+            if ffile is not None and ffile.doccloud_pending_since < stale:
+                ffile.doc_id = ""
+                ffile.doccloud_pending_since = None
+
+    FOIAFile.objects.bulk_update(
+        polled,
+        [
+            "doc_id",
+            "pages",
+            "doccloud_pending_since",
+            "doccloud_polled_at",
+            "doccloud_reprocess_attempts",
+        ],
+    )
+    # the page counts are rolled up into the agencies' request statistics
+    counted = [ffile.pk for ffile in polled if ffile.pages]
+    if counted:
+        for agency_id in (
+            FOIARequest.objects.filter(communications__files__in=counted)
+            .values_list("agency_id", flat=True)
+            .distinct()
+        ):
+            schedule_refresh_request_stats(agency_id)
+    reupload = [ffile.pk for ffile in polled if not ffile.doc_id]
+    if reupload:
+        logger.info("Reuploading %d documents stuck on Doc Cloud", len(reupload))
+        # so that `retry_stuck_documents` does not also upload them
+        FOIAFile.objects.filter(pk__in=reupload).update(
+            doccloud_attempted_at=timezone.now()
+        )
+        upload_document_cloud_batch.delay(reupload)
 
-    if ffile.pages or not ffile.is_doccloud() or not ffile.doc_id:
-        # already has pages set or not a doc cloud, just return
-        return
 
-    dc_client = DocumentCloud(
-        username=settings.DOCUMENTCLOUD_BETA_USERNAME,
-        password=settings.DOCUMENTCLOUD_BETA_PASSWORD,
-        base_uri=f"{settings.DOCCLOUD_API_URL}/api/",
-        auth_uri=f"{settings.SQUARELET_URL}/api/",
-    )
-    document = dc_client.documents.get(ffile.doc_id)
+def _reprocess_document_cloud(document, ffile, now):
+    """Ask Doc Cloud to process a document which errored again
 
-    if document.status == "success":
-        # the document was processed succsefully, save the page count
-        ffile.pages = document.page_count
-        ffile.save()
-    elif document.status in ("pending", "readable", "nofile"):
-        # the document is still processing or downloading the file,
-        # retry with exponential backoff
-        raise DocumentCloudRetryError()
-    elif document.status == "error":
-        # if there was an error, try to reprocess the document, then retry
-        # setting the pages
+    The attempts back off exponentially from when the document was uploaded,
+    and are limited in number
+    """
+    attempts = ffile.doccloud_reprocess_attempts
+    if attempts >= settings.DOCCLOUD_REPROCESS_MAX_ATTEMPTS:
+        return
+    backoff = settings.DOCCLOUD_REPROCESS_BACKOFF * (2**attempts - 1)
+    if now < ffile.doccloud_pending_since + timedelta(seconds=backoff):
+        return
+    ffile.doccloud_reprocess_attempts += 1
+    try:
         document.process()
-        raise DocumentCloudRetryError()
+    except DocumentCloudError as exc:
+        logger.warning("Error reprocessing %s: %s", ffile.doc_id, exc)
+
+
+def _delete_document_cloud(dc_client, doc_id):
+    """Delete a document from Doc Cloud, if it is still there"""
+    try:
+        dc_client.documents.delete(doc_id)
+    except DocumentCloudError as exc:
+        logger.warning("Error deleting %s from Doc Cloud: %s", doc_id, exc)
 
 
 @periodic_task(
-    run_every=crontab(hour=0, minute=20),
+    run_every=crontab(minute="*/10"),
     name="muckrock.foia.tasks.retry_stuck_documents",
 )
 def retry_stuck_documents():
-    """Reupload all document cloud documents which are stuck"""
-    docs = FOIAFile.objects.filter(doc_id="").exclude(comm__foia=None).get_doccloud()
-    logger.info("Reupload documents, %d documents are stuck", len(docs))
-    for doc in docs:
-        upload_document_cloud.delay(doc.pk)
+    """Reupload document cloud documents which are stuck
+
+    The most recent files are retried first, in chunks, for as long as the
+    shared rate limit allows, so that a large backlog is worked through
+    gradually over many runs.  Each file is only retried a limited number of
+    times, and not again until some time has passed since its last upload
+    started.  New files are given time for their first upload to finish.
+    """
+    now = timezone.now()
+    docs = (
+        FOIAFile.objects.filter(
+            doc_id="", doccloud_attempts__lt=settings.DOCCLOUD_RETRY_MAX_ATTEMPTS
+        )
+        .filter(
+            Q(doccloud_attempted_at=None)
+            | Q(
+                doccloud_attempted_at__lt=now
+                - timedelta(seconds=settings.DOCCLOUD_RETRY_BACKOFF)
+            )
+        )
+        .filter(
+            Q(datetime=None)
+            | Q(datetime__lt=now - timedelta(seconds=settings.DOCCLOUD_RETRY_GRACE))
+        )
+        .exclude(comm__foia=None)
+        .get_doccloud()
+        .order_by("-pk")
+    )
+    bucket = TokenBucket(
+        "retry_stuck_documents",
+        settings.DOCCLOUD_RETRY_RATE,
+        settings.DOCCLOUD_RETRY_BURST,
+    )
+
+    retried = 0
+    last_pk = None
+    while True:
+        chunk = docs if last_pk is None else docs.filter(pk__lt=last_pk)
+        pks = list(
+            chunk.values_list("pk", flat=True)[: settings.DOCCLOUD_RETRY_CHUNK_SIZE]
+        )
+        if not pks:
+            break
+        last_pk = pks[-1]
+        pks = pks[: bucket.take(len(pks))]
+        if not pks:
+            break
+        FOIAFile.objects.filter(pk__in=pks).update(
+            doccloud_attempts=F("doccloud_attempts") + 1, doccloud_attempted_at=now
+        )
+        upload_document_cloud_batch.delay(pks, retry=False)
+        retried += len(pks)
+        if len(pks) < settings.DOCCLOUD_RETRY_CHUNK_SIZE:
+            # either there are no more files, or no more tokens
+            break
+    logger.info("Reupload documents, %d stuck documents retried", retried)
 
 
 @task(
@@ -294,12 +487,7 @@ def noindex_documentcloud(foia_pk):
     doc_ids = foia.get_files().exclude(doc_id="").values_list("doc_id", flat=True)
     # get just the numeric ID
     doc_ids = [d.split("-")[0] for d in doc_ids]
-    dc_client = DocumentCloud(
-        username=settings.DOCUMENTCLOUD_BETA_USERNAME,
-        password=settings.DOCUMENTCLOUD_BETA_PASSWORD,
-        base_uri=f"{settings.DOCCLOUD_API_URL}/api/",
-        auth_uri=f"{settings.SQUARELET_URL}/api/",
-    )
+    dc_client = get_documentcloud_client()
     for group in grouper(doc_ids, BULK_LIMIT):
         resp = dc_client.patch(
             "documents/",
@@ -372,12 +560,7 @@ def classify_status(task_pk, **kwargs):
     def get_text_ocr(doc_id):
         """Get the text OCR from document cloud"""
 
-        dc_client = DocumentCloud(
-            username=settings.DOCUMENTCLOUD_BETA_USERNAME,
-            password=settings.DOCUMENTCLOUD_BETA_PASSWORD,
-            base_uri=f"{settings.DOCCLOUD_API_URL}/api/",
-            auth_uri=f"{settings.SQUARELET_URL}/api/",
-        )
+        dc_client = get_documentcloud_client()
 
         try:
             document = dc_client.documents.get(doc_id)
@@ -523,37 +706,126 @@ def send_fax(comm_id, subject, body, error_count, **kwargs):
 
 
 @periodic_task(
-    run_every=crontab(hour=1, minute=0),
+    # runs after 1am are resumptions, in case the first did not finish
+    run_every=crontab(hour="1-5", minute=0),
     time_limit=10 * 60,
     soft_time_limit=570,
     name="muckrock.foia.tasks.followup_requests",
 )
 def followup_requests():
-    """Follow up on any requests that need following up on"""
-    log = []
+    """Follow up on any requests that need following up on
+
+    The requests are paged through by primary key, and dispatched in chunks
+    grouped by the channel the follow up will be sent over.  Each channel's
+    chunks are spread out over time according to its rate limit.  Progress is
+    checkpointed, so a later run on the same day resumes where this one
+    stopped.
+    """
     # weekday returns 5 for sat and 6 for sun
     is_weekday = date.today().weekday() < 5
-    if config.ENABLE_FOLLOWUP and (config.ENABLE_WEEKEND_FOLLOWUP or is_weekday):
-        num_requests = FOIARequest.objects.get_followup().count()
-        try:
-            for foia in FOIARequest.objects.get_followup():
-                try:
-                    foia.followup()
-                    log.append("%s - %d - %s" % (foia.status, foia.pk, foia.title))
-                except AnymailError as exc:
-                    logger.error(
-                        "Mailgun error during followups: %s",
-                        exc,
-                        exc_info=sys.exc_info(),
-                    )
-        except SoftTimeLimitExceeded:
-            logger.warning(
-                "Follow ups did not complete in time. Completed %d out of %d",
-                num_requests - FOIARequest.objects.get_followup().count(),
-                num_requests,
+    if not config.ENABLE_FOLLOWUP or not (config.ENABLE_WEEKEND_FOLLOWUP or is_weekday):
+        return
+
+    lock_cache = caches["lock"]
+    key = "followup_requests:{}".format(date.today().isoformat())
+    timeout = 24 * 60 * 60
+    checkpoint = lock_cache.get(key) or {"cursor": 0, "dispatched": 0, "etas": {}}
+    lock_cache.add(f"{key}:sent", 0, timeout)
+
+    foias = (
+        FOIARequest.objects.get_followup()
+        .annotate(
+            # the channel `_send_msg` will choose
+            channel=Case(
+                When(portal__status="good", then=Value("portal")),
+                When(email__status="good", then=Value("email")),
+                When(fax__status="good", then=Value("fax")),
+                default=Value("mail"),
             )
+        )
+        .order_by("pk")
+        .values_list("pk", "channel")
+    )
+    page_size = 20 * settings.FOLLOWUP_CHUNK_SIZE
+    start = timezone.now()
+    try:
+        while True:
+            page = list(foias.filter(pk__gt=checkpoint["cursor"])[:page_size])
+            if not page:
+                break
+            channels = defaultdict(list)
+            for pk, channel in page:
+                channels[channel].append(pk)
+            for channel, pks in channels.items():
+                for i in range(0, len(pks), settings.FOLLOWUP_CHUNK_SIZE):
+                    chunk = pks[i : i + settings.FOLLOWUP_CHUNK_SIZE]
+                    eta = max(checkpoint["etas"].get(channel, start), timezone.now())
+                    followup_request_chunk.apply_async(args=[chunk, key], eta=eta)
+                    checkpoint["etas"][channel] = eta + timedelta(
+                        minutes=len(chunk) / settings.FOLLOWUP_RATE_LIMITS[channel]
+                    )
+            checkpoint["cursor"] = page[-1][0]
+            checkpoint["dispatched"] += len(page)
+            lock_cache.set(key, checkpoint, timeout)
+    except SoftTimeLimitExceeded:
+        logger.warning(
+            "Follow up dispatch did not complete in time, will resume after %d",
+            checkpoint["cursor"],
+        )
 
-        logger.info("Follow Ups:\n%s", "\n".join(log))
+    logger.info(
+        "Follow ups: %d dispatched, %d sent so far today, finishing by %s",
+        checkpoint["dispatched"],
+        lock_cache.get(f"{key}:sent", 0),
+        max(checkpoint["etas"].values(), default=start),
+    )
+
+
+@task(
+    ignore_result=True,
+    time_limit=10 * 60,
+    soft_time_limit=570,
+    name="muckrock.foia.tasks.followup_request_chunk",
+)
+def followup_request_chunk(foia_pks, key):
+    """Follow up on a chunk of requests"""
+    log = []
+    start = timezone.now()
+    for i, pk in enumerate(foia_pks):
+        try:
+            with transaction.atomic():
+                # skip requests which have already been followed up on, or are
+                # being followed up on, if a chunk is dispatched more than once
+                foia = (
+                    FOIARequest.objects.get_followup()
+                    .select_for_update(skip_locked=True, of=("self",))
+                    .filter(pk=pk)
+                    .first()
+                )
+                if foia is None:
+                    continue
+                foia.followup()
+            log.append("%s - %d - %s" % (foia.status, foia.pk, foia.title))
+        except AnymailError as exc:
+            logger.error(
+                "Mailgun error during followups: %s", exc, exc_info=sys.exc_info()
+            )
+        except SoftTimeLimitExceeded:
+            # continue with the rest of the chunk in a new task
+            followup_request_chunk.delay(foia_pks[i:], key)
+            break
+
+    seconds = (timezone.now() - start).total_seconds()
+    lock_cache = caches["lock"]
+    lock_cache.add(f"{key}:sent", 0, 24 * 60 * 60)
+    lock_cache.incr(f"{key}:sent", len(log))
+    logger.info(
+        "Follow Ups: %d sent in %.1fs (%.1f/min)\n%s",
+        len(log),
+        seconds,
+        60 * len(log) / seconds if seconds else 0,
+        "\n".join(log),
+    )
 
 
 @periodic_task(
@@ -983,6 +1255,7 @@ class ZipRequest(AsyncFileDownloadTask):
 
     def generate_file(self, out_file):
         """Zip all of the communications and files"""
+
         # https://stackoverflow.com/questions/57165960/error-0x80070057-the-parameter-is-incorrect-when-unzipping-files
         def clean(filename):
             return re.sub('[<>:"/\\\\|?*]', "_", filename)
@@ -1190,12 +1463,7 @@ def import_doccloud_file(file_pk):
     except FOIAFile.DoesNotExist:
         return
 
-    dc_client = DocumentCloud(
-        username=settings.DOCUMENTCLOUD_BETA_USERNAME,
-        password=settings.DOCUMENTCLOUD_BETA_PASSWORD,
-        base_uri=f"{settings.DOCCLOUD_API_URL}/api/",
-        auth_uri=f"{settings.SQUARELET_URL}/api/",
-    )
+    dc_client = get_documentcloud_client()
     document = dc_client.documents.get(ffile.doc_id)
 
     ext = ffile.get_extension()
@@ -24,7 +24,7 @@ from muckrock.core.factories import (
     UserFactory,
 )
 from muckrock.core.test_utils import mock_squarelet
-from muckrock.foia.factories import FOIATemplateFactory
+from muckrock.foia.factories import FOIARequestFactory, FOIATemplateFactory
 from muckrock.foia.models import FOIAComposer
 
 
@@ -262,3 +262,33 @@ class TestFOIAViewsetCreate(TestCase):
             code=402,
             status="Out of requests.  FOI Request has been saved.",
         )
+
+
+class TestFOIAViewsetList(TestCase):
+    """Unit Tests for FOIA API Viewset list method"""
+
+    def setUp(self):
+        for _ in range(3):
+            FOIARequestFactory()
+
+    def test_page_numbers(self):
+        """Lists are paged by number and counted by default"""
+        response = self.client.get(reverse("api-foia-list"), {"page_size": 2})
+        eq_(response.status_code, 200)
+        eq_(response.json()["count"], 3)
+        response = self.client.get(
+            reverse("api-foia-list"), {"page_size": 2, "page": 2}
+        )
+        eq_(len(response.json()["results"]), 1)
+
+    def test_cursor(self):
+        """Keyset pagination is used when asked for"""
+        response = self.client.get(
+            reverse("api-foia-list"), {"page_size": 2, "pagination": "cursor"}
+        )
+        eq_(response.status_code, 200)
+        data = response.json()
+        ok_("count" not in data)
+        eq_(len(data["results"]), 2)
+        response = self.client.get(data["next"])
+        eq_(len(response.json()["results"]), 1)
@@ -4,6 +4,7 @@ Tests for the FOIACommunication model
 
 # Django
 from django import test
+from django.core.files.base import ContentFile
 
 # Standard Library
 import logging
@@ -74,6 +75,21 @@ class TestCommunication(test.TestCase):
         eq_(foia_file.ffile.file.name, "doc.pdf")
         eq_(foia_file.ffile.read(), "More contents")
 
+    @patch("muckrock.foia.tasks.upload_document_cloud_batch.delay")
+    def test_attach_files(self, mock_upload):
+        """Test attaching many files at once"""
+        comm = FOIACommunicationFactory()
+        files = [
+            ContentFile("Contents %d" % i, name="doc%d.pdf" % i) for i in range(50)
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(1):
+                foia_files = comm.attach_files(files, source="Agency")
+        eq_(comm.files.count(), 50)
+        eq_(foia_files[7].title, "doc7")
+        eq_(foia_files[7].ffile.read(), "Contents 7")
+        mock_upload.assert_called_once_with([f.pk for f in foia_files])
+
     @raises(ValueError)
     def test_orphan_error(self):
         """Orphans should raise an error"""
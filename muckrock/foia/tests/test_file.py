@@ -4,16 +4,27 @@ Files should be added to communications
 
 # Django
 from django.http import Http404
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
+
+# Standard Library
+from datetime import timedelta
 
 # Third Party
+from documentcloud.exceptions import DocumentCloudError
+from mock import Mock, patch
 from nose.tools import eq_, ok_, raises
 
 # MuckRock
 from muckrock.core.factories import UserFactory
 from muckrock.core.test_utils import http_get_response
 from muckrock.foia.factories import FOIAFileFactory
+from muckrock.foia.tasks import (
+    poll_document_cloud,
+    retry_stuck_documents,
+    upload_document_cloud_batch,
+)
 from muckrock.foia.views import FOIAFileListView
 
 
@@ -49,3 +60,143 @@ class TestRequestFilesView(TestCase):
         user = UserFactory()
         ok_(not self.foia.has_perm(user, "view"))
         http_get_response(self.url, self.view, user, **self.kwargs)
+
+
+class TestPollDocumentCloud(TestCase):
+    """Pending documents should be checked on in batches"""
+
+    @patch("muckrock.foia.tasks.upload_document_cloud_batch.delay")
+    @patch("muckrock.foia.tasks.get_documentcloud_client")
+    def test_poll(self, mock_client, mock_upload):
+        """Processed documents get their pages and stale documents are reuploaded"""
+        now = timezone.now()
+        done = FOIAFileFactory(doc_id="1-done", doccloud_pending_since=now)
+        stuck = FOIAFileFactory(
+            doc_id="2-stuck", doccloud_pending_since=now - timedelta(days=2)
+        )
+        pending = FOIAFileFactory(doc_id="3-pending", doccloud_pending_since=now)
+        mock_client().documents.list.return_value = [
+            Mock(id=1, status="success", page_count=5),
+            Mock(id=2, status="pending"),
+            Mock(id=3, status="pending"),
+        ]
+        poll_document_cloud()
+
+        done.refresh_from_db()
+        eq_(done.pages, 5)
+        eq_(done.doccloud_pending_since, None)
+        stuck.refresh_from_db()
+        eq_(stuck.doc_id, "")
+        eq_(stuck.doccloud_pending_since, None)
+        ok_(stuck.doccloud_attempted_at)
+        mock_client().documents.delete.assert_called_once_with(2)
+        mock_upload.assert_called_once_with([stuck.pk])
+        pending.refresh_from_db()
+        eq_(pending.doc_id, "3-pending")
+        ok_(pending.doccloud_pending_since)
+        ok_(pending.doccloud_polled_at)
+
+    @override_settings(DOCCLOUD_POLL_LIMIT=1)
+    @patch("muckrock.foia.tasks.get_documentcloud_client")
+    def test_poll_round_robin(self, mock_client):
+        """The documents checked on least recently are checked first"""
+        now = timezone.now()
+        first = FOIAFileFactory(
+            doc_id="1-first", doccloud_pending_since=now - timedelta(hours=1)
+        )
+        second = FOIAFileFactory(doc_id="2-second", doccloud_pending_since=now)
+        mock_client().documents.list.return_value = []
+        poll_document_cloud()
+        poll_document_cloud()
+        eq_(
+            [call[1]["id__in"] for call in mock_client().documents.list.call_args_list],
+            ["1", "2"],
+        )
+        first.refresh_from_db()
+        second.refresh_from_db()
+        ok_(first.doccloud_polled_at)
+        ok_(second.doccloud_polled_at)
+
+    @override_settings(DOCCLOUD_REPROCESS_BACKOFF=60)
+    @patch("muckrock.foia.tasks.get_documentcloud_client")
+    def test_poll_reprocess(self, mock_client):
+        """Documents which errored are reprocessed with a backoff"""
+        ffile = FOIAFileFactory(doc_id="1-error", doccloud_pending_since=timezone.now())
+        document = Mock(id=1, status="error")
+        mock_client().documents.list.return_value = [document]
+        poll_document_cloud()
+        eq_(document.process.call_count, 1)
+        # not again until the backoff has passed
+        poll_document_cloud()
+        eq_(document.process.call_count, 1)
+        ffile.refresh_from_db()
+        eq_(ffile.doccloud_reprocess_attempts, 1)
+
+
+class TestRetryStuckDocuments(TestCase):
+    """Stuck documents should be retried gradually, newest first"""
+
+    @override_settings(DOCCLOUD_RETRY_CHUNK_SIZE=2)
+    @patch("muckrock.foia.tasks.upload_document_cloud_batch.delay")
+    @patch("muckrock.foia.tasks.TokenBucket.take", side_effect=lambda count: count)
+    def test_retry(self, mock_take, mock_upload):
+        """Files are retried in chunks, and only a limited number of times"""
+        old = timezone.now() - timedelta(days=1)
+        files = [
+            FOIAFileFactory(ffile__filename="doc.pdf", datetime=old) for _ in range(3)
+        ]
+        FOIAFileFactory(ffile__filename="doc.pdf", datetime=old, doccloud_attempts=5)
+        FOIAFileFactory(ffile__filename="doc.pdf", datetime=old, doc_id="1-uploaded")
+        # still being uploaded for the first time
+        FOIAFileFactory(ffile__filename="doc.pdf")
+        FOIAFileFactory(
+            ffile__filename="doc.pdf",
+            datetime=old,
+            doccloud_attempted_at=timezone.now(),
+        )
+        retry_stuck_documents()
+        eq_(mock_take.call_count, 2)
+        eq_(
+            [call[0][0] for call in mock_upload.call_args_list],
+            [[files[2].pk, files[1].pk], [files[0].pk]],
+        )
+        eq_(mock_upload.call_args[1], {"retry": False})
+        files[0].refresh_from_db()
+        eq_(files[0].doccloud_attempts, 1)
+        ok_(files[0].doccloud_attempted_at)
+
+        # they are not retried again right away
+        mock_upload.reset_mock()
+        retry_stuck_documents()
+        ok_(not mock_upload.called)
+
+    @patch("muckrock.foia.tasks.upload_document_cloud_batch.delay")
+    @patch("muckrock.foia.tasks.TokenBucket.take", return_value=1)
+    def test_rate_limit(self, mock_take, mock_upload):
+        """Only as many files as the rate limit allows are retried"""
+        old = timezone.now() - timedelta(days=1)
+        files = [
+            FOIAFileFactory(ffile__filename="doc.pdf", datetime=old) for _ in range(3)
+        ]
+        retry_stuck_documents()
+        mock_take.assert_called_once_with(3)
+        mock_upload.assert_called_once_with([files[2].pk], retry=False)
+
+    @patch("muckrock.foia.tasks.upload_document_cloud.delay")
+    @patch("muckrock.foia.tasks.get_documentcloud_client")
+    @patch(
+        "muckrock.foia.tasks._upload_documentcloud",
+        side_effect=DocumentCloudError("Failed"),
+    )
+    def test_batch_failure(self, mock_upload, mock_client, mock_retry):
+        """Files retried by the rate limited task are not retried individually"""
+        # pylint: disable=unused-argument
+        ffile = FOIAFileFactory(ffile__filename="doc.pdf")
+        upload_document_cloud_batch([ffile.pk], retry=False)
+        mock_upload.assert_called_once()
+        ok_(not mock_retry.called)
+        ffile.refresh_from_db()
+        ok_(ffile.doccloud_attempted_at)
+
+        upload_document_cloud_batch([ffile.pk])
+        mock_retry.assert_called_once_with(ffile.pk)
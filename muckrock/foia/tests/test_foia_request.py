@@ -33,6 +33,7 @@ from muckrock.foia.factories import (
     FOIATemplateFactory,
 )
 from muckrock.foia.models import FOIACommunication, FOIARequest, RawEmail
+from muckrock.foia.tasks import followup_request_chunk
 from muckrock.task.models import PaymentInfoTask, SnailMailTask
 
 
@@ -181,6 +182,30 @@ class TestFOIARequestUnit(RunCommitHooksMixin, TestCase):
         foia = FOIARequestFactory(date_estimate=date.today() + timedelta(num_days))
         nose.tools.eq_(foia._followup_days(), num_days)
 
+    def test_followup_request_chunk(self):
+        """Follow ups are only sent to requests which still need them"""
+        due = FOIARequestFactory(
+            composer__datetime_submitted=timezone.now(),
+            status="processed",
+            date_followup=date.today() - timedelta(1),
+        )
+        not_due = FOIARequestFactory(
+            composer__datetime_submitted=timezone.now(),
+            status="processed",
+            date_followup=date.today() + timedelta(1),
+        )
+        FOIACommunicationFactory(foia=due, response=True)
+        FOIACommunicationFactory(foia=not_due, response=True)
+        comms = due.communications.count(), not_due.communications.count()
+
+        # the due request is listed twice, as if its chunk were dispatched twice
+        followup_request_chunk([due.pk, not_due.pk, due.pk], "followup_test")
+        self.run_commit_hooks()
+        due.refresh_from_db()
+        eq_(due.communications.count(), comms[0] + 1)
+        eq_(not_due.communications.count(), comms[1])
+        ok_(due.date_followup > date.today())
+
     def test_manager_get_done(self):
         """Test the FOIA Manager's get_done method"""
 
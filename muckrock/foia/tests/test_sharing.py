@@ -6,11 +6,13 @@ Tests sharing a FOIA request with other users
 from django.test import TestCase
 
 # Third Party
-from nose.tools import assert_false, assert_true, ok_
+from mock import patch
+from nose.tools import assert_false, assert_true, eq_, ok_
 
 # MuckRock
 from muckrock.core.factories import UserFactory
 from muckrock.foia.factories import FOIARequestFactory
+from muckrock.foia.models import FOIAAccess, FOIARequest
 from muckrock.organization.factories import MembershipFactory, OrganizationFactory
 
 
@@ -129,3 +131,97 @@ class TestRequestSharing(TestCase):
         assert_true(self.foia.has_perm(user, "view"))
         # non-org member still cannot view it
         assert_false(self.foia.has_perm(self.editor, "view"))
+
+    def test_viewable_access_grants(self):
+        """Granting and revoking access is reflected in the viewable requests"""
+        embargoed_foia = FOIARequestFactory(embargo=True)
+        viewer = UserFactory()
+        assert_false(
+            FOIARequest.objects.get_viewable(viewer)
+            .filter(pk=embargoed_foia.pk)
+            .exists()
+        )
+        embargoed_foia.add_viewer(viewer)
+        assert_true(
+            FOIARequest.objects.get_viewable(viewer)
+            .filter(pk=embargoed_foia.pk)
+            .exists()
+        )
+        embargoed_foia.promote_viewer(viewer)
+        assert_true(
+            FOIARequest.objects.get_viewable(viewer)
+            .filter(pk=embargoed_foia.pk)
+            .exists()
+        )
+        embargoed_foia.remove_editor(viewer)
+        assert_false(
+            FOIARequest.objects.get_viewable(viewer)
+            .filter(pk=embargoed_foia.pk)
+            .exists()
+        )
+
+    def test_viewable_proxy(self):
+        """Proxies may view the embargoed requests filed on their behalf"""
+        proxy = UserFactory()
+        embargoed_foia = FOIARequestFactory(embargo=True)
+        assert_false(
+            FOIARequest.objects.get_viewable(proxy)
+            .filter(pk=embargoed_foia.pk)
+            .exists()
+        )
+        embargoed_foia.proxy = proxy
+        embargoed_foia.save()
+        assert_true(
+            FOIARequest.objects.get_viewable(proxy)
+            .filter(pk=embargoed_foia.pk)
+            .exists()
+        )
+
+    def test_save_access_changes(self):
+        """Saving a request only syncs its grants when its owner, proxy or
+        agency change"""
+        with patch.object(FOIAAccess.objects, "sync") as mock_sync:
+            self.foia.title = "New Title"
+            self.foia.save()
+            ok_(not mock_sync.called)
+            self.foia.proxy = UserFactory()
+            self.foia.save()
+            mock_sync.assert_called_once_with([self.foia.pk])
+
+    def test_saved_request_per_save(self):
+        """Each save is compared to the request as saved before it"""
+        self.foia.proxy = UserFactory()
+        self.foia.save()
+        ok_(not hasattr(self.foia, "_saved_request"))
+        with patch.object(FOIAAccess.objects, "sync") as mock_sync:
+            self.foia.save()
+            ok_(not mock_sync.called)
+
+    def test_with_permissions(self):
+        """Precomputed permissions should match and not require extra queries"""
+        embargoed_foia = FOIARequestFactory(embargo=True, status="done")
+        editor = UserFactory()
+        embargoed_foia.add_editor(editor)
+        perms = ["view", "change", "thank", "appeal", "pay", "embargo"]
+        for user in [editor, self.editor, embargoed_foia.user]:
+            expected = [embargoed_foia.has_perm(user, perm) for perm in perms]
+            foia = (
+                FOIARequest.objects.filter(pk=embargoed_foia.pk)
+                .select_related(
+                    "agency__jurisdiction", "composer__user__profile", "crowdfund"
+                )
+                .with_permissions(user)
+                .get()
+            )
+            with self.assertNumQueries(0):
+                eq_([foia.has_perm(user, perm) for perm in perms], expected)
+
+    def test_memoized_permissions(self):
+        """Repeated permission checks should not repeat their queries"""
+        user = UserFactory()
+        assert_false(self.foia.has_perm(user, "change"))
+        with self.assertNumQueries(0):
+            assert_false(self.foia.has_perm(user, "change"))
+            assert_false(self.foia.has_perm(user, "zip_download"))
+        self.foia.add_editor(user)
+        assert_true(self.foia.has_perm(user, "change"))
@@ -23,7 +23,11 @@ from furl import furl
 # MuckRock
 from muckrock.agency.models import Agency
 from muckrock.core.forms import TagManagerForm
-from muckrock.core.views import MRListView, MRSearchFilterListView, class_view_decorator
+from muckrock.core.views import (
+    MRListView,
+    MRSearchFilterCursorListView,
+    class_view_decorator,
+)
 from muckrock.crowdsource.forms import CrowdsourceChoiceForm
 from muckrock.crowdsource.tasks import datum_per_page
 from muckrock.foia.filters import (
@@ -124,7 +128,7 @@ class RequestExploreView(TemplateView):
         return context
 
 
-class RequestList(MRSearchFilterListView):
+class RequestList(MRSearchFilterCursorListView):
     """Base list view for other list views to inherit from"""
 
     model = FOIARequest
@@ -133,6 +137,7 @@ class RequestList(MRSearchFilterListView):
     template_name = "foia/list.html"
     default_sort = "datetime_updated"
     default_order = "desc"
+    cursor_count = True
     sort_map = {
         "title": "title",
         "user": "composer__user__profile__full_name",
@@ -219,7 +224,13 @@ class RequestList(MRSearchFilterListView):
             return self._save_search(request)
 
         try:
-            foias = FOIARequest.objects.filter(pk__in=request.POST.getlist("foias"))
+            foias = (
+                FOIARequest.objects.filter(pk__in=request.POST.getlist("foias"))
+                .select_related(
+                    "agency__jurisdiction", "composer__user__profile", "crowdfund"
+                )
+                .with_permissions(request.user)
+            )
             msg = actions[request.POST["action"]](foias, request.user, request.POST)
             if msg:
                 messages.success(request, msg)
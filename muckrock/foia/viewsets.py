@@ -25,6 +25,7 @@ from rest_framework.response import Response
 
 # MuckRock
 from muckrock.agency.models import Agency
+from muckrock.core.pagination import OptionalKeysetPagination
 from muckrock.foia.exceptions import InsufficientRequestsError
 from muckrock.foia.models import FOIACommunication, FOIAComposer, FOIARequest
 from muckrock.foia.serializers import (
@@ -52,6 +53,7 @@ class FOIARequestViewSet(viewsets.ModelViewSet):
     """
 
     serializer_class = FOIARequestSerializer
+    pagination_class = OptionalKeysetPagination
     permission_classes = (FOIAPermissions,)
     # remove default ordering backend as it does not work well with fields stored
     # on related models
@@ -105,7 +107,8 @@ class FOIARequestViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return (
             FOIARequest.objects.get_viewable(self.request.user)
-            .select_related("composer__user", "agency__jurisdiction")
+            .select_related("composer__user__profile", "agency__jurisdiction")
+            .with_permissions(self.request.user)
             .prefetch_related(
                 "communications__files",
                 "communications__emails",
@@ -369,6 +372,7 @@ class FOIACommunicationViewSet(viewsets.ModelViewSet):
     """API views for FOIACommunication"""
 
     serializer_class = FOIACommunicationSerializer
+    pagination_class = OptionalKeysetPagination
     permission_classes = (DjangoModelPermissions,)
 
     class Filter(django_filters.FilterSet):
@@ -17,5 +17,8 @@ class JurisdictionConfig(AppConfig):
         # Third Party
         from watson import search
 
+        # MuckRock
+        import muckrock.jurisdiction.signals  # pylint: disable=unused-import
+
         Exemption = self.get_model("Exemption")
         search.register(Exemption)
@@ -0,0 +1,31 @@
+# Django
+from django.core.management.base import BaseCommand
+
+# Standard Library
+import csv
+
+# MuckRock
+from muckrock.jurisdiction.models import DueDateChange, Jurisdiction
+
+
+class Command(BaseCommand):
+    """Recompute due dates for open requests after a law or holiday change"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("jurisdiction_ids", nargs="+", type=int)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report the changes as CSV without saving them",
+        )
+
+    def handle(self, *args, **kwargs):
+        writer = csv.writer(self.stdout)
+        writer.writerow(["jurisdiction id", *DueDateChange._fields])
+        for jurisdiction in Jurisdiction.objects.filter(
+            pk__in=kwargs["jurisdiction_ids"]
+        ).select_related("law"):
+            changes = jurisdiction.update_due_dates(dry_run=kwargs["dry_run"])
+            for change in changes:
+                writer.writerow([jurisdiction.pk, *change])
+            self.stderr.write(f"{jurisdiction}: {len(changes)} requests changed")
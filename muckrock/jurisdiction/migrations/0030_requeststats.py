@@ -0,0 +1,86 @@
+# Generated by Django 4.2 on 2026-10-17 11:40
+
+import datetime
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("agency", "0032_agency_use_portal_appeal"),
+        ("jurisdiction", "0029_auto_20230117_1623"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RequestStats",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("requests", models.PositiveIntegerField(default=0)),
+                (
+                    "completed",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="Completed or partially completed requests",
+                    ),
+                ),
+                ("overdue", models.PositiveIntegerField(default=0)),
+                (
+                    "fees",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Requests which have a fee"
+                    ),
+                ),
+                (
+                    "fee_total",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=16),
+                ),
+                (
+                    "responses",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Requests with a response time"
+                    ),
+                ),
+                (
+                    "response_time",
+                    models.DurationField(
+                        default=datetime.timedelta, help_text="The total response time"
+                    ),
+                ),
+                ("pages", models.PositiveIntegerField(default=0)),
+                ("status_counts", models.JSONField(default=dict)),
+                ("datetime_updated", models.DateTimeField(auto_now=True)),
+                (
+                    "agency",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="request_stats",
+                        to="agency.agency",
+                    ),
+                ),
+                (
+                    "jurisdiction",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="request_stats",
+                        to="jurisdiction.jurisdiction",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "request stats",
+            },
+        ),
+    ]
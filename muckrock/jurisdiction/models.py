@@ -2,13 +2,19 @@
 Models for the Jurisdiction application
 """
 # Django
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.db import models
-from django.db.models import Avg, Count, F, Q, Sum
-from django.db.models.expressions import Value
-from django.db.models.functions import Coalesce
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
 from django.template.defaultfilters import slugify
 from django.urls import reverse
+from django.utils import timezone
+
+# Standard Library
+import time
+from collections import namedtuple
+from datetime import date, timedelta
+from decimal import Decimal
 
 # Third Party
 from easy_thumbnails.fields import ThumbnailerImageField
@@ -17,56 +23,101 @@ from taggit.managers import TaggableManager
 
 # MuckRock
 from muckrock.business_days.models import Calendar, Holiday, HolidayCalendar
-from muckrock.core.models import ExtractDay
-from muckrock.foia.models import END_STATUS, FOIARequest
+from muckrock.foia.models import END_STATUS, FOIAFile, FOIARequest
+from muckrock.foia.models.request import STATUS
 from muckrock.tags.models import TaggedItemBase
 
+# Calendars for each legal jurisdiction, shared for the whole process
+# legal jurisdiction pk -> (expiration time, calendar)
+# This is cleared by the signal handlers in `jurisdiction.signals`
+_calendars = {}
+
+
+def clear_calendar_cache(jurisdiction_pk=None):
+    """Clear the cached calendar for a legal jurisdiction, or all of them"""
+    if jurisdiction_pk is None:
+        _calendars.clear()
+    else:
+        _calendars.pop(jurisdiction_pk, None)
+
+
+# the holiday fields a calendar's holidays are identified by
+HOLIDAY_FIELDS = ("kind", "name", "month", "day", "weekday", "num")
+
+
+def calendar_from_rules(rules):
+    """Build a calendar from a snapshot of a jurisdiction's due date rules,
+    see `Jurisdiction.get_due_date_rules`"""
+    if not rules["business"]:
+        return Calendar()
+    return HolidayCalendar(
+        [
+            Holiday(**dict(zip(HOLIDAY_FIELDS, holiday)))
+            for holiday in rules["holidays"]
+        ],
+        rules["observe_sat"],
+    )
+
+
+DueDateChange = namedtuple(
+    "DueDateChange",
+    [
+        "foia_id",
+        "old_date_due",
+        "new_date_due",
+        "old_date_followup",
+        "new_date_followup",
+    ],
+)
+
 
 class RequestHelper:
-    """Helper methods for classes that have a get_requests() method"""
+    """Helper methods for classes that have a get_requests() method
+
+    The statistics are read from the request statistics roll up, see
+    `RequestStats`
+    """
+
+    def get_request_stats(self):
+        """Get the rolled up request statistics, computing them if missing"""
+        # this is an attribute error, not a does not exist error, on
+        # jurisdictions due to their custom `__getattr__`
+        stats = getattr(self, "request_stats", None)
+        if stats is None:
+            stats = RequestStats.objects.refresh(self)
+        return stats
 
     def average_response_time(self):
         """Get the average response time from a submitted to completed request"""
-        requests = self.get_requests()
-        avg = requests.aggregate(
-            avg=Coalesce(
-                ExtractDay(Avg(F("datetime_done") - F("composer__datetime_submitted"))),
-                Value(0),
-            )
-        )["avg"]
-        return avg
+        stats = self.get_request_stats()
+        if not stats.responses:
+            return 0
+        return (stats.response_time / stats.responses).days
 
     def average_fee(self):
         """Get the average fees required on requests that have a price."""
-        requests = self.get_requests()
-        avg = requests.filter(price__gt=0).aggregate(price=Avg("price"))["price"]
-        return avg if avg else 0
+        stats = self.get_request_stats()
+        return stats.fee_total / stats.fees if stats.fees else 0
 
     def fee_rate(self):
         """Get the percentage of requests that have a fee."""
-        requests = self.get_requests()
-        filed = float(requests.count())
-        fee = float(requests.filter(price__gt=0).count())
+        stats = self.get_request_stats()
         rate = 0
-        if filed > 0:
-            rate = fee / filed * 100
+        if stats.requests > 0:
+            rate = float(stats.fees) / stats.requests * 100
         return rate
 
     def success_rate(self):
         """Get the percentage of requests that are successful."""
-        requests = self.get_requests()
-        filed = float(requests.count())
-        completed = float(requests.get_done().count())
+        stats = self.get_request_stats()
         rate = 0
-        if filed > 0:
-            rate = completed / filed * 100
+        if stats.requests > 0:
+            rate = float(stats.completed) / stats.requests * 100
         return rate
 
     def total_pages(self):
         """Total pages released"""
-        requests = self.get_requests()
-        pages = requests.aggregate(pages=Sum("communications__files__pages"))["pages"]
-        return pages if pages else 0
+        return self.get_request_stats().pages
 
 
 class Jurisdiction(models.Model, RequestHelper):
@@ -191,10 +242,139 @@ class Jurisdiction(models.Model, RequestHelper):
 
     def get_calendar(self):
         """Get a calendar of business days for the jurisdiction"""
-        if self.legal.law.use_business_days:
-            return HolidayCalendar(self.legal.holidays.all(), self.legal.observe_sat)
+        # use the parent's id directly so a cached calendar needs no queries
+        legal_pk = self.parent_id if self.level == "l" else self.pk
+        expires, calendar = _calendars.get(legal_pk, (0, None))
+        if expires > time.monotonic():
+            return calendar
+
+        legal = self.legal
+        if legal.law.use_business_days:
+            calendar = HolidayCalendar(list(legal.holidays.all()), legal.observe_sat)
         else:
-            return Calendar()
+            calendar = Calendar()
+        _calendars[legal_pk] = (
+            time.monotonic() + settings.CALENDAR_CACHE_TIMEOUT,
+            calendar,
+        )
+        return calendar
+
+    def get_due_date_rules(self):
+        """A snapshot of the rules due dates are computed with
+
+        This is read from the database, so it may be taken before a change to
+        the law or holidays is saved, and compared against afterwards
+        """
+        legal_pk = self.parent_id if self.level == "l" else self.pk
+        law = (
+            Law.objects.filter(jurisdiction_id=legal_pk)
+            .values_list("days", "use_business_days")
+            .first()
+        )
+        days, business = law if law else (None, False)
+        return {
+            "days": days,
+            "business": business,
+            "observe_sat": self.legal.observe_sat,
+            "holidays": [
+                list(holiday)
+                for holiday in Holiday.objects.filter(
+                    jurisdiction=legal_pk
+                ).values_list(*HOLIDAY_FIELDS)
+            ],
+        }
+
+    def update_due_dates(self, old_rules=None, dry_run=False, batch_size=1000):
+        """Recompute the due and follow up dates of open requests after the
+        law or holidays change
+
+        Requests awaiting a response whose due date is the one their
+        submission date got under `old_rules` are given the due date it gets
+        under the current rules.  Other requests, such as those which were
+        paused for a fix or payment and resumed, or whose due date was set by
+        hand, are left alone.  If `old_rules` is not given, every open request
+        is given the due date from its submission date.
+
+        Follow up dates which were waiting on the old due date are moved along
+        with it, but never into the past.  Rows are written with
+        `bulk_update`, so no signals or revisions are triggered.
+
+        Returns a list of the changes, which are not saved if `dry_run` is set
+        """
+        legal = self.legal
+        days = legal.law.days if legal.law else None
+        if not days:
+            return []
+        calendar = legal.get_calendar()
+        if old_rules is not None:
+            if not old_rules["days"]:
+                # due dates were not computed from the submission date
+                return []
+            old_calendar = calendar_from_rules(old_rules)
+        today = date.today()
+
+        requests = (
+            legal.get_requests()
+            .filter(
+                status__in=["ack", "processed"],
+                date_due__isnull=False,
+                composer__datetime_submitted__isnull=False,
+            )
+            .order_by("pk")
+            .values_list(
+                "pk", "date_due", "date_followup", "composer__datetime_submitted"
+            )
+        )
+        changes = []
+        last_pk = 0
+        while True:
+            batch = list(requests.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                return changes
+            last_pk = batch[-1][0]
+            submitted_dates = [
+                timezone.localtime(submitted).date() for _, _, _, submitted in batch
+            ]
+            dates_due = calendar.business_days_from_many(
+                (submitted, days) for submitted in submitted_dates
+            )
+            if old_rules is not None:
+                old_dates_due = old_calendar.business_days_from_many(
+                    (submitted, old_rules["days"]) for submitted in submitted_dates
+                )
+            else:
+                old_dates_due = [old_due for _, old_due, _, _ in batch]
+            batch_changes = []
+            for (pk, old_due, old_followup, _), new_due, expected_due in zip(
+                batch, dates_due, old_dates_due
+            ):
+                if old_due != expected_due:
+                    continue
+                new_followup = old_followup
+                if (
+                    old_followup
+                    and (old_followup == old_due or old_followup < new_due)
+                    and new_due >= today
+                ):
+                    new_followup = new_due
+                if (old_due, old_followup) != (new_due, new_followup):
+                    batch_changes.append(
+                        DueDateChange(pk, old_due, new_due, old_followup, new_followup)
+                    )
+            changes.extend(batch_changes)
+            if not dry_run and batch_changes:
+                with transaction.atomic():
+                    FOIARequest.objects.bulk_update(
+                        [
+                            FOIARequest(
+                                pk=change.foia_id,
+                                date_due=change.new_date_due,
+                                date_followup=change.new_date_followup,
+                            )
+                            for change in batch_changes
+                        ],
+                        ["date_due", "date_followup"],
+                    )
 
     def get_proxy(self):
         """Get the proxy user for this jurisdiction"""
@@ -237,6 +417,203 @@ class Jurisdiction(models.Model, RequestHelper):
         unique_together = ("slug", "parent")
 
 
+# requests in these statuses are overdue once their due date has passed
+OVERDUE_STATUSES = ("ack", "processed")
+
+
+def request_stats_aggregates():
+    """The aggregates to compute the request statistics over requests"""
+    return {
+        "requests": Count("pk"),
+        "completed": Count(
+            "pk",
+            filter=Q(status__in=["partial", "done"], datetime_done__isnull=False),
+        ),
+        "overdue": Count(
+            "pk",
+            filter=Q(status__in=OVERDUE_STATUSES, date_due__lt=date.today()),
+        ),
+        "fees": Count("pk", filter=Q(price__gt=0)),
+        "fee_total": Sum("price", filter=Q(price__gt=0), default=Decimal(0)),
+        "responses": Count(
+            "pk",
+            filter=Q(
+                datetime_done__isnull=False, composer__datetime_submitted__isnull=False
+            ),
+        ),
+        "response_time": Sum(
+            F("datetime_done") - F("composer__datetime_submitted"),
+            default=timedelta(0),
+        ),
+        **{
+            f"status_{status}": Count("pk", filter=Q(status=status))
+            for status, _ in STATUS
+        },
+    }
+
+
+def _request_stats_fields(row, pages):
+    """Convert the aggregates for a set of requests to request stats fields"""
+    row["status_counts"] = {
+        status: row.pop(f"status_{status}")
+        for status, _ in STATUS
+        if row.get(f"status_{status}")
+    }
+    row["pages"] = pages or 0
+    return row
+
+
+def _add_request_stats_fields(total, fields):
+    """Add a set of request stats fields into a running total"""
+    for key, value in fields.items():
+        if key == "status_counts":
+            for status, count in value.items():
+                total[key][status] = total[key].get(status, 0) + count
+        elif key in total:
+            total[key] += value
+        else:
+            total[key] = value
+
+
+class RequestStatsQuerySet(models.QuerySet):
+    """Object manager for request statistics"""
+
+    def compute(self, requests):
+        """Compute the request statistics fields for a set of requests
+
+        This is a single aggregate query, with the pages summed per request in
+        a subquery so that joining the files does not duplicate requests
+        """
+        pages = (
+            FOIAFile.objects.filter(comm__foia=OuterRef("pk"))
+            .order_by()
+            .values("comm__foia")
+            .annotate(pages=Sum("pages"))
+            .values("pages")
+        )
+        row = requests.order_by().aggregate(
+            **request_stats_aggregates(), pages=Sum(Subquery(pages))
+        )
+        return _request_stats_fields(row, row.pop("pages"))
+
+    def refresh(self, obj):
+        """Recompute and store the statistics for an agency or jurisdiction"""
+        key = "jurisdiction" if isinstance(obj, Jurisdiction) else "agency"
+        stats, _ = self.update_or_create(
+            **{key: obj}, defaults=self.compute(obj.get_requests())
+        )
+        obj.request_stats = stats
+        return stats
+
+    def rebuild(self):
+        """Rebuild the statistics for every agency and jurisdiction
+
+        The requests are aggregated once per agency, and the agencies are summed
+        for their jurisdictions, and for the states above local jurisdictions.
+        Agencies and jurisdictions without requests get empty statistics.
+        """
+        agency_model = self.model._meta.get_field("agency").related_model
+        pages = dict(
+            FOIAFile.objects.exclude(comm__foia__agency=None)
+            .order_by()
+            .values_list("comm__foia__agency_id")
+            .annotate(Sum("pages"))
+        )
+        agency_stats = {}
+        for row in (
+            FOIARequest.objects.exclude(agency=None)
+            .order_by()
+            .values("agency_id")
+            .annotate(**request_stats_aggregates())
+        ):
+            agency_id = row.pop("agency_id")
+            agency_stats[agency_id] = _request_stats_fields(row, pages.get(agency_id))
+
+        # every agency and jurisdiction gets a row, even without any requests,
+        # so that showing their statistics never needs to compute them
+        jurisdiction_stats = {
+            pk: {"status_counts": {}}
+            for pk in Jurisdiction.objects.values_list("pk", flat=True).iterator()
+        }
+        for agency_id, jurisdiction_id, level, parent_id in (
+            agency_model.objects.values_list(
+                "pk",
+                "jurisdiction_id",
+                "jurisdiction__level",
+                "jurisdiction__parent_id",
+            )
+            .order_by()
+            .iterator()
+        ):
+            fields = agency_stats.setdefault(agency_id, {"status_counts": {}})
+            _add_request_stats_fields(jurisdiction_stats[jurisdiction_id], fields)
+            if level == "l" and parent_id is not None:
+                _add_request_stats_fields(jurisdiction_stats[parent_id], fields)
+
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create(
+                [
+                    self.model(agency_id=agency_id, **fields)
+                    for agency_id, fields in agency_stats.items()
+                ]
+                + [
+                    self.model(jurisdiction_id=jurisdiction_id, **fields)
+                    for jurisdiction_id, fields in jurisdiction_stats.items()
+                ],
+                batch_size=1000,
+            )
+
+
+class RequestStats(models.Model):
+    """Statistics on the requests filed with an agency or jurisdiction
+
+    These are kept up to date by the signal handlers and tasks in the
+    jurisdiction application, so that the statistics do not need to be
+    aggregated over all of the requests every time they are shown.  A state's
+    statistics include the requests filed in its local jurisdictions.
+    """
+
+    agency = models.OneToOneField(
+        "agency.Agency",
+        on_delete=models.CASCADE,
+        related_name="request_stats",
+        blank=True,
+        null=True,
+    )
+    jurisdiction = models.OneToOneField(
+        Jurisdiction,
+        on_delete=models.CASCADE,
+        related_name="request_stats",
+        blank=True,
+        null=True,
+    )
+    requests = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(
+        default=0, help_text="Completed or partially completed requests"
+    )
+    overdue = models.PositiveIntegerField(default=0)
+    fees = models.PositiveIntegerField(default=0, help_text="Requests which have a fee")
+    fee_total = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    responses = models.PositiveIntegerField(
+        default=0, help_text="Requests with a response time"
+    )
+    response_time = models.DurationField(
+        default=timedelta, help_text="The total response time"
+    )
+    pages = models.PositiveIntegerField(default=0)
+    status_counts = models.JSONField(default=dict)
+    datetime_updated = models.DateTimeField(auto_now=True)
+
+    objects = RequestStatsQuerySet.as_manager()
+
+    def __str__(self):
+        return "Request Statistics: %s" % (self.agency or self.jurisdiction)
+
+    class Meta:
+        verbose_name_plural = "request stats"
+
+
 class Law(models.Model):
     """A law that allows for requests for public records from a jurisdiction."""
 
@@ -0,0 +1,318 @@
+"""Model signal handlers for the Jurisdiction application"""
+
+# Django
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+
+# MuckRock
+from muckrock.business_days.models import Holiday
+from muckrock.foia.models import FOIAFile, FOIARequest
+from muckrock.foia.signals import get_saved_request
+from muckrock.jurisdiction.models import Jurisdiction, Law, clear_calendar_cache
+from muckrock.jurisdiction.tasks import refresh_request_stats, update_due_dates
+
+# how long to wait to refresh request statistics after a request changes, so
+# that a burst of changes to an agency's requests only refreshes them once
+REQUEST_STATS_DELAY = 60
+
+# the request fields the request statistics are computed from
+REQUEST_STATS_FIELDS = (
+    "agency_id",
+    "status",
+    "date_due",
+    "datetime_done",
+    "price",
+    "composer_id",
+)
+
+
+def get_due_date_rules(jurisdiction_pks):
+    """Snapshot the due date rules of the jurisdictions before they change"""
+    return {
+        jurisdiction.pk: jurisdiction.get_due_date_rules()
+        for jurisdiction in Jurisdiction.objects.filter(
+            pk__in=list(jurisdiction_pks)
+        ).select_related("parent")
+    }
+
+
+def schedule_update_due_dates(old_rules):
+    """Recompute the due dates for the jurisdictions once the change is committed
+
+    `old_rules` maps each jurisdiction's pk to its due date rules from before
+    the change, so that only due dates computed under them are moved
+    """
+    for pk, rules in old_rules.items():
+        transaction.on_commit(
+            lambda pk=pk, rules=rules: update_due_dates.delay(pk, rules)
+        )
+
+
+def schedule_refresh_request_stats(agency_id):
+    """Refresh the agency's request statistics once the change is committed"""
+    if agency_id is None:
+        return
+    if caches["lock"].add(
+        f"refresh_request_stats:{agency_id}", 1, timeout=REQUEST_STATS_DELAY
+    ):
+        transaction.on_commit(
+            lambda: refresh_request_stats.apply_async(
+                args=[agency_id], countdown=REQUEST_STATS_DELAY
+            )
+        )
+
+
+def holiday_clear_calendars(sender, **kwargs):
+    """A holiday may be on any jurisdiction's calendar, so clear all of them"""
+    # pylint: disable=unused-argument
+    clear_calendar_cache()
+
+
+def holiday_check_due_dates(sender, instance, **kwargs):
+    """Note the rules of the jurisdictions observing a holiday before it changes"""
+    # pylint: disable=unused-argument, protected-access
+    if instance.pk is None:
+        instance._old_due_date_rules = {}
+    else:
+        instance._old_due_date_rules = get_due_date_rules(
+            instance.jurisdiction_set.values_list("pk", flat=True)
+        )
+
+
+def holiday_update_due_dates(sender, instance, **kwargs):
+    """Recompute due dates for the jurisdictions observing a changed holiday"""
+    # pylint: disable=unused-argument
+    schedule_update_due_dates(getattr(instance, "_old_due_date_rules", {}))
+
+
+def holiday_delete_due_dates(sender, instance, **kwargs):
+    """Recompute due dates for the jurisdictions observing a deleted holiday"""
+    # pylint: disable=unused-argument
+    schedule_update_due_dates(
+        get_due_date_rules(instance.jurisdiction_set.values_list("pk", flat=True))
+    )
+
+
+def jurisdiction_clear_calendar(sender, instance, **kwargs):
+    """Clear the calendar when the jurisdiction's Saturday observance changes"""
+    # pylint: disable=unused-argument
+    clear_calendar_cache(instance.pk)
+
+
+def law_check_due_dates(sender, instance, **kwargs):
+    """Note if the law's response time is changing"""
+    # pylint: disable=unused-argument, protected-access
+    old = (
+        Law.objects.filter(pk=instance.pk)
+        .values_list("days", "use_business_days")
+        .first()
+    )
+    if old is not None and old != (instance.days, instance.use_business_days):
+        instance._old_due_date_rules = get_due_date_rules([instance.jurisdiction_id])
+    else:
+        instance._old_due_date_rules = {}
+
+
+def law_clear_calendar(sender, instance, **kwargs):
+    """Clear the calendar when the law switches between business and calendar days"""
+    # pylint: disable=unused-argument
+    clear_calendar_cache(instance.jurisdiction_id)
+
+
+def law_update_due_dates(sender, instance, **kwargs):
+    """Recompute due dates when the law's response time changes"""
+    # pylint: disable=unused-argument
+    schedule_update_due_dates(getattr(instance, "_old_due_date_rules", {}))
+
+
+def holidays_clear_calendar(sender, instance, action, reverse, pk_set, **kwargs):
+    """Clear the calendar when holidays are added or removed from a jurisdiction"""
+    # pylint: disable=unused-argument
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        clear_calendar_cache()
+    else:
+        clear_calendar_cache(instance.pk)
+    # the rules from before the change, see `holidays_check_due_dates`
+    schedule_update_due_dates(getattr(instance, "_old_due_date_rules", {}))
+
+
+def foia_check_request_stats(sender, instance, **kwargs):
+    """Note the agency whose statistics a request's changes will affect"""
+    # pylint: disable=unused-argument, protected-access
+    saved = get_saved_request(instance)
+    old = (
+        None
+        if saved is None
+        else tuple(getattr(saved, field) for field in REQUEST_STATS_FIELDS)
+    )
+    new = tuple(getattr(instance, field) for field in REQUEST_STATS_FIELDS)
+    if old is None:
+        instance._request_stats_agencies = {instance.agency_id}
+    elif old != new:
+        # if the request moved, both agencies' statistics change
+        instance._request_stats_agencies = {old[0], instance.agency_id}
+    else:
+        instance._request_stats_agencies = set()
+
+
+def foia_refresh_request_stats(sender, instance, **kwargs):
+    """Refresh the statistics when a request's status, dates or price change"""
+    # pylint: disable=unused-argument, protected-access
+    agency_ids = getattr(instance, "_request_stats_agencies", {instance.agency_id})
+    for agency_id in agency_ids:
+        schedule_refresh_request_stats(agency_id)
+    instance._request_stats_agencies = set()
+
+
+def foia_delete_request_stats(sender, instance, **kwargs):
+    """Refresh the statistics when a request is deleted
+
+    Its agency is always affected, even if the noted agencies were already
+    refreshed by an earlier save of the same instance
+    """
+    # pylint: disable=unused-argument, protected-access
+    agency_ids = getattr(instance, "_request_stats_agencies", set())
+    for agency_id in agency_ids | {instance.agency_id}:
+        schedule_refresh_request_stats(agency_id)
+    instance._request_stats_agencies = set()
+
+
+def file_refresh_request_stats(sender, instance, **kwargs):
+    """Pages have been added to or removed from a request"""
+    # pylint: disable=unused-argument
+    if instance.comm_id is None:
+        return
+    agency_id = (
+        FOIARequest.objects.filter(communications=instance.comm_id)
+        .values_list("agency_id", flat=True)
+        .first()
+    )
+    schedule_refresh_request_stats(agency_id)
+
+
+def holidays_check_due_dates(sender, instance, action, reverse, pk_set, **kwargs):
+    """Note the rules of the jurisdictions whose holidays are about to change"""
+    # pylint: disable=unused-argument, protected-access
+    if action not in ("pre_add", "pre_remove", "pre_clear"):
+        return
+    if not reverse:
+        jurisdiction_pks = [instance.pk]
+    elif action == "pre_clear":
+        # the removed jurisdictions are no longer known after the clear
+        jurisdiction_pks = instance.jurisdiction_set.values_list("pk", flat=True)
+    else:
+        jurisdiction_pks = pk_set
+    instance._old_due_date_rules = get_due_date_rules(jurisdiction_pks)
+
+
+post_save.connect(
+    holiday_clear_calendars,
+    sender=Holiday,
+    dispatch_uid="muckrock.jurisdiction.signals.holiday_save_calendars",
+)
+
+post_delete.connect(
+    holiday_clear_calendars,
+    sender=Holiday,
+    dispatch_uid="muckrock.jurisdiction.signals.holiday_delete_calendars",
+)
+
+pre_save.connect(
+    holiday_check_due_dates,
+    sender=Holiday,
+    dispatch_uid="muckrock.jurisdiction.signals.holiday_check_due_dates",
+)
+
+post_save.connect(
+    holiday_update_due_dates,
+    sender=Holiday,
+    dispatch_uid="muckrock.jurisdiction.signals.holiday_save_due_dates",
+)
+
+# the jurisdictions must be found before the holiday is deleted
+pre_delete.connect(
+    holiday_delete_due_dates,
+    sender=Holiday,
+    dispatch_uid="muckrock.jurisdiction.signals.holiday_delete_due_dates",
+)
+
+post_save.connect(
+    jurisdiction_clear_calendar,
+    sender=Jurisdiction,
+    dispatch_uid="muckrock.jurisdiction.signals.jurisdiction_calendar",
+)
+
+pre_save.connect(
+    law_check_due_dates,
+    sender=Law,
+    dispatch_uid="muckrock.jurisdiction.signals.law_check_due_dates",
+)
+
+post_save.connect(
+    law_clear_calendar,
+    sender=Law,
+    dispatch_uid="muckrock.jurisdiction.signals.law_save_calendar",
+)
+
+post_save.connect(
+    law_update_due_dates,
+    sender=Law,
+    dispatch_uid="muckrock.jurisdiction.signals.law_update_due_dates",
+)
+
+post_delete.connect(
+    law_clear_calendar,
+    sender=Law,
+    dispatch_uid="muckrock.jurisdiction.signals.law_delete_calendar",
+)
+
+m2m_changed.connect(
+    holidays_clear_calendar,
+    sender=Jurisdiction.holidays.through,
+    dispatch_uid="muckrock.jurisdiction.signals.holidays_calendar",
+)
+
+m2m_changed.connect(
+    holidays_check_due_dates,
+    sender=Jurisdiction.holidays.through,
+    dispatch_uid="muckrock.jurisdiction.signals.holidays_check_due_dates",
+)
+
+pre_save.connect(
+    foia_check_request_stats,
+    sender=FOIARequest,
+    dispatch_uid="muckrock.jurisdiction.signals.foia_check_request_stats",
+)
+
+post_save.connect(
+    foia_refresh_request_stats,
+    sender=FOIARequest,
+    dispatch_uid="muckrock.jurisdiction.signals.foia_save_request_stats",
+)
+
+post_delete.connect(
+    foia_delete_request_stats,
+    sender=FOIARequest,
+    dispatch_uid="muckrock.jurisdiction.signals.foia_delete_request_stats",
+)
+
+post_save.connect(
+    file_refresh_request_stats,
+    sender=FOIAFile,
+    dispatch_uid="muckrock.jurisdiction.signals.file_save_request_stats",
+)
+
+post_delete.connect(
+    file_refresh_request_stats,
+    sender=FOIAFile,
+    dispatch_uid="muckrock.jurisdiction.signals.file_delete_request_stats",
+)
@@ -0,0 +1,88 @@
+"""Celery Tasks for the jurisdiction application"""
+
+# Django
+from celery.schedules import crontab
+from celery.task import periodic_task, task
+
+# Standard Library
+import logging
+from datetime import date, timedelta
+
+# MuckRock
+from muckrock.agency.models import Agency
+from muckrock.foia.models import FOIARequest
+from muckrock.jurisdiction.models import (
+    OVERDUE_STATUSES,
+    Jurisdiction,
+    RequestStats,
+    clear_calendar_cache,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@task(
+    ignore_result=True,
+    time_limit=30 * 60,
+    name="muckrock.jurisdiction.tasks.update_due_dates",
+)
+def update_due_dates(jurisdiction_pk, old_rules=None):
+    """Recompute due dates for a jurisdiction after its law or holidays change
+
+    `old_rules` are the jurisdiction's due date rules from before the change
+    """
+    jurisdiction = Jurisdiction.objects.select_related("law").get(pk=jurisdiction_pk)
+    # the change may have been made in another process
+    clear_calendar_cache(jurisdiction.legal.pk)
+    changes = jurisdiction.update_due_dates(old_rules)
+    logger.info("Updated due dates for %d requests in %s", len(changes), jurisdiction)
+
+
+@task(
+    ignore_result=True,
+    time_limit=10 * 60,
+    name="muckrock.jurisdiction.tasks.refresh_request_stats",
+)
+def refresh_request_stats(agency_pk):
+    """Refresh the request statistics for an agency and the jurisdictions above it"""
+    agency = Agency.objects.select_related("jurisdiction__parent").get(pk=agency_pk)
+    RequestStats.objects.refresh(agency)
+    RequestStats.objects.refresh(agency.jurisdiction)
+    if agency.jurisdiction.level == "l":
+        RequestStats.objects.refresh(agency.jurisdiction.parent)
+
+
+@periodic_task(
+    run_every=crontab(hour=0, minute=5),
+    name="muckrock.jurisdiction.tasks.refresh_overdue_request_stats",
+)
+def refresh_overdue_request_stats():
+    """Refresh the request statistics for agencies with newly overdue requests
+
+    Requests become overdue when their due date passes, without being saved
+    """
+    yesterday = date.today() - timedelta(1)
+    agency_pks = (
+        FOIARequest.objects.filter(status__in=OVERDUE_STATUSES, date_due=yesterday)
+        .exclude(agency=None)
+        .order_by()
+        .values_list("agency_id", flat=True)
+        .distinct()
+    )
+    for agency_pk in agency_pks:
+        refresh_request_stats.delay(agency_pk)
+
+
+@periodic_task(
+    run_every=crontab(hour=2, minute=30),
+    time_limit=30 * 60,
+    name="muckrock.jurisdiction.tasks.rebuild_request_stats",
+)
+def rebuild_request_stats():
+    """Rebuild all of the request statistics nightly
+
+    This catches requests moved between agencies, which do not trigger a
+    refresh
+    """
+    RequestStats.objects.rebuild()
+    logger.info("Rebuilt request statistics")
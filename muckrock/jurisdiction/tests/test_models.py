@@ -8,19 +8,23 @@ from django.urls import reverse
 from django.utils import timezone
 
 # Standard Library
-from datetime import timedelta
+from datetime import date, datetime, timedelta
 
 # Third Party
-from nose.tools import eq_
+from freezegun import freeze_time
+from nose.tools import eq_, ok_
 
 # MuckRock
-from muckrock.core.factories import UserFactory
+from muckrock.business_days.models import Holiday
+from muckrock.core.factories import AgencyFactory, UserFactory
 from muckrock.foia.factories import (
     FOIACommunicationFactory,
     FOIAFileFactory,
     FOIARequestFactory,
 )
 from muckrock.jurisdiction import factories
+from muckrock.jurisdiction.models import Jurisdiction, RequestStats
+from muckrock.jurisdiction.tasks import refresh_overdue_request_stats
 
 
 class TestJurisdictionUnit(TestCase):
@@ -153,6 +157,139 @@ class TestJurisdictionUnit(TestCase):
         eq_(self.local.total_pages(), page_count)
         eq_(self.state.total_pages(), 2 * page_count)
 
+    def test_rebuild_request_stats(self):
+        """The rebuilt statistics should match freshly computed ones"""
+        local_foia = FOIARequestFactory(
+            agency__jurisdiction=self.local, status="ack", price=5
+        )
+        FOIARequestFactory(
+            agency__jurisdiction=self.state, status="done", datetime_done=timezone.now()
+        )
+        FOIACommunicationFactory(foia=local_foia).files.add(FOIAFileFactory(pages=3))
+        RequestStats.objects.rebuild()
+
+        state = Jurisdiction.objects.select_related("request_stats").get(
+            pk=self.state.pk
+        )
+        with self.assertNumQueries(0):
+            eq_(state.success_rate(), 50.0)
+            eq_(state.fee_rate(), 50.0)
+            eq_(state.average_fee(), 5)
+            eq_(state.total_pages(), 3)
+        eq_(state.request_stats.status_counts, {"ack": 1, "done": 1})
+        local = Jurisdiction.objects.get(pk=self.local.pk)
+        eq_(local.request_stats.requests, 1)
+        fields = RequestStats.objects.compute(local.get_requests())
+        eq_(
+            fields,
+            {field: getattr(local.request_stats, field) for field in fields},
+        )
+
+    def test_rebuild_empty_request_stats(self):
+        """Agencies and jurisdictions without requests get empty statistics"""
+        agency = AgencyFactory(jurisdiction=self.local)
+        RequestStats.objects.rebuild()
+        eq_(RequestStats.objects.get(agency=agency).requests, 0)
+        eq_(RequestStats.objects.get(jurisdiction=self.federal).requests, 0)
+        eq_(RequestStats.objects.get(jurisdiction=self.local).status_counts, {})
+
+    def test_refresh_overdue_request_stats(self):
+        """Statistics are refreshed when requests become overdue"""
+        with freeze_time("2019-07-15"):
+            foia = FOIARequestFactory(
+                agency__jurisdiction=self.local,
+                status="ack",
+                date_due=date(2019, 7, 15),
+            )
+            eq_(RequestStats.objects.refresh(foia.agency).overdue, 0)
+        with freeze_time("2019-07-16"):
+            refresh_overdue_request_stats()
+        eq_(RequestStats.objects.get(agency=foia.agency).overdue, 1)
+        eq_(RequestStats.objects.get(jurisdiction=self.state).overdue, 1)
+
+    def test_get_calendar_cached(self):
+        """Calendars should be cached until the holidays or law change"""
+        calendar = self.local.get_calendar()
+        with self.assertNumQueries(0):
+            eq_(self.local.get_calendar(), calendar)
+            eq_(self.state.get_calendar(), calendar)
+        ok_(calendar.is_business_day(date(2019, 7, 4)))
+
+        holiday = Holiday.objects.create(
+            name="Independence Day", kind="date", month=7, day=4
+        )
+        self.state.holidays.add(holiday)
+        calendar = self.local.get_calendar()
+        ok_(not calendar.is_business_day(date(2019, 7, 4)))
+
+        holiday.day = 5
+        holiday.save()
+        calendar = self.local.get_calendar()
+        ok_(calendar.is_business_day(date(2019, 7, 4)))
+        ok_(not calendar.is_business_day(date(2019, 7, 5)))
+
+        self.state.law.use_business_days = False
+        self.state.law.save()
+        ok_(self.local.get_calendar().is_business_day(date(2019, 7, 5)))
+
+    @freeze_time("2019-07-15")
+    def test_update_due_dates(self):
+        """Due dates should be recomputed when the holidays change"""
+        submitted = timezone.make_aware(datetime(2019, 7, 1, 12))
+        foia = FOIARequestFactory(
+            agency__jurisdiction=self.local,
+            composer__datetime_submitted=submitted,
+            status="ack",
+            date_due=date(2019, 7, 29),
+            date_followup=date(2019, 7, 29),
+        )
+        # paused for a fix, and resumed with the days which were left
+        resumed_foia = FOIARequestFactory(
+            agency__jurisdiction=self.local,
+            composer__datetime_submitted=submitted,
+            status="processed",
+            date_due=date(2019, 8, 5),
+            date_followup=date(2019, 8, 5),
+        )
+        closed_foia = FOIARequestFactory(
+            agency__jurisdiction=self.local,
+            composer__datetime_submitted=submitted,
+            status="done",
+            date_due=date(2019, 7, 29),
+        )
+        old_rules = self.state.get_due_date_rules()
+        eq_(self.state.update_due_dates(old_rules), [])
+
+        holiday = Holiday.objects.create(
+            name="Independence Day", kind="date", month=7, day=4
+        )
+        self.state.holidays.add(holiday)
+        changes = self.state.update_due_dates(old_rules, dry_run=True)
+        eq_(
+            changes,
+            [
+                (
+                    foia.pk,
+                    date(2019, 7, 29),
+                    date(2019, 7, 30),
+                    date(2019, 7, 29),
+                    date(2019, 7, 30),
+                )
+            ],
+        )
+        foia.refresh_from_db()
+        eq_(foia.date_due, date(2019, 7, 29))
+
+        eq_(self.state.update_due_dates(old_rules), changes)
+        foia.refresh_from_db()
+        eq_(foia.date_due, date(2019, 7, 30))
+        eq_(foia.date_followup, date(2019, 7, 30))
+        resumed_foia.refresh_from_db()
+        eq_(resumed_foia.date_due, date(2019, 8, 5))
+        eq_(resumed_foia.date_followup, date(2019, 8, 5))
+        closed_foia.refresh_from_db()
+        eq_(closed_foia.date_due, date(2019, 7, 29))
+
     def test_get_proxy(self):
         """Test getting the proxy user for a state"""
         eq_(self.state.get_proxy(), None)
@@ -121,7 +121,9 @@ def detail(request, fed_slug, state_slug=None, local_slug=None, preview_text=Non
     """Details for a jurisdiction"""
     if local_slug:
         jurisdiction = get_object_or_404(
-            Jurisdiction.objects.select_related("parent", "parent__parent"),
+            Jurisdiction.objects.select_related(
+                "parent", "parent__parent", "request_stats"
+            ),
             level="l",
             slug=local_slug,
             parent__slug=state_slug,
@@ -129,13 +131,17 @@ def detail(request, fed_slug, state_slug=None, local_slug=None, preview_text=Non
         )
     elif state_slug:
         jurisdiction = get_object_or_404(
-            Jurisdiction.objects.select_related("parent"),
+            Jurisdiction.objects.select_related("parent", "request_stats"),
             level="s",
             slug=state_slug,
             parent__slug=fed_slug,
         )
     else:
-        jurisdiction = get_object_or_404(Jurisdiction, level="f", slug=fed_slug)
+        jurisdiction = get_object_or_404(
+            Jurisdiction.objects.select_related("request_stats"),
+            level="f",
+            slug=fed_slug,
+        )
 
     foia_requests = jurisdiction.get_requests()
     foia_requests = (
@@ -34,7 +34,9 @@ logger = logging.getLogger(__name__)
 class JurisdictionViewSet(ModelViewSet):
     """API views for Jurisdiction"""
 
-    queryset = Jurisdiction.objects.order_by("id").select_related("parent__parent")
+    queryset = Jurisdiction.objects.order_by("id").select_related(
+        "parent__parent", "request_stats"
+    )
     serializer_class = JurisdictionSerializer
     # don't allow ordering by computed fields
     ordering_fields = [
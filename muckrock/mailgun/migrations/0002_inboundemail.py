@@ -0,0 +1,103 @@
+# Generated by Django 4.2 on 2026-10-17 13:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+import muckrock.mailgun.models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("mailgun", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InboundEmail",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("message_id", models.CharField(blank=True, max_length=255)),
+                (
+                    "post",
+                    models.JSONField(
+                        help_text="The POST data from the mailgun webhook"
+                    ),
+                ),
+                ("datetime_received", models.DateTimeField(auto_now_add=True)),
+                (
+                    "datetime_claimed",
+                    models.DateTimeField(
+                        blank=True,
+                        help_text="When processing this email last started",
+                        null=True,
+                    ),
+                ),
+                ("datetime_processed", models.DateTimeField(blank=True, null=True)),
+                (
+                    "attempts",
+                    models.PositiveSmallIntegerField(
+                        default=0,
+                        help_text="How many times processing this email has started",
+                    ),
+                ),
+                (
+                    "error",
+                    models.TextField(
+                        blank=True, help_text="The error from the last failed attempt"
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="InboundAttachment",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "key",
+                    models.CharField(help_text="The form field name", max_length=255),
+                ),
+                ("name", models.CharField(max_length=255)),
+                ("content_type", models.CharField(blank=True, max_length=255)),
+                (
+                    "ffile",
+                    models.FileField(
+                        max_length=255,
+                        storage=muckrock.mailgun.models.inbound_storage,
+                        upload_to="inbound_email/%Y/%m/%d",
+                        verbose_name="file",
+                    ),
+                ),
+                (
+                    "email",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="attachments",
+                        to="mailgun.inboundemail",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="inboundemail",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("message_id", ""), _negated=True),
+                fields=("message_id",),
+                name="mailgun_inboundemail_message_id_unique",
+            ),
+        ),
+    ]
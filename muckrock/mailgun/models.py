@@ -3,6 +3,8 @@ Models for the mailgun app
 """
 
 # Django
+from django.core.files.storage import storages
+from django.core.files.uploadedfile import UploadedFile
 from django.db import models
 
 
@@ -13,3 +15,76 @@ class WhitelistDomain(models.Model):
 
     def __str__(self):
         return self.domain
+
+
+def inbound_storage():
+    """Incoming attachments are kept private until they are processed"""
+    return storages["private"]
+
+
+class InboundEmail(models.Model):
+    """An incoming email from mailgun, stored to be processed asynchronously
+
+    The message ID is unique, so that an email which mailgun delivers more
+    than once, to any process, is only stored once.  An email is claimed by
+    the task processing it, and the claim expires, so that an email whose
+    processing failed or was killed is processed again
+    """
+
+    message_id = models.CharField(max_length=255, blank=True)
+    post = models.JSONField(help_text="The POST data from the mailgun webhook")
+    datetime_received = models.DateTimeField(auto_now_add=True)
+    datetime_claimed = models.DateTimeField(
+        blank=True, null=True, help_text="When processing this email last started"
+    )
+    datetime_processed = models.DateTimeField(blank=True, null=True)
+    attempts = models.PositiveSmallIntegerField(
+        default=0, help_text="How many times processing this email has started"
+    )
+    error = models.TextField(
+        blank=True, help_text="The error from the last failed attempt"
+    )
+
+    def __str__(self):
+        return "Inbound Email: %s" % (self.message_id or self.pk)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["message_id"],
+                condition=~models.Q(message_id=""),
+                name="mailgun_inboundemail_message_id_unique",
+            )
+        ]
+
+    def get_files(self):
+        """The attachments, as uploaded files keyed by their form field"""
+        return {
+            attachment.key: UploadedFile(
+                attachment.ffile.open("rb"),
+                name=attachment.name,
+                content_type=attachment.content_type,
+                size=attachment.ffile.size,
+            )
+            for attachment in self.attachments.all()
+        }
+
+
+class InboundAttachment(models.Model):
+    """An attachment to an incoming email"""
+
+    email = models.ForeignKey(
+        InboundEmail, on_delete=models.CASCADE, related_name="attachments"
+    )
+    key = models.CharField(max_length=255, help_text="The form field name")
+    name = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=255, blank=True)
+    ffile = models.FileField(
+        upload_to="inbound_email/%Y/%m/%d",
+        storage=inbound_storage,
+        verbose_name="file",
+        max_length=255,
+    )
+
+    def __str__(self):
+        return "Inbound Attachment: %s" % self.name
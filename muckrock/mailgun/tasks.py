@@ -3,15 +3,143 @@ Celery tasks for mail handling
 """
 
 # Django
-from celery.task import task
+from celery.schedules import crontab
+from celery.task import periodic_task, task
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+# Standard Library
+import logging
+from datetime import timedelta
 
 # MuckRock
 from muckrock.foia.models import FOIACommunication
 from muckrock.mailgun import utils
+from muckrock.mailgun.models import InboundEmail
+
+logger = logging.getLogger(__name__)
 
 
-@task(ignore_result=True, name="muckrock.mailgun.tasks.download_links")
+@task(
+    ignore_result=True,
+    time_limit=30 * 60,
+    name="muckrock.mailgun.tasks.download_links",
+)
 def download_links(comm_pk):
     """Download links from the communication"""
     communication = FOIACommunication.objects.get(pk=comm_pk)
     utils.download_links(communication)
+
+
+@task(
+    ignore_result=True,
+    time_limit=10 * 60,
+    name="muckrock.mailgun.tasks.process_inbound_email",
+)
+def process_inbound_email(inbound_pk):
+    """Route an incoming email stored by the mailgun webhook
+
+    Each email is claimed before it is processed, so that it is only processed
+    once, even if it is queued more than once.  It is only marked as processed
+    once it has been routed - if routing fails, anything it saved is rolled
+    back and the claim is released, and if the worker is killed, the claim
+    expires, so that `retry_inbound_emails` queues it again
+    """
+    # pylint: disable=import-outside-toplevel
+    # MuckRock
+    from muckrock.mailgun.views import route_email
+
+    now = timezone.now()
+    claim_expired = now - timedelta(seconds=settings.INBOUND_EMAIL_CLAIM_TIMEOUT)
+    claimed = (
+        InboundEmail.objects.filter(pk=inbound_pk, datetime_processed=None)
+        .filter(Q(datetime_claimed=None) | Q(datetime_claimed__lt=claim_expired))
+        .update(datetime_claimed=now, attempts=F("attempts") + 1)
+    )
+    if not claimed:
+        logger.info(
+            "Inbound email %s has already been processed or is being processed",
+            inbound_pk,
+        )
+        return
+
+    inbound = InboundEmail.objects.get(pk=inbound_pk)
+    files = inbound.get_files()
+    try:
+        # route the email to all of its recipients or none of them, so that
+        # a retry does not duplicate the communications already made
+        with transaction.atomic():
+            route_email(inbound.post, files)
+            InboundEmail.objects.filter(pk=inbound_pk).update(
+                datetime_processed=timezone.now(), error=""
+            )
+    except Exception as exc:
+        logger.error(
+            "Error processing inbound email %s, attempt %d: %s",
+            inbound_pk,
+            inbound.attempts,
+            exc,
+            exc_info=True,
+        )
+        InboundEmail.objects.filter(pk=inbound_pk).update(
+            datetime_claimed=None, error=str(exc)
+        )
+        raise
+    finally:
+        for file_ in files.values():
+            file_.close()
+
+    # the attachments have been copied to their communications
+    attachments = list(inbound.attachments.all())
+    transaction.on_commit(
+        lambda: [attachment.ffile.delete(save=False) for attachment in attachments]
+    )
+    inbound.attachments.all().delete()
+
+
+@periodic_task(
+    run_every=crontab(minute="*/10"),
+    name="muckrock.mailgun.tasks.retry_inbound_emails",
+)
+def retry_inbound_emails():
+    """Queue any stored emails which were never queued for processing, or
+    whose processing failed or did not finish
+
+    Emails which have failed too many times are left for staff to look into
+    """
+    now = timezone.now()
+    unprocessed = InboundEmail.objects.filter(
+        datetime_processed=None, datetime_received__lt=now - timedelta(minutes=10)
+    )
+    failed = unprocessed.filter(
+        attempts__gte=settings.INBOUND_EMAIL_MAX_ATTEMPTS
+    ).values_list("pk", flat=True)
+    if failed:
+        logger.error(
+            "Inbound emails failed %d times and will not be retried: %s",
+            settings.INBOUND_EMAIL_MAX_ATTEMPTS,
+            list(failed),
+        )
+    claim_expired = now - timedelta(seconds=settings.INBOUND_EMAIL_CLAIM_TIMEOUT)
+    for inbound_pk in (
+        unprocessed.filter(attempts__lt=settings.INBOUND_EMAIL_MAX_ATTEMPTS)
+        .filter(Q(datetime_claimed=None) | Q(datetime_claimed__lt=claim_expired))
+        .values_list("pk", flat=True)
+    ):
+        process_inbound_email.delay(inbound_pk)
+
+
+@periodic_task(
+    run_every=crontab(hour=4, minute=30),
+    name="muckrock.mailgun.tasks.purge_inbound_emails",
+)
+def purge_inbound_emails():
+    """Delete processed emails once duplicates of them are no longer expected
+
+    Their message IDs are what duplicate deliveries are checked against, so
+    they are kept for a while after they have been processed
+    """
+    cutoff = timezone.now() - timedelta(days=settings.INBOUND_EMAIL_RETENTION_DAYS)
+    InboundEmail.objects.filter(datetime_processed__lt=cutoff).delete()
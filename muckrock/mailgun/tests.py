@@ -8,13 +8,14 @@ from django.core import mail
 from django.template.loader import render_to_string
 from django.test import RequestFactory, TestCase
 from django.urls import reverse
+from django.utils import timezone
 
 # Standard Library
 import hashlib
 import hmac
 import os
 import time
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 from io import StringIO
 
 # Third Party
@@ -22,14 +23,19 @@ import nose.tools
 import pytz
 import requests_mock
 from freezegun import freeze_time
+from mock import patch
+from urllib3.exceptions import ProtocolError
 
 # MuckRock
 from muckrock.communication.models import EmailAddress, EmailError, EmailOpen
 from muckrock.core.test_utils import RunCommitHooksMixin
 from muckrock.foia.factories import FOIACommunicationFactory, FOIARequestFactory
-from muckrock.foia.models import FOIACommunication
+from muckrock.foia.models import FOIACommunication, FOIAFile
+from muckrock.mailgun.models import InboundEmail
+from muckrock.mailgun.tasks import process_inbound_email, retry_inbound_emails
+from muckrock.mailgun.utils import download_links
 from muckrock.mailgun.views import bounces, delivered, opened, route_mailgun
-from muckrock.task.models import OrphanTask
+from muckrock.task.models import FileDownloadLink, FlaggedTask, OrphanTask
 
 
 class TestMailgunViews(TestCase):
@@ -127,6 +133,93 @@ class TestMailgunViewHandleRequest(RunCommitHooksMixin, TestMailgunViews):
         )
         nose.tools.eq_(foia.status, "processed")
 
+    def test_process_once(self):
+        """Incoming emails are stored and only processed once"""
+        foia = FOIARequestFactory()
+        self.mailgun_route(to_=foia.get_request_email())
+        inbound = InboundEmail.objects.get()
+        nose.tools.ok_(inbound.datetime_processed)
+        nose.tools.eq_(inbound.message_id, "message_id")
+        process_inbound_email(inbound.pk)
+        nose.tools.eq_(foia.communications.count(), 1)
+
+    def test_process_failure(self):
+        """Emails which fail to be routed are kept to be retried"""
+        foia = FOIARequestFactory()
+        with patch(
+            "muckrock.mailgun.views.route_email", side_effect=ValueError("Failed")
+        ):
+            with nose.tools.assert_raises(ValueError):
+                self.mailgun_route(to_=foia.get_request_email())
+        inbound = InboundEmail.objects.get()
+        nose.tools.eq_(inbound.datetime_processed, None)
+        nose.tools.eq_(inbound.datetime_claimed, None)
+        nose.tools.eq_(inbound.attempts, 1)
+        nose.tools.eq_(inbound.error, "Failed")
+        nose.tools.eq_(foia.communications.count(), 0)
+
+        InboundEmail.objects.filter(pk=inbound.pk).update(
+            datetime_received=timezone.now() - timedelta(hours=1)
+        )
+        retry_inbound_emails()
+        inbound.refresh_from_db()
+        nose.tools.ok_(inbound.datetime_processed)
+        nose.tools.eq_(inbound.attempts, 2)
+        nose.tools.eq_(foia.communications.count(), 1)
+
+    def test_process_partial_failure(self):
+        """A failure for one recipient rolls back the others"""
+        foia = FOIARequestFactory()
+        to_ = f"{foia.get_request_email()}, other@requests.muckrock.com"
+        with patch(
+            "muckrock.mailgun.views._catch_all", side_effect=ValueError("Failed")
+        ) as mock_catch_all:
+            with nose.tools.assert_raises(ValueError):
+                self.mailgun_route(to_=to_)
+        mock_catch_all.assert_called_once()
+        inbound = InboundEmail.objects.get()
+        nose.tools.eq_(inbound.datetime_processed, None)
+        nose.tools.eq_(inbound.error, "Failed")
+        nose.tools.eq_(foia.communications.count(), 0)
+
+        InboundEmail.objects.filter(pk=inbound.pk).update(
+            datetime_received=timezone.now() - timedelta(hours=1)
+        )
+        retry_inbound_emails()
+        inbound.refresh_from_db()
+        nose.tools.ok_(inbound.datetime_processed)
+        nose.tools.eq_(foia.communications.count(), 1)
+
+    def test_duplicate(self):
+        """Emails delivered more than once are only stored once"""
+        foia = FOIARequestFactory()
+        self.mailgun_route(to_=foia.get_request_email())
+        response = self.mailgun_route(to_=foia.get_request_email())
+        nose.tools.eq_(response.status_code, 200)
+        nose.tools.eq_(InboundEmail.objects.count(), 1)
+        nose.tools.eq_(foia.communications.count(), 1)
+
+    def test_file_download_links(self):
+        """Links to known download sites are flagged"""
+        FileDownloadLink.objects.create(name="ShareFile", url="https://*.sharefile.com")
+        FileDownloadLink.objects.create(name="Box", url="https://app.box.com/s/")
+        foia = FOIARequestFactory()
+        self.mailgun_route(
+            to_=foia.get_request_email(),
+            text="Download at https://city.sharefile.com/d-abc123 or "
+            "<https://app.box.com/s/xyz>",
+        )
+        comm = foia.communications.get()
+        nose.tools.ok_(comm.download)
+        tasks = FlaggedTask.objects.filter(foia=foia, category="download file")
+        nose.tools.eq_(tasks.count(), 2)
+        nose.tools.ok_(
+            tasks.filter(text__contains="https://city.sharefile.com/d-abc123").exists()
+        )
+        nose.tools.ok_(
+            tasks.filter(text__endswith="https://app.box.com/s/xyz").exists()
+        )
+
     def test_bad_sender(self):
         """Test receiving a message from an unauthorized sender"""
 
@@ -382,3 +475,64 @@ class TestMailgunViewWebHooks(TestMailgunViews):
             comm.emails.first().confirmed_datetime,
             datetime(2017, 1, 2, 17, tzinfo=pytz.utc),
         )
+
+
+class TestDownloadLinks(TestCase):
+    """Tests for downloading links from communications"""
+
+    @requests_mock.Mocker()
+    def test_download_links(self, mock_requests):
+        """Linked files are streamed into storage and attached once each"""
+        link = "https://www.dropbox.com/s/abc/records.pdf?dl=%d"
+        copy = "https://www.dropbox.com/s/def/copy.pdf?dl=%d"
+        missing = "https://www.dropbox.com/s/ghi/missing.pdf?dl=%d"
+        headers = {"content-disposition": 'attachment; filename="records.pdf"'}
+        mock_requests.get(link % 1, content=b"Records", headers=headers)
+        mock_requests.get(copy % 1, content=b"Records", headers=headers)
+        mock_requests.get(missing % 1, status_code=404)
+        comm = FOIACommunicationFactory(
+            communication="Download {} or {} or {} or {}".format(
+                link % 0, link % 0, copy % 0, missing % 0
+            )
+        )
+        download_links(comm)
+        nose.tools.eq_(mock_requests.call_count, 3)
+        foia_file = comm.files.get()
+        nose.tools.eq_(foia_file.title, "records")
+        nose.tools.eq_(foia_file.ffile.read(), b"Records")
+
+    @requests_mock.Mocker()
+    def test_download_links_s3(self, mock_requests):
+        """The stream can be saved by a storage which checks if it is seekable,
+        as S3Boto3Storage does, and a link which fails mid-stream is skipped"""
+        storage = FOIAFile._meta.get_field("ffile").storage
+        save = storage._save
+
+        def s3_save(name, content):
+            """Mirror how S3Boto3Storage._save handles its content"""
+            if not hasattr(content, "seekable") or content.seekable():
+                content.seek(0)
+            if "broken" in name:
+                raise ProtocolError("Connection broken")
+            return save(name, content)
+
+        link = "https://www.dropbox.com/s/abc/records.pdf?dl=%d"
+        broken = "https://www.dropbox.com/s/def/broken.pdf?dl=%d"
+        mock_requests.get(
+            link % 1,
+            content=b"Records",
+            headers={"content-disposition": 'attachment; filename="records.pdf"'},
+        )
+        mock_requests.get(
+            broken % 1,
+            content=b"Broken",
+            headers={"content-disposition": 'attachment; filename="broken.pdf"'},
+        )
+        comm = FOIACommunicationFactory(
+            communication="Download {} or {}".format(link % 0, broken % 0)
+        )
+        with patch.object(storage, "_save", side_effect=s3_save):
+            download_links(comm)
+        foia_file = comm.files.get()
+        nose.tools.eq_(foia_file.title, "records")
+        nose.tools.eq_(foia_file.ffile.read(), b"Records")
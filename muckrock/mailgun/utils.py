@@ -2,17 +2,109 @@
 Utilities for handling incoming mail
 """
 
+# Django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+
 # Standard Library
 import cgi
+import hashlib
 import logging
 import re
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from urllib.parse import urlparse
 
 # Third Party
 import requests
+from urllib3.exceptions import HTTPError as Urllib3Error
+
+# MuckRock
+from muckrock.core.cache import CacheMetrics
+from muckrock.core.utils import cache_get_or_set
 
 logger = logging.getLogger(__name__)
 
 
+class InboundEmailMetrics(CacheMetrics):
+    """Count incoming emails which were stored, and duplicates suppressed"""
+
+    key = "inbound_email_metrics"
+    events = ("stored", "duplicate")
+
+
+inbound_metrics = InboundEmailMetrics()
+
+FILE_DOWNLOAD_LINKS_CACHE_KEY = "file_download_links"
+
+
+class FileDownloadLinkMatcher:
+    """Find the links for every known file download site in a single pass
+
+    Each site's URL pattern is compiled into one alternation, with a named
+    group per site to tell which one matched
+    """
+
+    def __init__(self, links):
+        self.names = {}
+        patterns = []
+        for i, (name, url) in enumerate(links):
+            group = "link%d" % i
+            self.names[group] = name
+            # escape the url for regex, but replace * with a regex for any
+            # number of non-whitespace characters, then match all text until
+            # the next whitespace, angle bracket or quote (to capture the full
+            # url)
+            url = re.escape(url).replace(r"\*", r"[\S]*")
+            patterns.append("(?P<%s>%s[^\\s<>\"']*)" % (group, url))
+        self.pattern = re.compile("|".join(patterns)) if patterns else None
+
+    def findall(self, text):
+        """Return the links found in the text, grouped by the site's name"""
+        links = defaultdict(list)
+        if self.pattern is None:
+            return links
+        for match in self.pattern.finditer(text):
+            links[self.names[match.lastgroup]].append(match.group())
+        return links
+
+
+@lru_cache(maxsize=1)
+def _compile_file_download_links(links):
+    """Compile the matcher once per process for each set of links"""
+    return FileDownloadLinkMatcher(links)
+
+
+def _fetch_file_download_links():
+    """The name and URL of each file download site"""
+    # pylint: disable=import-outside-toplevel
+    # MuckRock
+    from muckrock.task.models import FileDownloadLink
+
+    return tuple(FileDownloadLink.objects.order_by("pk").values_list("name", "url"))
+
+
+def get_file_download_link_matcher():
+    """The matcher for the current file download sites
+
+    The sites are cached, and the matcher is only recompiled when they change
+    """
+    links = cache_get_or_set(
+        FILE_DOWNLOAD_LINKS_CACHE_KEY,
+        _fetch_file_download_links,
+        settings.DEFAULT_CACHE_TIMEOUT,
+    )
+    return _compile_file_download_links(links)
+
+
+def clear_file_download_links():
+    """Clear the cached file download sites"""
+    cache.delete(FILE_DOWNLOAD_LINKS_CACHE_KEY)
+
+
 class DropboxDownloader:
     """Download configuration for dropbox links"""
 
@@ -25,25 +117,151 @@ class DropboxDownloader:
         return link.replace("dl=0", "dl=1")
 
 
+class HashingReader:
+    """A file-like wrapper around a response which hashes it as it is read
+
+    The response is streamed, so only one chunk of it is in memory at a time
+    """
+
+    def __init__(self, response, name):
+        self.raw = response.raw
+        # undo any content encoding, such as gzip, as it is read
+        self.raw.decode_content = True
+        self.name = name
+        self.content_type = response.headers.get("content-type")
+        self.hash = hashlib.sha256()
+        self.size = 0
+        self.closed = False
+
+    def seekable(self):
+        """The response can only be read forwards"""
+        return False
+
+    def read(self, size=-1):
+        """Read and hash the next chunk of the response"""
+        data = self.raw.read(None if size is None or size < 0 else size)
+        self.hash.update(data)
+        self.size += len(data)
+        return data
+
+    def close(self):
+        """Close the response"""
+        self.raw.close()
+        self.closed = True
+
+
+def _download_link(communication_pk, link, host_limits):
+    """Stream a single link into storage
+
+    Returns the name of the file and its stored path and hash, or None if it
+    could not be downloaded
+    """
+    # pylint: disable=import-outside-toplevel
+    # MuckRock
+    from muckrock.foia.models import FOIAFile
+
+    host = urlparse(link).netloc
+    with host_limits[host]:
+        logger.info("[DL:%s] Trying to download %s", communication_pk, link)
+        try:
+            response = requests.get(
+                link, stream=True, timeout=settings.DOWNLOAD_LINKS_TIMEOUT
+            )
+            response.raise_for_status()
+        except requests.exceptions.RequestException as exc:
+            logger.info("[DL:%s] Error %s", communication_pk, exc)
+            return None
+        _, params = cgi.parse_header(response.headers.get("content-disposition", ""))
+        name = params.get("filename", "Untitled")
+        logger.info("[DL:%s] Saving file %s", communication_pk, name)
+        # the storage uploads the stream to S3 in parts
+        field = FOIAFile._meta.get_field("ffile")
+        reader = HashingReader(
+            response, name[:233].encode("ascii", "ignore").decode() or "Untitled"
+        )
+        try:
+            path = field.storage.save(
+                field.generate_filename(None, reader.name), File(reader)
+            )
+        except (requests.exceptions.RequestException, Urllib3Error, OSError) as exc:
+            # errors while streaming the body come from urllib3 directly
+            logger.info("[DL:%s] Error %s", communication_pk, exc)
+            return None
+        finally:
+            reader.close()
+    digest = reader.hash.hexdigest()
+    logger.info(
+        "[DL:%s] Saved %s: %d bytes, sha256 %s",
+        communication_pk,
+        path,
+        reader.size,
+        digest,
+    )
+    return name, path, digest
+
+
 def download_links(communication):
-    """Download links from the communication"""
+    """Download links from the communication
+
+    The links are downloaded concurrently, with a limited number of
+    connections to each host, and each is streamed straight into storage
+    """
+    # pylint: disable=import-outside-toplevel
+    # MuckRock
+    from muckrock.foia.models import FOIAFile
+
     downloaders = [DropboxDownloader]
     logger.info("Trying to download links for communication %s", communication.pk)
 
+    links = []
     for downloader in downloaders:
         logger.info("[DL:%s] Looking for %s links", communication.pk, downloader.name)
         for link in downloader.p_link.findall(communication.communication):
             link = downloader.preprocess(link)
-            logger.info("[DL:%s] Trying to download %s", communication.pk, link)
-            try:
-                response = requests.get(link)
-                response.raise_for_status()
-            except requests.exceptions.RequestException as exc:
-                logger.info("[DL:%s] Error %s", communication.pk, exc)
-            _, params = cgi.parse_header(
-                response.headers.get("content-disposition", "")
+            if link not in links:
+                links.append(link)
+    if not links:
+        return
+
+    # built before the threads start, so they never race to create a host's limit
+    host_limits = {
+        urlparse(link).netloc: threading.BoundedSemaphore(
+            settings.DOWNLOAD_LINKS_PER_HOST
+        )
+        for link in links
+    }
+    storage = FOIAFile._meta.get_field("ffile").storage
+    with ThreadPoolExecutor(settings.DOWNLOAD_LINKS_MAX_WORKERS) as executor:
+        futures = [
+            executor.submit(_download_link, communication.pk, link, host_limits)
+            for link in links
+        ]
+    downloads = []
+    error = None
+    for future in futures:
+        try:
+            downloads.append(future.result())
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.error(
+                "[DL:%s] Unexpected error: %s", communication.pk, exc, exc_info=True
             )
-            name = params.get("filename", "Untitled")
-            logger.info("[DL:%s] Saving file %s", communication.pk, name)
-            content = response.content
-            communication.attach_file(content=content, name=name)
+            error = error or exc
+    if error is not None:
+        # do not leave the files which were saved orphaned in storage
+        for download in downloads:
+            if download is not None:
+                storage.delete(download[1])
+        raise error
+
+    digests = set()
+    for download in downloads:
+        if download is None:
+            continue
+        name, path, digest = download
+        if digest in digests:
+            # the same file was linked more than once
+            logger.info("[DL:%s] Skipping duplicate file %s", communication.pk, name)
+            storage.delete(path)
+            continue
+        digests.add(digest)
+        communication.attach_file(path=path, name=name)
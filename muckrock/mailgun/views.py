@@ -4,9 +4,8 @@ Views for mailgun
 
 # Django
 from django.conf import settings
-from django.core.cache import cache
 from django.core.mail import EmailMessage
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.http import HttpResponse, HttpResponseForbidden
 from django.template.loader import render_to_string
 from django.urls import reverse
@@ -38,9 +37,10 @@ from muckrock.communication.models import (
 )
 from muckrock.foia.models import FOIACommunication, FOIARequest, RawEmail
 from muckrock.foia.tasks import classify_status
-from muckrock.mailgun.tasks import download_links
+from muckrock.mailgun.models import InboundAttachment, InboundEmail
+from muckrock.mailgun.tasks import download_links, process_inbound_email
+from muckrock.mailgun.utils import get_file_download_link_matcher, inbound_metrics
 from muckrock.task.models import (
-    FileDownloadLink,
     FlaggedTask,
     NewPortalTask,
     OrphanTask,
@@ -49,6 +49,18 @@ from muckrock.task.models import (
 
 logger = logging.getLogger(__name__)
 
+# known portals, by the exact email address or the domain they send from
+PORTAL_EMAILS = {
+    "support@nextrequest.com": "nextrequest",
+    "admin@foiaonline.gov": "foiaonline",
+    "foia@regulations.gov": "foiaonline",
+    "efoia@subscriptions.fbi.gov": "fbi",
+}
+PORTAL_DOMAINS = {"mycusthelp.net": "govqa"}
+PORTAL_DETECTORS = [
+    ("nextrequest", lambda p: "POWERED BY NEXTREQUEST" in p.get("body-html", ""))
+]
+
 
 def _make_orphan_comm(
     from_email, to_emails, cc_emails, subject, message_id, post, files, foia
@@ -162,39 +174,73 @@ def get_common_webhook_params(allow_empty_email=False):
 @mailgun_verify
 @csrf_exempt
 def route_mailgun(request):
-    """Handle routing of incoming mail with proper header parsing"""
+    """Store incoming mail to be processed asynchronously
+
+    Mailgun retries if we are slow to respond, so the email and its
+    attachments are only stored here, and they are routed by
+    `muckrock.mailgun.tasks.process_inbound_email`
+    """
 
     post = request.POST
     # The way spam hero is currently set up, all emails are sent to the same
     # address, so we must parse to headers to find the recipient.  This can
     # cause duplicate messages if one email is sent to or CC'd to multiple
-    # addresses @requests.muckrock.com.  To try and avoid this, we will cache
-    # the message id, which should be a unique identifier for the message.
-    # If it exists in the cache, we will stop processing this email.  The
-    # ID will be cached for 5 minutes - duplicates should normally be processed
-    # within seconds of each other.
+    # addresses @requests.muckrock.com, and mailgun will also retry any
+    # delivery it does not think succeeded.  The message ID should be a unique
+    # identifier for the message, and the database only allows one stored
+    # email per message ID, so any duplicates are dropped here, no matter
+    # which process receives them or how much later they arrive.
     message_id = (
         post.get("Message-ID") or post.get("Message-Id") or post.get("message-id")
-    )
-    if message_id:
-        # cache.add will return False if the key is already present
-        if not cache.add(message_id, 1, 300):
-            return HttpResponse("OK")
+    ) or ""
+    try:
+        with transaction.atomic():
+            inbound = InboundEmail.objects.create(
+                message_id=message_id[:255], post=post.dict()
+            )
+            for key, file_ in request.FILES.items():
+                InboundAttachment.objects.create(
+                    email=inbound,
+                    key=key,
+                    name=file_.name[:255],
+                    content_type=file_.content_type or "",
+                    ffile=file_,
+                )
+    except IntegrityError:
+        # any other integrity error is raised, so that mailgun retries
+        if not (
+            message_id
+            and InboundEmail.objects.filter(message_id=message_id[:255]).exists()
+        ):
+            raise
+        logger.info("Duplicate incoming email: %s", message_id)
+        inbound_metrics.incr("mailgun", "duplicate")
+        return HttpResponse("OK")
+    inbound_metrics.incr("mailgun", "stored")
+    # this view is not run inside of a transaction, so the email has been
+    # committed - if queueing fails, `retry_inbound_emails` will queue it
+    process_inbound_email.delay(inbound.pk)
+    return HttpResponse("OK")
+
 
+def route_email(post, files):
+    """Route an incoming email to the requests it was sent to"""
     p_request_email = re.compile(r"(\d+-\d{3,10})@%s" % settings.MAILGUN_SERVER_NAME)
     tos = post.get("To", "") or post.get("to", "")
     ccs = post.get("Cc", "") or post.get("cc", "")
     name_emails = getaddresses([tos.lower(), ccs.lower()])
+    message_id = (
+        post.get("Message-ID") or post.get("Message-Id") or post.get("message-id")
+    )
     logger.info(
         "Incoming email: %s - %s - %s", name_emails, post.get("Subject", ""), message_id
     )
     for _, email in name_emails:
         m_request_email = p_request_email.match(email)
         if m_request_email:
-            _handle_request(request, m_request_email.group(1))
+            _handle_request(post, files, m_request_email.group(1))
         elif email.endswith("@%s" % settings.MAILGUN_SERVER_NAME):
-            _catch_all(request, email)
-    return HttpResponse("OK")
+            _catch_all(post, files, email)
 
 
 def _parse_email_headers(post):
@@ -208,14 +254,13 @@ def _parse_email_headers(post):
     return from_email, to_emails, cc_emails
 
 
-def _handle_request(request, mail_id):
+def _handle_request(post, files, mail_id):
     """Handle incoming mailgun FOI request messages"""
     # this function needs to be refactored
     # pylint: disable=broad-except
     # pylint: disable=too-many-locals
     # pylint: disable=too-many-branches
     # pylint: disable=too-many-statements
-    post = request.POST
     from_email, to_emails, cc_emails = _parse_email_headers(post)
     subject = post.get("Subject") or post.get("subject", "")
     message_id = (
@@ -227,7 +272,7 @@ def _handle_request(request, mail_id):
 
         # extra logging for next request portals for now
         if foia.portal and foia.portal.type == "nextrequest":
-            _log_mail(request)
+            _log_mail(post)
 
         if foia.deleted:
             if from_email is not None:
@@ -257,7 +302,7 @@ def _handle_request(request, mail_id):
                 subject,
                 message_id,
                 post,
-                request.FILES,
+                files,
                 foia,
             )
             OrphanTask.objects.create(
@@ -292,8 +337,8 @@ def _handle_request(request, mail_id):
             email_comm.to_emails.set(to_emails)
             email_comm.cc_emails.set(cc_emails)
             transaction.on_commit(lambda: RawEmail.objects.make(message_id))
-            comm.process_attachments(request.FILES)
-            transaction.on_commit(lambda: download_links(comm.pk))
+            comm.process_attachments(files)
+            transaction.on_commit(lambda: download_links.delay(comm.pk))
 
             if foia.portal:
                 transaction.on_commit(lambda: foia.portal.receive_msg(comm))
@@ -356,7 +401,7 @@ def _handle_request(request, mail_id):
             subject,
             message_id,
             post,
-            request.FILES,
+            files,
             foia,
         )
         OrphanTask.objects.create(reason="ia", communication=comm, address=mail_id)
@@ -367,16 +412,15 @@ def _handle_request(request, mail_id):
         logger.error(
             "Uncaught Mailgun Exception - %s: %s", mail_id, exc, exc_info=sys.exc_info()
         )
-        _forward(post, request.FILES, "Uncaught Mailgun Exception", info=True)
+        _forward(post, files, "Uncaught Mailgun Exception", info=True)
         return HttpResponse("ERROR")
 
     return HttpResponse("OK")
 
 
-def _catch_all(request, address):
+def _catch_all(post, files, address):
     """Handle emails sent to other addresses"""
 
-    post = request.POST
     from_email, to_emails, cc_emails = _parse_email_headers(post)
     subject = post.get("Subject") or post.get("subject", "")
     message_id = (
@@ -396,7 +440,7 @@ def _catch_all(request, address):
             subject,
             message_id,
             post,
-            request.FILES,
+            files,
             foia,
         )
         OrphanTask.objects.create(reason="ia", communication=comm, address=address)
@@ -648,10 +692,10 @@ def _forward(post, files, title="", extra_content="", info=False):
     email.send(fail_silently=False)
 
 
-def _log_mail(request):
+def _log_mail(post):
     """Log a request"""
     body = []
-    for key, value in request.POST.items():
+    for key, value in post.items():
         body.append("\n{}:".format(key))
         body.append(str(value))
     email = EmailMessage(
@@ -663,16 +707,15 @@ def _log_mail(request):
 def _detect_portal(comm, email, post):
     """Try to auto-detect a known portal type"""
 
-    portal_emails = [
-        ("nextrequest", "support@nextrequest.com"),
-        ("foiaonline", "admin@foiaonline.gov"),
-        ("foiaonline", "foia@regulations.gov"),
-        ("fbi", "efoia@subscriptions.fbi.gov"),
-        ("govqa", "@mycusthelp.net"),
-    ]
-    portal_detectors = [
-        ("nextrequest", lambda p: "POWERED BY NEXTREQUEST" in p.get("body-html", ""))
-    ]
+    type_ = PORTAL_EMAILS.get(email)
+    if type_ is None and "@" in email:
+        type_ = PORTAL_DOMAINS.get(email.rsplit("@", 1)[1])
+    if type_ is None:
+        type_ = next(
+            (type_ for type_, detector in PORTAL_DETECTORS if detector(post)), None
+        )
+    if type_ is None:
+        return None
 
     if comm.foia.portal or NewPortalTask.objects.filter(
         resolved=False, communication__foia=comm.foia
@@ -681,39 +724,23 @@ def _detect_portal(comm, email, post):
         # no need to auto-detect
         return None
 
-    for type_, portal_email in portal_emails:
-        if portal_email[0] == "@":
-            match = email.endswith(portal_email)
-        else:
-            match = email == portal_email
-        if match:
-            return NewPortalTask.objects.create(communication=comm, portal_type=type_)
-
-    for type_, detector in portal_detectors:
-        if detector(post):
-            return NewPortalTask.objects.create(communication=comm, portal_type=type_)
-
-    return None
+    return NewPortalTask.objects.create(communication=comm, portal_type=type_)
 
 
 def _detect_file_download_links(comm):
     """Try to auto-detect known file download links"""
 
-    for link in FileDownloadLink.objects.all():
-        # escape the url for regex, but replace * with a regex for any number
-        # of non-whitespace characters
-        url = re.escape(link.url).replace(r"\*", r"[\S]*")
-        # match the base url, and then all text until the next whitespace
-        # angle bracket or quote (to capture the full url)
-        links = re.findall(url + "[^\\s<>\"']*", comm.communication)
-        if links:
-            FlaggedTask.objects.create(
-                foia=comm.foia,
-                category="download file",
-                text="A download link to {name} was found.  Please download the "
-                "file(s) and attach them to the request:\n{links}".format(
-                    name=link.name, links="\n".join(links)
-                ),
-            )
-            comm.download = True
-            comm.save()
+    matcher = get_file_download_link_matcher()
+    found = matcher.findall(comm.communication)
+    for name, links in found.items():
+        FlaggedTask.objects.create(
+            foia=comm.foia,
+            category="download file",
+            text="A download link to {name} was found.  Please download the "
+            "file(s) and attach them to the request:\n{links}".format(
+                name=name, links="\n".join(links)
+            ),
+        )
+    if found:
+        comm.download = True
+        comm.save()
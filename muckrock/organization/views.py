@@ -6,7 +6,6 @@ from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.core.cache import cache
 from django.db.models.query import Prefetch
 from django.http.response import Http404
 from django.shortcuts import get_object_or_404, redirect
@@ -117,12 +116,6 @@ def activate(request):
             pk=request.POST.get("organization")
         )
         request.user.profile.organization = organization
-        # update the navbar header cache
-        cache.set(
-            "sb:{}:user_org".format(request.user.username),
-            organization,
-            settings.DEFAULT_CACHE_TIMEOUT,
-        )
         messages.success(
             request,
             "You have switched your active organization to {}".format(
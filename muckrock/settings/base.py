@@ -116,6 +116,9 @@ STORAGES = {
     "default": {
         "BACKEND": "muckrock.core.storage.MediaRootS3BotoStorage",
     },
+    "private": {
+        "BACKEND": "muckrock.core.storage.PrivateMediaRootS3BotoStorage",
+    },
     "staticfiles": {
         "BACKEND": "muckrock.core.storage.CachedS3Boto3Storage",
     },
@@ -334,6 +337,8 @@ CELERY_IMPORTS = (
     "muckrock.agency.tasks",
     "muckrock.crowdsource.tasks",
     "muckrock.foia.tasks",
+    "muckrock.jurisdiction.tasks",
+    "muckrock.mailgun.tasks",
     "muckrock.portal.tasks",
     "muckrock.squarelet.tasks",
     "muckrock.task.tasks",
@@ -456,6 +461,23 @@ MAILGUN_SERVER_NAME = os.environ.get("MAILGUN_SERVER_NAME", "requests.muckrock.c
 MAILGUN_API_URL = os.environ.get(
     "MAILGUN_API_URL", f"https://api.mailgun.net/v3/{MAILGUN_SERVER_NAME}"
 )
+# processed emails are kept this long to check later deliveries against
+INBOUND_EMAIL_RETENTION_DAYS = int(os.environ.get("INBOUND_EMAIL_RETENTION_DAYS", 30))
+# an incoming email being processed is not processed again for this many
+# seconds, which must be longer than the processing task's time limit
+INBOUND_EMAIL_CLAIM_TIMEOUT = int(
+    os.environ.get("INBOUND_EMAIL_CLAIM_TIMEOUT", 15 * 60)
+)
+# an incoming email which fails this many times is no longer retried
+INBOUND_EMAIL_MAX_ATTEMPTS = int(os.environ.get("INBOUND_EMAIL_MAX_ATTEMPTS", 5))
+# links to files in incoming mail are downloaded this many at a time,
+# with at most this many from any one host
+DOWNLOAD_LINKS_MAX_WORKERS = int(os.environ.get("DOWNLOAD_LINKS_MAX_WORKERS", 4))
+DOWNLOAD_LINKS_PER_HOST = int(os.environ.get("DOWNLOAD_LINKS_PER_HOST", 2))
+# seconds to wait to connect, or between bytes, when downloading a link
+DOWNLOAD_LINKS_TIMEOUT = int(os.environ.get("DOWNLOAD_LINKS_TIMEOUT", 60))
+# attachments to a single communication are uploaded this many at a time
+ATTACHMENT_UPLOAD_WORKERS = int(os.environ.get("ATTACHMENT_UPLOAD_WORKERS", 8))
 
 
 EMAIL_SUBJECT_PREFIX = "[Muckrock]"
@@ -465,6 +487,12 @@ EMAIL_BACKEND = os.environ.get(
 
 DOCUMENTCLOUD_BETA_USERNAME = os.environ.get("DOCUMENTCLOUD_BETA_USERNAME")
 DOCUMENTCLOUD_BETA_PASSWORD = os.environ.get("DOCUMENTCLOUD_BETA_PASSWORD")
+# how long the shared DocumentCloud tokens are cached, which should be no
+# longer than the refresh token is valid for
+DOCUMENTCLOUD_TOKEN_TIMEOUT = int(
+    os.environ.get("DOCUMENTCLOUD_TOKEN_TIMEOUT", 12 * 60 * 60)
+)
+DOCUMENTCLOUD_LOGIN_LOCK_TIMEOUT = 60
 
 PHAXIO_KEY = os.environ.get("PHAXIO_KEY")
 PHAXIO_SECRET = os.environ.get("PHAXIO_SECRET")
@@ -499,7 +527,18 @@ DATABASES = {
 DEFAULT_AUTO_FIELD = "django.db.models.AutoField"
 
 CACHES = {
-    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    # shared by every process through redis, with a short lived copy in each
+    # process's memory - see `muckrock.core.cache`
+    "default": {
+        "BACKEND": "muckrock.core.cache.TieredCache",
+        "LOCATION": REDIS_URL,
+        "KEY_PREFIX": "default",
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            "L1_TIMEOUT": int(os.environ.get("CACHE_L1_TIMEOUT", 10)),
+            "L1_MAX_ENTRIES": int(os.environ.get("CACHE_L1_MAX_ENTRIES", 1000)),
+        },
+    },
     "lock": {
         "BACKEND": "redis_lock.django_cache.RedisCache",
         "LOCATION": REDIS_URL,
@@ -507,8 +546,17 @@ CACHES = {
     },
 }
 if REDIS_URL.startswith("rediss:"):
-    CACHES["lock"]["OPTIONS"]["CONNECTION_POOL_KWARGS"] = {"ssl_cert_reqs": None}
+    for cache_settings in CACHES.values():
+        cache_settings["OPTIONS"]["CONNECTION_POOL_KWARGS"] = {"ssl_cert_reqs": None}
 DEFAULT_CACHE_TIMEOUT = 15 * 60
+# how long past their expiration cached values may be served while one process
+# recomputes them, and how long other processes wait when there is no value
+CACHE_STALE_TIMEOUT = int(os.environ.get("CACHE_STALE_TIMEOUT", 60))
+CACHE_REFRESH_WAIT = int(os.environ.get("CACHE_REFRESH_WAIT", 10))
+CACHE_REFRESH_LOCK_TIMEOUT = int(os.environ.get("CACHE_REFRESH_LOCK_TIMEOUT", 60))
+# how long each process keeps a jurisdiction's business day calendar
+# changes made in the same process are seen immediately
+CALENDAR_CACHE_TIMEOUT = int(os.environ.get("CALENDAR_CACHE_TIMEOUT", 60 * 60))
 
 REST_FRAMEWORK = {
     "DEFAULT_PAGINATION_CLASS": "muckrock.core.pagination.StandardPagination",
@@ -526,6 +574,12 @@ REST_FRAMEWORK = {
     ),
 }
 MAX_PAGE_SIZE = int(os.environ.get("MAX_PAGE_SIZE", 100))
+# list views will use the query planner's estimate of the number of results
+# instead of an exact count above this many results
+PAGINATION_ESTIMATE_THRESHOLD = int(
+    os.environ.get("PAGINATION_ESTIMATE_THRESHOLD", 10000)
+)
+PAGINATION_COUNT_TIMEOUT = int(os.environ.get("PAGINATION_COUNT_TIMEOUT", 5 * 60))
 
 if "ALLOWED_HOSTS" in os.environ:
     ALLOWED_HOSTS = os.environ["ALLOWED_HOSTS"].split(",")
@@ -630,6 +684,16 @@ CHECK_EMAIL = os.environ.get("CHECK_EMAIL", "")
 CHECK_LIMIT = int(os.environ.get("CHECK_LIMIT", 200))
 CHECK_NOTIFICATIONS = boolcheck(os.environ.get("CHECK_NOTIFICATIONS", False))
 
+# automated follow ups are sent in chunks of this many requests
+FOLLOWUP_CHUNK_SIZE = int(os.environ.get("FOLLOWUP_CHUNK_SIZE", 25))
+# the most follow ups to send per minute over each channel
+FOLLOWUP_RATE_LIMITS = {
+    "portal": int(os.environ.get("FOLLOWUP_RATE_LIMIT_PORTAL", 30)),
+    "email": int(os.environ.get("FOLLOWUP_RATE_LIMIT_EMAIL", 120)),
+    "fax": int(os.environ.get("FOLLOWUP_RATE_LIMIT_FAX", 20)),
+    "mail": int(os.environ.get("FOLLOWUP_RATE_LIMIT_MAIL", 60)),
+}
+
 CONSTANCE_BACKEND = "constance.backends.database.DatabaseBackend"
 CONSTANCE_SUPERUSER_ONLY = False
 CONSTANCE_CONFIG = OrderedDict(
@@ -797,7 +861,27 @@ USE_SCOUT = False
 DOCCLOUD_EXTENSIONS = os.environ.get("DOCCLOUD_EXTENSIONS", ".pdf,.doc,.docx").split(
     ","
 )
-DOCCLOUD_PROCESSING_WAIT = int(os.environ.get("DOCCLOUD_PROCESSING_WAIT", 60))
+# the most pending documents to check on at once
+DOCCLOUD_POLL_LIMIT = int(os.environ.get("DOCCLOUD_POLL_LIMIT", 1000))
+# seconds to wait for a document to be processed before uploading it again
+DOCCLOUD_PENDING_TIMEOUT = int(os.environ.get("DOCCLOUD_PENDING_TIMEOUT", 24 * 60 * 60))
+# documents which errored are processed again at most this many times, backing
+# off exponentially from this many seconds
+DOCCLOUD_REPROCESS_MAX_ATTEMPTS = int(
+    os.environ.get("DOCCLOUD_REPROCESS_MAX_ATTEMPTS", 10)
+)
+DOCCLOUD_REPROCESS_BACKOFF = int(os.environ.get("DOCCLOUD_REPROCESS_BACKOFF", 60))
+# stuck documents are reuploaded at most this many per second, with this
+# many at once, in chunks of this size
+DOCCLOUD_RETRY_RATE = float(os.environ.get("DOCCLOUD_RETRY_RATE", 1))
+DOCCLOUD_RETRY_BURST = int(os.environ.get("DOCCLOUD_RETRY_BURST", 600))
+DOCCLOUD_RETRY_CHUNK_SIZE = int(os.environ.get("DOCCLOUD_RETRY_CHUNK_SIZE", 100))
+# each stuck document is retried at most this many times, this many seconds apart
+DOCCLOUD_RETRY_MAX_ATTEMPTS = int(os.environ.get("DOCCLOUD_RETRY_MAX_ATTEMPTS", 5))
+DOCCLOUD_RETRY_BACKOFF = int(os.environ.get("DOCCLOUD_RETRY_BACKOFF", 6 * 60 * 60))
+# files younger than this many seconds may still be waiting on their first
+# upload, so they are not retried yet
+DOCCLOUD_RETRY_GRACE = int(os.environ.get("DOCCLOUD_RETRY_GRACE", 2 * 60 * 60))
 
 AGENCY_SESSION_TIME = int(os.environ.get("AGENCY_SESSION_TIME", 7200))
 
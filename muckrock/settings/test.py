@@ -38,6 +38,7 @@ CELERY_TASK_ALWAYS_EAGER = True
 CELERY_TASK_EAGER_PROPAGATES = True
 
 STORAGES["default"]["BACKEND"] = "inmemorystorage.InMemoryStorage"
+STORAGES["private"]["BACKEND"] = "inmemorystorage.InMemoryStorage"
 
 LOGGING = {}
 
@@ -0,0 +1,18 @@
+"""
+App config for sidebar
+"""
+
+# Django
+from django.apps import AppConfig
+
+
+class SidebarConfig(AppConfig):
+    """Configures the sidebar application to clear its cache on changes"""
+
+    name = "muckrock.sidebar"
+
+    def ready(self):
+        """Connects the signal handlers"""
+        # pylint: disable=import-outside-toplevel
+        # MuckRock
+        import muckrock.sidebar.signals  # pylint: disable=unused-import
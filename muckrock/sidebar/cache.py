@@ -0,0 +1,23 @@
+"""
+Caching for the sidebar
+
+Each logged in user's sidebar data is cached as a single value, which is
+cleared by the signal handlers in `muckrock.sidebar.signals` and wherever a
+user's organizations are changed without sending signals
+"""
+
+# Django
+from django.core.cache import cache
+
+# bump this when the cached sidebar data changes shape
+SIDEBAR_CACHE_VERSION = 1
+
+
+def sidebar_cache_key(user_id):
+    """The cache key for a user's sidebar data"""
+    return "sb:v{}:{}".format(SIDEBAR_CACHE_VERSION, user_id)
+
+
+def clear_sidebar_cache(user_ids):
+    """Clear the sidebar data for the given users"""
+    cache.delete_many([sidebar_cache_key(user_id) for user_id in set(user_ids)])
@@ -9,6 +9,7 @@ from muckrock.core.utils import cache_get_or_set
 from muckrock.foia.models import FOIAComposer, FOIARequest
 from muckrock.news.models import Article
 from muckrock.project.models import Project
+from muckrock.sidebar.cache import sidebar_cache_key
 
 
 def get_recent_articles():
@@ -25,32 +26,18 @@ def get_actionable_requests(user):
     return {"started": started, "payment": payment, "fix": fix}
 
 
-def get_unread_notifications(user):
-    """Gets unread notifiations for user, if they're logged in."""
-    if user.is_authenticated:
-        return user.notifications.get_unread()
-    else:
-        return None
-
-
-def get_organization(user):
-    """Gets a users active organization"""
-
-    return cache_get_or_set(
-        "sb:%s:user_org" % user.username,
-        lambda: user.profile.organization,
-        settings.DEFAULT_CACHE_TIMEOUT,
-    )
-
-
-def get_organizations(user):
-    """Gets all of the users organizations"""
-
-    return cache_get_or_set(
-        "sb:%s:user_orgs" % user.username,
-        user.organizations.get_cache,
-        settings.DEFAULT_CACHE_TIMEOUT,
-    )
+def get_user_sidebar_info(user):
+    """Gets all of the sidebar content for a logged in user"""
+    return {
+        "unread_notifications_count": user.notifications.get_unread().count(),
+        "actionable_requests": get_actionable_requests(user),
+        "user_organization": user.profile.organization,
+        "organizations": list(user.organizations.get_cache()),
+        "my_projects": list(Project.objects.get_for_contributor(user).optimize()[:4]),
+        "payment_failed_organizations": list(
+            user.organizations.filter(memberships__admin=True, payment_failed=True)
+        ),
+    }
 
 
 def sidebar_info(request):
@@ -64,19 +51,13 @@ def sidebar_info(request):
     }
     if request.user.is_authenticated:
         # content for logged in users
+        user = request.user
         sidebar_info_dict.update(
-            {
-                "unread_notifications": get_unread_notifications(request.user),
-                "actionable_requests": get_actionable_requests(request.user),
-                "user_organization": get_organization(request.user),
-                "organizations": get_organizations(request.user),
-                "my_projects": Project.objects.get_for_contributor(
-                    request.user
-                ).optimize()[:4],
-                "payment_failed_organizations": request.user.organizations.filter(
-                    memberships__admin=True, payment_failed=True
-                ),
-            }
+            cache_get_or_set(
+                sidebar_cache_key(user.pk),
+                lambda: get_user_sidebar_info(user),
+                settings.DEFAULT_CACHE_TIMEOUT,
+            )
         )
 
     return sidebar_info_dict
@@ -0,0 +1,187 @@
+"""Model signal handlers for the Sidebar application"""
+
+# Django
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+
+# MuckRock
+from muckrock.accounts.models import Notification
+from muckrock.foia.models import FOIAComposer, FOIARequest
+from muckrock.foia.signals import get_saved_request
+from muckrock.news.models import Article
+from muckrock.organization.models import Membership, Organization
+from muckrock.project.models import Project
+from muckrock.sidebar.cache import clear_sidebar_cache
+
+# request statuses which are counted in the sidebar
+ACTIONABLE_STATUSES = ("payment", "fix")
+
+
+def notification_clear_sidebar(sender, instance, **kwargs):
+    """Notifications were created, read or deleted"""
+    # pylint: disable=unused-argument
+    clear_sidebar_cache([instance.user_id])
+
+
+def composer_clear_sidebar(sender, instance, **kwargs):
+    """Drafts were started, submitted or deleted"""
+    # pylint: disable=unused-argument
+    clear_sidebar_cache([instance.user_id])
+
+
+def foia_check_sidebar(sender, instance, **kwargs):
+    """Note if the request is moving into or out of an actionable status"""
+    # pylint: disable=unused-argument, protected-access
+    saved = get_saved_request(instance)
+    old_status = saved.status if saved is not None else None
+    instance._sidebar_changed = old_status != instance.status and (
+        old_status in ACTIONABLE_STATUSES or instance.status in ACTIONABLE_STATUSES
+    )
+
+
+def foia_clear_sidebar(sender, instance, **kwargs):
+    """Requests moved into or out of an actionable status"""
+    # pylint: disable=unused-argument
+    if getattr(instance, "_sidebar_changed", True):
+        clear_sidebar_cache(
+            FOIAComposer.objects.filter(pk=instance.composer_id).values_list(
+                "user_id", flat=True
+            )
+        )
+
+
+def membership_clear_sidebar(sender, instance, **kwargs):
+    """A user joined, left or changed their role in an organization"""
+    # pylint: disable=unused-argument
+    clear_sidebar_cache([instance.user_id])
+
+
+def organization_clear_sidebar(sender, instance, **kwargs):
+    """An organization's name, plan or payment status may have changed"""
+    # pylint: disable=unused-argument
+    clear_sidebar_cache(instance.memberships.values_list("user_id", flat=True))
+
+
+def project_clear_sidebar(sender, instance, **kwargs):
+    """A project's title or image may have changed"""
+    # pylint: disable=unused-argument
+    clear_sidebar_cache(instance.contributors.values_list("pk", flat=True))
+
+
+def contributors_clear_sidebar(sender, instance, action, reverse, pk_set, **kwargs):
+    """Contributors were added to or removed from projects"""
+    # pylint: disable=unused-argument
+    if action not in ("pre_clear", "post_add", "post_remove"):
+        return
+    if reverse:
+        clear_sidebar_cache([instance.pk])
+    elif action == "pre_clear":
+        # the contributors are no longer known after they are cleared
+        clear_sidebar_cache(instance.contributors.values_list("pk", flat=True))
+    else:
+        clear_sidebar_cache(pk_set)
+
+
+def article_clear_dropdown(sender, **kwargs):
+    """Articles may have been published"""
+    # pylint: disable=unused-argument
+    cache.delete(make_template_fragment_key("dropdown_recent_articles"))
+
+
+post_save.connect(
+    notification_clear_sidebar,
+    sender=Notification,
+    dispatch_uid="muckrock.sidebar.signals.notification_save",
+)
+
+post_delete.connect(
+    notification_clear_sidebar,
+    sender=Notification,
+    dispatch_uid="muckrock.sidebar.signals.notification_delete",
+)
+
+post_save.connect(
+    composer_clear_sidebar,
+    sender=FOIAComposer,
+    dispatch_uid="muckrock.sidebar.signals.composer_save",
+)
+
+post_delete.connect(
+    composer_clear_sidebar,
+    sender=FOIAComposer,
+    dispatch_uid="muckrock.sidebar.signals.composer_delete",
+)
+
+pre_save.connect(
+    foia_check_sidebar,
+    sender=FOIARequest,
+    dispatch_uid="muckrock.sidebar.signals.foia_check",
+)
+
+post_save.connect(
+    foia_clear_sidebar,
+    sender=FOIARequest,
+    dispatch_uid="muckrock.sidebar.signals.foia_save",
+)
+
+post_delete.connect(
+    foia_clear_sidebar,
+    sender=FOIARequest,
+    dispatch_uid="muckrock.sidebar.signals.foia_delete",
+)
+
+post_save.connect(
+    membership_clear_sidebar,
+    sender=Membership,
+    dispatch_uid="muckrock.sidebar.signals.membership_save",
+)
+
+post_delete.connect(
+    membership_clear_sidebar,
+    sender=Membership,
+    dispatch_uid="muckrock.sidebar.signals.membership_delete",
+)
+
+post_save.connect(
+    organization_clear_sidebar,
+    sender=Organization,
+    dispatch_uid="muckrock.sidebar.signals.organization_save",
+)
+
+post_save.connect(
+    project_clear_sidebar,
+    sender=Project,
+    dispatch_uid="muckrock.sidebar.signals.project_save",
+)
+
+# the contributors must be found before the project is deleted
+pre_delete.connect(
+    project_clear_sidebar,
+    sender=Project,
+    dispatch_uid="muckrock.sidebar.signals.project_delete",
+)
+
+m2m_changed.connect(
+    contributors_clear_sidebar,
+    sender=Project.contributors.through,
+    dispatch_uid="muckrock.sidebar.signals.contributors",
+)
+
+post_save.connect(
+    article_clear_dropdown,
+    sender=Article,
+    dispatch_uid="muckrock.sidebar.signals.article_save",
+)
+
+post_delete.connect(
+    article_clear_dropdown,
+    sender=Article,
+    dispatch_uid="muckrock.sidebar.signals.article_delete",
+)
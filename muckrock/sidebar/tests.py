@@ -0,0 +1,135 @@
+"""
+Tests using nose for the sidebar application
+"""
+
+# Django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.test import TestCase, override_settings
+
+# Third Party
+from nose.tools import eq_, ok_
+
+# MuckRock
+from muckrock.accounts.models import Profile
+from muckrock.core.factories import (
+    ArticleFactory,
+    NotificationFactory,
+    ProjectFactory,
+    UserFactory,
+)
+from muckrock.foia.factories import FOIARequestFactory
+from muckrock.foia.models import FOIARequest
+from muckrock.organization.factories import MembershipFactory, OrganizationFactory
+from muckrock.sidebar.cache import sidebar_cache_key
+from muckrock.sidebar.signals import foia_check_sidebar
+
+
+@override_settings(
+    CACHES={
+        **settings.CACHES,
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "test-sidebar",
+        },
+    }
+)
+class TestSidebarSignals(TestCase):
+    """The sidebar cache is cleared when its inputs change"""
+
+    def setUp(self):
+        self.user = UserFactory()
+        cache.clear()
+
+    def fill_cache(self):
+        """Cache the sidebar data for the user"""
+        cache.set(sidebar_cache_key(self.user.pk), {"cached": True})
+
+    def is_cached(self):
+        """Is the sidebar data still cached for the user"""
+        return cache.get(sidebar_cache_key(self.user.pk)) is not None
+
+    def test_notification_read(self):
+        """Reading a notification clears the cache"""
+        notification = NotificationFactory(user=self.user)
+        self.fill_cache()
+        notification.mark_read()
+        ok_(not self.is_cached())
+
+    def test_foia_status(self):
+        """Requests moving into or out of payment or fix clear the cache"""
+        foia = FOIARequestFactory(composer__user=self.user, status="processed")
+        for status, cleared in [
+            ("ack", False),
+            ("payment", True),
+            ("fix", True),
+            ("processed", True),
+        ]:
+            self.fill_cache()
+            foia.status = status
+            foia.save()
+            eq_(not self.is_cached(), cleared, status)
+
+    def test_foia_status_not_loaded(self):
+        """The saved status is queried if it was not loaded before saving"""
+        foia = FOIARequestFactory(composer__user=self.user, status="processed")
+        foia = FOIARequest.objects.get(pk=foia.pk)
+        foia.status = "payment"
+        foia_check_sidebar(sender=FOIARequest, instance=foia)
+        ok_(foia._sidebar_changed)  # pylint: disable=protected-access
+
+    def test_organization_setter(self):
+        """Changing the active organization clears the cache"""
+        organization = OrganizationFactory()
+        MembershipFactory(user=self.user, organization=organization, active=False)
+        self.fill_cache()
+        self.user.profile.organization = organization
+        ok_(not self.is_cached())
+
+    def test_squarelet_update(self):
+        """Updating the memberships from squarelet clears the cache"""
+        individual = self.user.profile.individual_organization
+        self.fill_cache()
+        Profile.objects.squarelet_update_or_create(
+            self.user.profile.uuid,
+            {
+                "preferred_username": self.user.username,
+                "organizations": [
+                    {
+                        "uuid": individual.uuid,
+                        "name": individual.name,
+                        "slug": individual.slug,
+                        "entitlements": [],
+                        "max_users": 1,
+                        "individual": True,
+                        "admin": False,
+                    }
+                ],
+            },
+        )
+        ok_(not self.is_cached())
+
+    def test_project_contributors(self):
+        """Adding, removing or clearing contributors clears the cache"""
+        project = ProjectFactory()
+        self.fill_cache()
+        project.contributors.add(self.user)
+        ok_(not self.is_cached())
+        self.fill_cache()
+        project.contributors.remove(self.user)
+        ok_(not self.is_cached())
+        project.contributors.add(self.user)
+        self.fill_cache()
+        project.contributors.clear()
+        ok_(not self.is_cached())
+        self.fill_cache()
+        self.user.projects.add(project)
+        ok_(not self.is_cached())
+
+    def test_article_save(self):
+        """Saving an article clears the recent articles dropdown"""
+        key = make_template_fragment_key("dropdown_recent_articles")
+        cache.set(key, "cached")
+        ArticleFactory()
+        eq_(cache.get(key), None)
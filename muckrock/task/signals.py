@@ -1,16 +1,18 @@
 """Signals for the task application"""
 # Django
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.urls import reverse
 
 # Standard Library
 import logging
 
 # MuckRock
+from muckrock.mailgun.utils import clear_file_download_links
 from muckrock.message.tasks import slack
 from muckrock.message.utils import format_user, slack_attachment, slack_message
 from muckrock.task.models import (
     BlacklistDomain,
+    FileDownloadLink,
     FlaggedTask,
     OrphanTask,
     ProjectReviewTask,
@@ -120,6 +122,11 @@ def flagged(sender, instance, created, **kwargs):
         create_ticket.delay(instance.pk)
 
 
+def file_download_links_changed(sender, **kwargs):
+    """Recompile the file download link matcher when the links change"""
+    clear_file_download_links()
+
+
 post_save.connect(
     domain_blacklist,
     sender=OrphanTask,
@@ -138,3 +145,13 @@ post_save.connect(
 post_save.connect(
     flagged, sender=FlaggedTask, dispatch_uid="muckrock.task.signals.flagged"
 )
+post_save.connect(
+    file_download_links_changed,
+    sender=FileDownloadLink,
+    dispatch_uid="muckrock.task.signals.file_download_link_save",
+)
+post_delete.connect(
+    file_download_links_changed,
+    sender=FileDownloadLink,
+    dispatch_uid="muckrock.task.signals.file_download_link_delete",
+)
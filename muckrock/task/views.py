@@ -37,7 +37,7 @@ from muckrock.agency.models import Agency
 from muckrock.agency.models.communication import AgencyAddress
 from muckrock.communication.forms import AddressForm
 from muckrock.communication.models import Address, PortalCommunication
-from muckrock.core.views import MRFilterListView, class_view_decorator
+from muckrock.core.views import MROrderedFilterCursorListView, class_view_decorator
 from muckrock.foia.models import STATUS, FOIARequest
 from muckrock.foia.tasks import prepare_snail_mail
 from muckrock.portal.forms import PortalForm
@@ -107,7 +107,7 @@ def count_tasks():
 
 
 @method_decorator(user_passes_test(lambda u: u.is_staff), name="get")
-class TaskList(MRFilterListView):
+class TaskList(MROrderedFilterCursorListView):
     """List of tasks"""
 
     title = "Tasks"